@@ -1,6 +1,11 @@
+import atexit
+import copy
+import json
 import logging
 import logging.config
+import logging.handlers
 import os
+import queue
 from typing import Optional
 
 LOGGING_CONFIG = {
@@ -10,6 +15,9 @@ LOGGING_CONFIG = {
         "standard": {
             "format": "%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s"
         },
+        "json": {
+            "()": "config.logging_config.JsonLinesFormatter",
+        },
     },
     "handlers": {
         "file_handler": {
@@ -34,12 +42,166 @@ LOGGING_CONFIG = {
     },
 }
 
+# Defaults of the keyword arguments of `setup_logging`
+LOGGING_SETTINGS = {
+    "queued": True,  # Whether handlers write records on a background thread
+    # none, size, or time (how the log file is rotated). Rotation is only safe
+    # when one process writes the file, so it is off by default: pipeline
+    # stages run as concurrent processes that share log files
+    "rotation": "none",
+    "max_bytes": 10 * 2**20,  # Size at which the log file is rotated
+    "when": "midnight",  # When the log file is rotated if rotation is time
+    "backup_count": 5,  # Number of rotated log files kept
+    "log_format": "standard",  # standard or json (format of the log file)
+}
+
+# Attributes every LogRecord has. Any other attribute was passed with `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Format each record as one compact JSON object, with the fields passed to
+    the log call with `extra`, such as the `stage_metrics` of
+    `dc311.instrumentation`, as keys of their own.
+    """
 
-def setup_logging(log_file: Optional[str] = None, log_level: Optional[str] = None):
-    if log_file:
-        log_file_path = os.path.join("logs", log_file)
-        LOGGING_CONFIG["handlers"]["file_handler"]["filename"] = log_file_path
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+def _get_file_handler_config(
+    log_file_path: str,
+    rotation: str,
+    max_bytes: int,
+    when: str,
+    backup_count: int,
+) -> dict:
+    if rotation == "none":
+        return {"class": "logging.FileHandler", "filename": log_file_path, "mode": "a"}
+    elif rotation == "size":
+        return {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": log_file_path,
+            "mode": "a",
+            "maxBytes": max_bytes,
+            "backupCount": backup_count,
+        }
+    elif rotation == "time":
+        return {
+            "class": "logging.handlers.TimedRotatingFileHandler",
+            "filename": log_file_path,
+            "when": when,
+            "backupCount": backup_count,
+        }
+    raise ValueError(
+        f"rotation of {rotation} provided. rotation must be in "
+        f"('none', 'size', 'time')."
+    )
+
+
+def stop_logging():
+    """
+    Stop the background thread started by `setup_logging`, after it has
+    written every queued record. Called automatically when Python exits.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(
+    log_file: Optional[str] = None,
+    log_level: Optional[str] = None,
+    queued: Optional[bool] = None,
+    rotation: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    when: Optional[str] = None,
+    backup_count: Optional[int] = None,
+    log_format: Optional[str] = None,
+):
+    """
+    Configure the root logger to write to the console and a log file in `logs`.
+
+    Arguments that are not provided are taken from `LOGGING_SETTINGS`.
+
+    Args:
+        log_file: Name of the log file. If None, `dev.log` is used
+        log_level: Level of both handlers. If None, INFO is used
+        queued: Whether log calls only put records on a queue, which a
+            background thread writes to the handlers, so that log calls never
+            wait on disk or terminal I/O
+        rotation: 'none', 'size', or 'time'. How the log file is rotated.
+            Only rotate a log file that no other process writes to, since a
+            rollover renames the file out from under the other writers
+        max_bytes: Size in bytes at which the log file is rotated, if rotation
+            is 'size'
+        when: When the log file is rotated, if rotation is 'time', e.g.
+            'midnight' or 'H'. See `logging.handlers.TimedRotatingFileHandler`
+        backup_count: Number of rotated log files kept
+        log_format: 'standard' or 'json'. 'json' writes one JSON object per
+            line to the log file. The console always uses the standard format
+    """
+    queued = LOGGING_SETTINGS["queued"] if queued is None else queued
+    rotation = rotation or LOGGING_SETTINGS["rotation"]
+    max_bytes = LOGGING_SETTINGS["max_bytes"] if max_bytes is None else max_bytes
+    when = when or LOGGING_SETTINGS["when"]
+    if backup_count is None:
+        backup_count = LOGGING_SETTINGS["backup_count"]
+    log_format = log_format or LOGGING_SETTINGS["log_format"]
+    if log_format not in LOGGING_CONFIG["formatters"]:
+        raise ValueError(
+            f"log_format of {log_format} provided. log_format must be in "
+            f"{tuple(LOGGING_CONFIG['formatters'])}."
+        )
+
+    config = copy.deepcopy(LOGGING_CONFIG)
+    file_handler = config["handlers"]["file_handler"]
+    log_file_path = (
+        os.path.join("logs", log_file) if log_file else file_handler["filename"]
+    )
+    file_handler.pop("mode")
+    file_handler.update(
+        _get_file_handler_config(log_file_path, rotation, max_bytes, when, backup_count)
+    )
+    file_handler["formatter"] = log_format
     if log_level:
-        LOGGING_CONFIG["handlers"]["file_handler"]["level"] = log_level
-        LOGGING_CONFIG["handlers"]["console_handler"]["level"] = log_level
-    logging.config.dictConfig(LOGGING_CONFIG)
+        file_handler["level"] = log_level
+        config["handlers"]["console_handler"]["level"] = log_level
+
+    # Write the records queued so far before their handlers are closed
+    stop_logging()
+    logging.config.dictConfig(config)
+    if not queued:
+        return
+
+    global _listener
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,405 @@
+"""
+Benchmark each stage of the pipeline on synthetic data of increasing size
+"""
+
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import platform
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import dc311.data.preprocess as prep
+from dc311.data import synthetic
+from dc311.instrumentation import trace_peak_memory
+import dc311.features.features as feat
+import dc311.features.target as targ
+from dc311.modeling import lookup
+from dc311.modeling.train_model import train_model
+
+logger = logging.getLogger(__name__)
+
+# Raw date columns converted by `scripts/preprocess_data.py`
+TIME_COLUMNS = [
+    "adddate",
+    "resolutiondate",
+    "serviceduedate",
+    "serviceorderdate",
+    "inspectiondate",
+]
+
+# Task type and fixed hyperparameters of each model type fit by the benchmark
+MODEL_SETTINGS = {
+    "logistic": ("classification", {"logreg_c": 1.0}),
+    "xgboost": (
+        "classification",
+        {"xgb_n_estimators": 100, "xgb_max_depth": 6, "xgb_learning_rate": 0.1},
+    ),
+    "elasticnet": ("regression", {"en_alpha": 0.01, "en_l1_ratio": 0.9}),
+}
+
+
+def preprocess(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the `dc311.data.preprocess` transforms in the order used by
+    `scripts/preprocess_data.py`.
+
+    Args:
+        df: pandas DataFrame read from a raw CSV file
+
+    Returns:
+        The preprocessed pandas DataFrame
+    """
+    df = prep.transform_column_names_to_lowercase(df)
+    df = prep.convert_columns_to_datetime(df, TIME_COLUMNS)
+    df = prep.create_days_to_resolve_field(df)
+    return prep.process_ward_field(df)
+
+
+def measure(
+    fn: Callable, repeat: Optional[int] = 1, trace_memory: Optional[bool] = True
+) -> Tuple:
+    """
+    Time a function and measure its peak memory.
+
+    Timings are taken without tracing memory, since tracing slows down
+    allocations. Peak memory is measured in one extra, traced call.
+
+    Args:
+        fn: Function called without arguments
+        repeat: Number of timed calls. The fastest is reported
+        trace_memory: Whether to make the traced call
+
+    Returns:
+        Tuple with the seconds of the fastest call, the peak memory in MB (None
+        if not traced), and the return value of the last call
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn()
+        timings.append(time.perf_counter() - start)
+
+    peak_memory_mb = None
+    if trace_memory:
+        with trace_peak_memory() as memory:
+            output = fn()
+        peak_memory_mb = memory["peak_memory_mb"]
+    return min(timings), peak_memory_mb, output
+
+
+class BenchmarkRecorder:
+    """
+    Run pipeline stages and collect one result per stage and data size.
+
+    Args:
+        repeat: Number of timed calls of each stage
+        trace_memory: Whether to measure the peak memory of each stage
+    """
+
+    def __init__(self, repeat: Optional[int] = 1, trace_memory: Optional[bool] = True):
+        self.repeat = repeat
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def run(self, stage: str, size: int, n_rows: int, fn: Callable):
+        """
+        Benchmark one stage.
+
+        Args:
+            stage: Name of the stage
+            size: Number of synthetic records the benchmark was run with
+            n_rows: Number of rows processed by the stage
+            fn: Function called without arguments that runs the stage
+
+        Returns:
+            Return value of `fn`
+        """
+        seconds, peak_memory_mb, output = measure(fn, self.repeat, self.trace_memory)
+        self.add(stage, size, n_rows, seconds, peak_memory_mb)
+        return output
+
+    def add(
+        self,
+        stage: str,
+        size: int,
+        n_rows: int,
+        seconds: float,
+        peak_memory_mb: Optional[float] = None,
+    ) -> None:
+        self.results.append(
+            {
+                "stage": stage,
+                "size": size,
+                "n_rows": n_rows,
+                "seconds": seconds,
+                "rows_per_sec": n_rows / seconds if seconds > 0 else None,
+                "peak_memory_mb": peak_memory_mb,
+            }
+        )
+        memory = "" if peak_memory_mb is None else f", {peak_memory_mb:,.1f} MB peak"
+        logger.info(f"{stage} ({n_rows:,} rows): {seconds:.4f}s{memory}")
+
+
+def run_benchmarks(
+    sizes: List[int],
+    service_codes: Dict[str, Dict[str, str]],
+    work_dir: str,
+    model_types: Optional[List[str]] = None,
+    max_train_rows: Optional[int] = 1_000_000,
+    n_single_row_calls: Optional[int] = 100,
+    repeat: Optional[int] = 1,
+    trace_memory: Optional[bool] = True,
+    feature_list: Optional[List[str]] = None,
+    target_threshold: Optional[int] = 4,
+    seed: Optional[int] = 0,
+    year: Optional[int] = 2024,
+    n_generate_jobs: Optional[int] = 1,
+) -> List[Dict]:
+    """
+    Benchmark every stage of the pipeline at each data size.
+
+    Stages are `transform_json_to_csv`, `read_csv`, `preprocess`,
+    `feature_pipeline_fit`, `feature_pipeline_transform`, `create_target`,
+    `train_<model_type>`, `inference_single_row`, and `inference_batch`.
+
+    Args:
+        sizes: Numbers of synthetic records
+        service_codes: Dictionary from `synthetic.load_service_codes`
+        work_dir: Directory where the synthetic JSON and CSV files are written
+        model_types: Keys of `MODEL_SETTINGS` that are fit. If None, all are
+        max_train_rows: Maximum number of rows each model is fit on
+        n_single_row_calls: Number of single-row predictions averaged for
+            `inference_single_row`
+        repeat: Number of timed calls of each stage
+        trace_memory: Whether to measure the peak memory of each stage
+        feature_list: Features passed to the feature pipeline
+        target_threshold: Threshold of the classification target
+        seed: Seed of the synthetic data
+        year: Year in which the synthetic requests were made
+        n_generate_jobs: Number of processes generating the synthetic data
+
+    Returns:
+        List of dictionaries with the stage, size, number of rows, seconds,
+        rows per second, and peak memory of each benchmark
+    """
+    model_types = model_types or list(MODEL_SETTINGS)
+    for model_type in model_types:
+        if model_type not in MODEL_SETTINGS:
+            raise ValueError(
+                f"model_type of {model_type} provided. model_type must be in "
+                f"{tuple(MODEL_SETTINGS)}."
+            )
+    feature_list = feature_list or ["ward", "servicecode", "adddate"]
+    os.makedirs(work_dir, exist_ok=True)
+    recorder = BenchmarkRecorder(repeat, trace_memory)
+
+    for size in sizes:
+        logger.info(f"Benchmarking with {size:,} records...")
+        json_path = os.path.join(work_dir, f"synthetic_{size}.json")
+        csv_path = os.path.join(work_dir, f"synthetic_{size}.csv")
+        synthetic.write_dataset(
+            json_path, size, year, service_codes, seed=seed, n_jobs=n_generate_jobs
+        )
+
+        recorder.run(
+            "transform_json_to_csv",
+            size,
+            size,
+            lambda: prep.transform_json_to_csv(json_path, csv_path),
+        )
+        raw_df = recorder.run("read_csv", size, size, lambda: pd.read_csv(csv_path))
+        df = recorder.run("preprocess", size, size, lambda: preprocess(raw_df.copy()))
+        df = df.set_index("objectid")
+
+        pipe = recorder.run(
+            "feature_pipeline_fit",
+            size,
+            size,
+            lambda: feat.create_feature_engineering_pipeline(feature_list).fit(df),
+        )
+        X = recorder.run(
+            "feature_pipeline_transform", size, size, lambda: pipe.transform(df)
+        )
+        y_clf = recorder.run(
+            "create_target",
+            size,
+            size,
+            lambda: targ.create_target(
+                df, "days_to_resolve", "classification", target_threshold
+            ),
+        )
+        y_reg = targ.create_target(df, "days_to_resolve", "regression")
+
+        models = {}
+        for model_type in model_types:
+            task_type, params = MODEL_SETTINGS[model_type]
+            y = y_clf if task_type == "classification" else y_reg
+            y = y.iloc[:max_train_rows]
+            X_train = X.loc[y.index]
+            models[model_type] = recorder.run(
+                f"train_{model_type}",
+                size,
+                len(y),
+                lambda: train_model(
+                    X_train,
+                    y["target"].to_numpy(),
+                    params,
+                    task_type,
+                    model_type=model_type,
+                    random_seed=seed,
+                ),
+            )
+
+        classifier = next(
+            (models[m] for m in models if MODEL_SETTINGS[m][0] == "classification"),
+            None,
+        )
+        regressor = next(
+            (models[m] for m in models if MODEL_SETTINGS[m][0] == "regression"), None
+        )
+        if classifier is None or regressor is None:
+            logger.info("Skipping inference, which needs a classifier and regressor")
+            continue
+
+        # The app's predictions, made with the models fit above
+        inference_models = {
+            "feature_pipe_clf": pipe,
+            "feature_pipe_reg": pipe,
+            "num_days_model": regressor,
+            "under_5_day_model": classifier,
+            "under_21_day_model": classifier,
+        }
+        input_df = df[["servicecode", "ward", "adddate"]]
+        rows = [input_df.iloc[[i % size]] for i in range(n_single_row_calls)]
+
+        def predict_single_rows():
+            for row in rows:
+                lookup.predict_outputs(row, inference_models)
+
+        seconds, peak_memory_mb, _ = measure(predict_single_rows, repeat, trace_memory)
+        # Reported per call, so that the number is comparable across sizes
+        recorder.add(
+            "inference_single_row",
+            size,
+            1,
+            seconds / n_single_row_calls,
+            peak_memory_mb,
+        )
+        recorder.run(
+            "inference_batch",
+            size,
+            size,
+            lambda: lookup.predict_outputs(input_df, inference_models),
+        )
+
+        os.remove(json_path)
+        os.remove(csv_path)
+
+    return recorder.results
+
+
+def get_environment() -> Dict:
+    """
+    Describe the machine a benchmark ran on, saved with its results.
+
+    Returns:
+        Dictionary with the platform, Python version, and number of CPUs
+    """
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_results(results: List[Dict], path: str, settings: Optional[Dict] = None):
+    """
+    Save benchmark results as JSON.
+
+    Args:
+        results: List of results from `run_benchmarks`
+        path: Path of the JSON file
+        settings: Settings the benchmark ran with, saved with the results
+
+    Returns:
+        None. JSON file is output to path provided.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "environment": get_environment(),
+                "settings": settings or {},
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+
+
+def load_results(path: str) -> List[Dict]:
+    """
+    Load benchmark results saved by `save_results`.
+
+    Args:
+        path: Path of the JSON file
+
+    Returns:
+        List of results
+    """
+    with open(path, "r") as file:
+        return json.load(file)["results"]
+
+
+def compare_to_baseline(
+    results: List[Dict],
+    baseline: List[Dict],
+    tolerance: Optional[float] = 0.2,
+    min_seconds: Optional[float] = 0.01,
+) -> List[Dict]:
+    """
+    Compare benchmark results to a baseline, matching stages by name and size.
+
+    Args:
+        results: List of results from `run_benchmarks`
+        baseline: List of baseline results
+        tolerance: Fraction by which seconds or peak memory may exceed the
+            baseline before the stage counts as a regression
+        min_seconds: Timings where both the result and the baseline are below
+            this many seconds are too noisy to compare, and are skipped
+
+    Returns:
+        List of dictionaries with the stage, size, metric, baseline value,
+        current value, and their ratio, one per comparison. `regression` is
+        True for comparisons that exceed the tolerance
+    """
+    baseline_by_key = {(b["stage"], b["size"]): b for b in baseline}
+    comparisons = []
+    for result in results:
+        base = baseline_by_key.get((result["stage"], result["size"]))
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_memory_mb"):
+            current, previous = result.get(metric), base.get(metric)
+            if current is None or previous is None or previous <= 0:
+                continue
+            if metric == "seconds" and max(current, previous) < min_seconds:
+                continue
+            ratio = current / previous
+            comparisons.append(
+                {
+                    "stage": result["stage"],
+                    "size": result["size"],
+                    "metric": metric,
+                    "baseline": previous,
+                    "current": current,
+                    "ratio": ratio,
+                    "regression": ratio > 1 + tolerance,
+                }
+            )
+    return comparisons
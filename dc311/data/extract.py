@@ -8,9 +8,12 @@ import os
 import requests
 from typing import Dict
 
+from dc311.instrumentation import instrument, record_rows
+
 logger = logging.getLogger(__name__)
 
 
+@instrument()
 def download_dataset_as_json(
     url: str, param_dict: Dict, outfile: str, max_records: int = None
 ) -> None:
@@ -71,6 +74,7 @@ def download_dataset_as_json(
             param_dict["resultOffset"] += param_dict["resultRecordCount"]
 
         logger.info(f"Retrieved all {len(all_records)} records.")
+        record_rows(rows_out=len(all_records))
         logger.info(f"Dumping data to {outfile}...")
         with open(outfile, "w") as file:
             json.dump(all_records, file, indent=4)
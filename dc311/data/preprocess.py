@@ -8,9 +8,12 @@ from typing import List
 
 import pandas as pd
 
+from dc311.instrumentation import instrument, record_rows
+
 logger = logging.getLogger(__name__)
 
 
+@instrument()
 def transform_json_to_csv(json_path: str, out_csv_path: str) -> None:
     """
     Transform DC 311 JSON file to a CSV
@@ -40,6 +43,7 @@ def transform_json_to_csv(json_path: str, out_csv_path: str) -> None:
     logger.info("Exporting DataFrame to CSV...")
     df.to_csv(out_csv_path, index=False)
     logger.info("Exported to CSV.")
+    record_rows(rows_out=len(df))
 
     return None
 
@@ -58,6 +62,7 @@ def transform_column_names_to_lowercase(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrument()
 def convert_columns_to_datetime(
     df: pd.DataFrame, time_column_list: List[str]
 ) -> pd.DataFrame:
@@ -72,10 +77,15 @@ def convert_columns_to_datetime(
         The pandas dataframe, with specified columns converted to datetime type
     """
     for col in time_column_list:
-        df[col] = pd.to_datetime(df[col], unit="ms", errors="coerce")
+        # Missing values are filled before converting, since pandas 2.2 reads
+        # uninitialized memory for them when converting floats
+        missing = df[col].isna()
+        converted = pd.to_datetime(df[col].fillna(0), unit="ms", errors="coerce")
+        df[col] = converted.mask(missing)
     return df
 
 
+@instrument()
 def create_days_to_resolve_field(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add `days_to_resolve` field to DataFrame
@@ -91,6 +101,7 @@ def create_days_to_resolve_field(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrument()
 def process_ward_field(df: pd.DataFrame) -> pd.DataFrame:
     """
     Process ward dataframe to clean up inconsistent data entry
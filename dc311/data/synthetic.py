@@ -0,0 +1,497 @@
+"""
+Generate synthetic DC 311 data in the raw formats of the DC 311 API, for load
+and scaling tests of the pipeline
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+import json
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from dc311.instrumentation import instrument, record_rows
+
+logger = logging.getLogger(__name__)
+
+# Keys of the `attributes` of each record returned by the DC 311 API
+RAW_ATTRIBUTES = [
+    "OBJECTID",
+    "SERVICECODE",
+    "SERVICECODEDESCRIPTION",
+    "SERVICETYPECODEDESCRIPTION",
+    "ORGANIZATIONACRONYM",
+    "SERVICECALLCOUNT",
+    "ADDDATE",
+    "RESOLUTIONDATE",
+    "SERVICEDUEDATE",
+    "SERVICEORDERDATE",
+    "INSPECTIONDATE",
+    "SERVICEORDERSTATUS",
+    "STATUS_CODE",
+    "SERVICEREQUESTID",
+    "PRIORITY",
+    "STREETADDRESS",
+    "XCOORD",
+    "YCOORD",
+    "LATITUDE",
+    "LONGITUDE",
+    "CITY",
+    "STATE",
+    "ZIPCODE",
+    "MARADDRESSREPOSITORYID",
+    "WARD",
+    "DETAILS",
+    "GIS_ID",
+    "GLOBALID",
+    "CREATOR",
+    "CREATED",
+    "EDITOR",
+    "EDITED",
+    "GDB_FROM_DATE",
+    "GDB_TO_DATE",
+    "GDB_ARCHIVE_OID",
+]
+
+# Raw `ward` values and their relative frequencies in the 2021-2024 data,
+# including the inconsistent entries cleaned by `process_ward_field`
+WARD_FREQUENCIES = {
+    1: 92242,
+    2: 83488,
+    3: 62169,
+    4: 103823,
+    5: 112264,
+    6: 112291,
+    7: 96348,
+    8: 80566,
+    "Null": 3552,
+    "Ward 1": 3,
+    "Ward 2": 14,
+    "Ward 4": 9,
+    "Ward 5": 5,
+    "Ward 6": 23,
+    "Ward 7": 2,
+    "": 20,
+    None: 20,
+}
+
+DC_ZIPCODES = [20001, 20002, 20003, 20004, 20005, 20007, 20008, 20009, 20010]
+DC_ZIPCODES += [20011, 20012, 20015, 20016, 20017, 20018, 20019, 20020, 20024]
+DC_ZIPCODES += [20032, 20036, 20037]
+STREET_NAMES = ["14TH ST", "GEORGIA AVE", "BENNING RD", "K ST", "M ST"]
+STREET_NAMES += ["RHODE ISLAND AVE", "CONNECTICUT AVE", "H ST", "PENNSYLVANIA AVE"]
+STREET_NAMES = np.array(STREET_NAMES + ["ALABAMA AVE", "U ST"])
+QUADRANTS = np.array(["NW", "NE", "SE", "SW"])
+
+# GDB_TO_DATE of records that have not been archived (9999-12-31)
+GDB_OPEN_DATE = 253402214400000
+MS_PER_DAY = 86_400_000
+MAX_DAYS_TO_RESOLVE = 1000
+FILE_FORMATS = ("json", "csv", "parquet")
+
+# Service code profiles loaded once by each worker process
+_worker_profiles = None
+
+
+class ServiceCodeProfiles(NamedTuple):
+    """
+    Arrays describing each service code, aligned by position.
+
+    Attributes:
+        codes: Service codes
+        descriptions: Service code descriptions
+        type_descriptions: Service type descriptions
+        organizations: Organization acronyms
+        weights: Share of all requests with the service code
+        median_days: Median number of days to resolve a request
+        sigmas: Spread of the log of the number of days to resolve a request
+        unresolved_rates: Share of requests that are never resolved
+        due_days: Number of days between a request and its due date
+    """
+
+    codes: np.ndarray
+    descriptions: np.ndarray
+    type_descriptions: np.ndarray
+    organizations: np.ndarray
+    weights: np.ndarray
+    median_days: np.ndarray
+    sigmas: np.ndarray
+    unresolved_rates: np.ndarray
+    due_days: np.ndarray
+
+
+def load_service_codes(categories_path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Load the service codes shown by the app.
+
+    Args:
+        categories_path: Path of `streamlit_app/request_categories.json`
+
+    Returns:
+        Dictionary where the keys are service codes and the values are
+        dictionaries with the service code's `description` and `category`
+    """
+    with open(categories_path, "r") as file:
+        categories = json.load(file)
+
+    service_codes = {
+        code: {"description": description, "category": "Other"}
+        for description, code in categories["All Requests"].items()
+    }
+    for category, requests in categories.items():
+        if category in ("All Requests", "Popular Requests"):
+            continue
+        for code in requests.values():
+            service_codes[code]["category"] = category
+    return service_codes
+
+
+def make_service_code_profiles(
+    service_codes: Dict[str, Dict[str, str]], seed: Optional[int] = 0
+) -> ServiceCodeProfiles:
+    """
+    Draw the request volume and resolution time distribution of each service
+    code. As in the real data, a few service codes account for most requests,
+    and typical resolution times range from the same day to several weeks.
+
+    Args:
+        service_codes: Dictionary from `load_service_codes`
+        seed: Seed of the random number generator
+
+    Returns:
+        ServiceCodeProfiles object
+    """
+    rng = np.random.default_rng([seed])
+    n_codes = len(service_codes)
+    codes = np.array(list(service_codes))
+    categories = [service_codes[code]["category"] for code in codes]
+
+    ranks = rng.permutation(n_codes) + 1
+    weights = 1 / ranks**1.1
+    return ServiceCodeProfiles(
+        codes=codes,
+        descriptions=np.array([service_codes[c]["description"] for c in codes]),
+        type_descriptions=np.array(categories),
+        organizations=np.array(
+            ["".join(w[0] for w in c.split() if w[0].isalpha()) for c in categories]
+        ),
+        weights=weights / weights.sum(),
+        median_days=np.clip(np.exp(rng.normal(np.log(3), 1.2, n_codes)), 0.05, 60),
+        sigmas=rng.uniform(0.5, 1.8, n_codes),
+        unresolved_rates=rng.uniform(0.002, 0.06, n_codes),
+        due_days=rng.choice([1, 2, 3, 5, 7, 10, 14, 21, 30], n_codes),
+    )
+
+
+def generate_records(
+    n_rows: int,
+    year: int,
+    profiles: ServiceCodeProfiles,
+    first_objectid: Optional[int] = 1,
+    seed: Optional[int] = 0,
+    chunk_index: Optional[int] = 0,
+) -> pd.DataFrame:
+    """
+    Generate synthetic 311 requests made in one year.
+
+    The columns the pipeline uses (`SERVICECODE`, `WARD`, `ADDDATE`, and
+    `RESOLUTIONDATE`) follow the distributions of the real data. Other
+    columns hold plausible placeholder values.
+
+    Args:
+        n_rows: Number of requests
+        year: Year in which the requests were made
+        profiles: ServiceCodeProfiles object
+        first_objectid: OBJECTID of the first request
+        seed: Seed of the random number generator
+        chunk_index: Position of the chunk in its file. Each chunk draws from
+            its own random stream, so that the data does not depend on the
+            number of processes generating it
+
+    Returns:
+        pandas DataFrame with `RAW_ATTRIBUTES` columns, where dates are
+        milliseconds since the epoch
+    """
+    rng = np.random.default_rng([seed, year, chunk_index])
+    objectids = np.arange(first_objectid, first_objectid + n_rows)
+
+    code_idx = rng.choice(len(profiles.codes), n_rows, p=profiles.weights)
+
+    # Requests are most often made during business hours
+    start = datetime(year, 1, 1, tzinfo=timezone.utc).timestamp() * 1000
+    end = datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp() * 1000
+    days = rng.integers(0, (end - start) // MS_PER_DAY, n_rows)
+    hours = np.where(
+        rng.random(n_rows) < 0.8,
+        np.clip(rng.normal(12.5, 3.0, n_rows), 0, 23.99),
+        rng.uniform(0, 24, n_rows),
+    )
+    add_dates = (start + days * MS_PER_DAY + hours * 3_600_000).astype(np.int64)
+
+    spread = np.exp(profiles.sigmas[code_idx] * rng.standard_normal(n_rows))
+    days_to_resolve = np.minimum(
+        profiles.median_days[code_idx] * spread, MAX_DAYS_TO_RESOLVE
+    )
+    resolved = rng.random(n_rows) >= profiles.unresolved_rates[code_idx]
+    resolution_dates = add_dates + (days_to_resolve * MS_PER_DAY).astype(np.int64)
+    due_dates = add_dates + profiles.due_days[code_idx] * MS_PER_DAY
+
+    ward_values = list(WARD_FREQUENCIES)
+    ward_probs = np.array(list(WARD_FREQUENCIES.values()), dtype=np.float64)
+    wards = np.empty(n_rows, dtype=object)
+    wards[:] = [
+        ward_values[i]
+        for i in rng.choice(len(ward_values), n_rows, p=ward_probs / ward_probs.sum())
+    ]
+
+    latitudes = rng.uniform(38.82, 38.99, n_rows).round(6)
+    longitudes = rng.uniform(-77.11, -76.92, n_rows).round(6)
+    guids = pd.Series(
+        np.char.mod("%016X", rng.integers(0, 2**63, n_rows))
+    ) + pd.Series(np.char.mod("%016X", rng.integers(0, 2**63, n_rows)))
+    house_numbers = pd.Series(rng.integers(1, 5000, n_rows)).astype(str)
+    streets = pd.Series(STREET_NAMES[rng.integers(0, len(STREET_NAMES), n_rows)])
+    quadrants = pd.Series(QUADRANTS[rng.integers(0, len(QUADRANTS), n_rows)])
+    addresses = house_numbers.str.cat([streets, quadrants], sep=" ")
+    request_ids = f"{year % 100:02d}-" + pd.Series(np.char.mod("%08d", objectids))
+    guid_slices = [(0, 8), (8, 12), (12, 16), (16, 20), (20, 32)]
+    guid_parts = [guids.str[start:stop] for start, stop in guid_slices]
+    global_ids = "{" + guid_parts[0].str.cat(guid_parts[1:], sep="-") + "}"
+    edited = np.where(resolved, resolution_dates, add_dates)
+
+    return pd.DataFrame(
+        {
+            "OBJECTID": objectids,
+            "SERVICECODE": profiles.codes[code_idx],
+            "SERVICECODEDESCRIPTION": profiles.descriptions[code_idx],
+            "SERVICETYPECODEDESCRIPTION": profiles.type_descriptions[code_idx],
+            "ORGANIZATIONACRONYM": profiles.organizations[code_idx],
+            "SERVICECALLCOUNT": 1,
+            "ADDDATE": add_dates,
+            "RESOLUTIONDATE": pd.arrays.IntegerArray(resolution_dates, ~resolved),
+            "SERVICEDUEDATE": due_dates,
+            "SERVICEORDERDATE": add_dates,
+            "INSPECTIONDATE": pd.array(np.full(n_rows, pd.NA), dtype="Int64"),
+            "SERVICEORDERSTATUS": np.where(resolved, "Closed", "Open"),
+            "STATUS_CODE": np.where(resolved, "CLOSED", "OPEN"),
+            "SERVICEREQUESTID": request_ids,
+            "PRIORITY": "STANDARD",
+            "STREETADDRESS": addresses,
+            "XCOORD": (390000 + (longitudes + 77.11) * 86_700).round(2),
+            "YCOORD": (124000 + (latitudes - 38.82) * 111_000).round(2),
+            "LATITUDE": latitudes,
+            "LONGITUDE": longitudes,
+            "CITY": "WASHINGTON",
+            "STATE": "DC",
+            "ZIPCODE": rng.choice(DC_ZIPCODES, n_rows),
+            "MARADDRESSREPOSITORYID": rng.integers(1, 320_000, n_rows),
+            "WARD": wards,
+            "DETAILS": None,
+            "GIS_ID": "311_" + pd.Series(objectids).astype(str),
+            "GLOBALID": global_ids,
+            "CREATOR": "DCGIS",
+            "CREATED": add_dates,
+            "EDITOR": "DCGIS",
+            "EDITED": edited,
+            "GDB_FROM_DATE": edited,
+            "GDB_TO_DATE": GDB_OPEN_DATE,
+            "GDB_ARCHIVE_OID": objectids,
+        },
+        columns=RAW_ATTRIBUTES,
+    )
+
+
+def serialize_records(records: pd.DataFrame, file_format: str, header: bool):
+    """
+    Serialize a chunk of records for `write_dataset`.
+
+    JSON chunks are comma-separated features with `attributes` and `geometry`,
+    as returned by the DC 311 API, and CSV chunks match the output of
+    `transform_json_to_csv`. Parquet chunks are pyarrow Tables where `WARD` is
+    stored as a string, since a column cannot mix numbers and strings.
+
+    Args:
+        records: pandas DataFrame from `generate_records`
+        file_format: "json", "csv", or "parquet"
+        header: Whether the chunk starts its CSV file
+
+    Returns:
+        String for JSON and CSV, or pyarrow Table for Parquet
+    """
+    if file_format == "json":
+        lines = records.to_json(orient="records", lines=True).splitlines()
+        return ",\n".join(
+            f'{{"attributes":{line},"geometry":{{"x":{x},"y":{y}}}}}'
+            for line, x, y in zip(
+                lines, records["XCOORD"].tolist(), records["YCOORD"].tolist()
+            )
+        )
+    if file_format == "csv":
+        # pandas reads integer columns with missing values from JSON as floats
+        return records.astype(
+            {c: np.float64 for c in records if records[c].dtype == "Int64"}
+        ).to_csv(index=False, header=header)
+    if file_format == "parquet":
+        import pyarrow as pa
+
+        records = records.assign(
+            WARD=records["WARD"].map(lambda w: None if w is None else str(w))
+        )
+        return pa.Table.from_pandas(records, preserve_index=False)
+    raise ValueError(
+        f"file_format of {file_format} provided. file_format must be in "
+        f"{FILE_FORMATS}."
+    )
+
+
+def get_file_format(path: str) -> str:
+    """
+    Get the format of a synthetic data file from its extension.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        "json", "csv", or "parquet"
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "pq":
+        extension = "parquet"
+    if extension not in FILE_FORMATS:
+        raise ValueError(
+            f"File extension .{extension} is not supported. "
+            f"extension must be in ('.json', '.csv', '.parquet', '.pq')."
+        )
+    return extension
+
+
+def _init_worker(profiles: ServiceCodeProfiles) -> None:
+    global _worker_profiles
+    _worker_profiles = profiles
+
+
+def _generate_chunk(task: tuple):
+    n_rows, year, first_objectid, seed, chunk_index, file_format = task
+    records = generate_records(
+        n_rows, year, _worker_profiles, first_objectid, seed, chunk_index
+    )
+    return serialize_records(records, file_format, header=chunk_index == 0)
+
+
+@instrument()
+def write_dataset(
+    path: str,
+    n_rows: int,
+    year: int,
+    service_codes: Dict[str, Dict[str, str]],
+    seed: Optional[int] = 0,
+    chunk_size: Optional[int] = 100_000,
+    n_jobs: Optional[int] = 1,
+    first_objectid: Optional[int] = 1,
+) -> Dict:
+    """
+    Write a file of synthetic 311 requests made in one year.
+
+    Chunks are generated and serialized in a pool of worker processes and
+    written in order as they complete, so memory stays bounded by the chunk
+    size. The file's contents depend only on the seed, year, and chunk size,
+    not on the number of processes.
+
+    Args:
+        path: Path of the file. Its extension (.json, .csv, or .parquet) sets
+            the format
+        n_rows: Number of requests
+        year: Year in which the requests were made
+        service_codes: Dictionary from `load_service_codes`
+        seed: Seed of the random number generator
+        chunk_size: Number of requests generated at a time
+        n_jobs: Number of worker processes. If 1, chunks are generated in the
+            current process
+        first_objectid: OBJECTID of the first request
+
+    Returns:
+        Dictionary with the number of rows written, seconds taken, and rows per
+        second
+    """
+    file_format = get_file_format(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    profiles = make_service_code_profiles(service_codes, seed)
+    tasks = [
+        (
+            min(chunk_size, n_rows - start),
+            year,
+            first_objectid + start,
+            seed,
+            chunk_index,
+            file_format,
+        )
+        for chunk_index, start in enumerate(range(0, n_rows, chunk_size))
+    ]
+
+    start = time.perf_counter()
+    parquet_writer = None
+    with open(path, "w") if file_format != "parquet" else nullcontext() as file:
+
+        def write(chunk, chunk_index: int) -> None:
+            nonlocal parquet_writer
+            if file_format == "json":
+                file.write(",\n" if chunk_index > 0 else "")
+                file.write(chunk)
+            elif file_format == "csv":
+                file.write(chunk)
+            else:
+                import pyarrow.parquet as pq
+
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(path, chunk.schema)
+                parquet_writer.write_table(chunk)
+
+        try:
+            if file_format == "json":
+                file.write("[\n")
+            if n_jobs == 1:
+                _init_worker(profiles)
+                for chunk_index, task in enumerate(tasks):
+                    write(_generate_chunk(task), chunk_index)
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=n_jobs,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(profiles,),
+                ) as executor:
+                    pending = deque()
+                    chunk_index = 0
+                    for task in tasks:
+                        pending.append(executor.submit(_generate_chunk, task))
+                        if len(pending) >= 2 * n_jobs:
+                            write(pending.popleft().result(), chunk_index)
+                            chunk_index += 1
+                    while pending:
+                        write(pending.popleft().result(), chunk_index)
+                        chunk_index += 1
+            if file_format == "json":
+                file.write("\n]\n")
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+
+    seconds = time.perf_counter() - start
+    record_rows(rows_out=n_rows)
+    stats = {
+        "n_rows": n_rows,
+        "seconds": seconds,
+        "rows_per_sec": n_rows / seconds if seconds > 0 else float("nan"),
+    }
+    logger.info(
+        f"Wrote {n_rows} synthetic requests to {path} in {seconds:.2f}s "
+        f"({stats['rows_per_sec']:,.0f} rows/sec) with {n_jobs} process(es)"
+    )
+    return stats
@@ -0,0 +1,224 @@
+"""
+Store features, targets, and split codes as fixed-size chunks on disk, so that
+models can be trained on more rows than fit in memory
+"""
+
+import json
+import logging
+import os
+import shutil
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dc311.features.features import DATASET_SPLIT_CODES
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+class ChunkWriter:
+    """
+    Write row-aligned chunks of features, targets, and split codes to a
+    directory. Chunks are written to a temporary directory that replaces
+    `out_dir` when the writer is closed, so readers never see a partial store.
+
+    Args:
+        out_dir: Directory of the chunked store
+        dtype: NumPy dtype of the saved feature matrices
+    """
+
+    def __init__(self, out_dir: str, dtype: Optional[str] = "float32"):
+        self.out_dir = out_dir
+        self.dtype = dtype
+        self._tmp_dir = f"{out_dir.rstrip(os.sep)}.tmp"
+        if os.path.exists(self._tmp_dir):
+            shutil.rmtree(self._tmp_dir)
+        os.makedirs(self._tmp_dir)
+        self._manifest = {"dtype": dtype, "n_rows": 0, "chunks": []}
+
+    def write(
+        self, feature_df: pd.DataFrame, target_df: pd.DataFrame, split_codes: np.ndarray
+    ) -> None:
+        """
+        Append one chunk to the store.
+
+        Args:
+            feature_df: DataFrame with the features of the chunk's rows
+            target_df: DataFrame with one or more target columns, row-aligned
+                with `feature_df`
+            split_codes: Array with one split code per row of `feature_df`
+
+        Returns:
+            None. The chunk's arrays are saved as .npy files.
+        """
+        if len(split_codes) != len(feature_df) or len(target_df) != len(feature_df):
+            raise ValueError(
+                f"feature_df has {len(feature_df)} rows, but target_df has "
+                f"{len(target_df)} rows and split_codes has {len(split_codes)} rows."
+            )
+        if not self._manifest["chunks"]:
+            self._manifest["feature_names"] = feature_df.columns.tolist()
+            self._manifest["target_columns"] = target_df.columns.tolist()
+        elif feature_df.columns.tolist() != self._manifest["feature_names"]:
+            raise ValueError("Every chunk must have the same feature columns.")
+
+        name = f"chunk_{len(self._manifest['chunks']):05d}"
+        arrays = {
+            "features": feature_df.to_numpy(dtype=self.dtype),
+            "targets": target_df.to_numpy(dtype=np.float32),
+            "splits": np.asarray(split_codes, dtype=np.uint8),
+            "index": feature_df.index.to_numpy(),
+        }
+        for key, arr in arrays.items():
+            np.save(os.path.join(self._tmp_dir, f"{name}_{key}.npy"), arr)
+        self._manifest["chunks"].append({"name": name, "n_rows": len(feature_df)})
+        self._manifest["n_rows"] += len(feature_df)
+
+    def close(self) -> None:
+        """Write the manifest and move the store into place"""
+        with open(os.path.join(self._tmp_dir, MANIFEST_FILE_NAME), "w") as file:
+            json.dump(self._manifest, file)
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.replace(self._tmp_dir, self.out_dir)
+        logger.info(
+            f"Saved {self._manifest['n_rows']} rows in "
+            f"{len(self._manifest['chunks'])} chunks to {self.out_dir}"
+        )
+
+
+def write_feature_chunks(
+    feature_pipe,
+    df: pd.DataFrame,
+    target_df: pd.DataFrame,
+    split_codes: np.ndarray,
+    out_dir: str,
+    chunk_rows: Optional[int] = 100000,
+    dtype: Optional[str] = "float32",
+) -> int:
+    """
+    Transform `df` with a fit feature pipeline one chunk of rows at a time and
+    save each chunk, so that the full feature matrix is never held in memory.
+
+    Args:
+        feature_pipe: Fit feature engineering pipeline, which transforms each
+            row independently
+        df: DataFrame with the columns used by `feature_pipe`
+        target_df: DataFrame with one or more target columns, row-aligned with
+            `df`
+        split_codes: Array with one split code per row of `df`
+        out_dir: Directory of the chunked store
+        chunk_rows: Number of rows per chunk
+        dtype: NumPy dtype of the saved feature matrices
+
+    Returns:
+        Number of rows saved
+    """
+    writer = ChunkWriter(out_dir, dtype=dtype)
+    for start in range(0, len(df), chunk_rows):
+        stop = start + chunk_rows
+        writer.write(
+            feature_pipe.transform(df.iloc[start:stop]),
+            target_df.iloc[start:stop],
+            split_codes[start:stop],
+        )
+    writer.close()
+    return len(df)
+
+
+class ChunkedFeatureStore:
+    """
+    Read a store written by `ChunkWriter`. Chunks are memory mapped, and only
+    the rows selected from one chunk at a time are copied into memory.
+
+    Args:
+        path: Directory of the chunked store
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE_NAME), "r") as file:
+            self.manifest = json.load(file)
+        self.feature_names: List[str] = self.manifest["feature_names"]
+        self.target_columns: List[str] = self.manifest["target_columns"]
+        self.n_rows: int = self.manifest["n_rows"]
+        self.n_chunks: int = len(self.manifest["chunks"])
+
+    def _load(self, chunk: int, key: str) -> np.ndarray:
+        name = self.manifest["chunks"][chunk]["name"]
+        return np.load(os.path.join(self.path, f"{name}_{key}.npy"), mmap_mode="r")
+
+    def load_chunk(
+        self,
+        chunk: int,
+        target_column: str,
+        splits: Sequence[str],
+        rng: Optional[np.random.Generator] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load the rows of one chunk that belong to the given datasets and have a
+        target value.
+
+        Args:
+            chunk: Position of the chunk in the store
+            target_column: Name of the target column to load
+            splits: Datasets whose rows are loaded, e.g. ("train", "validation")
+            rng: If provided, the rows are returned in a random order
+
+        Returns:
+            Tuple with two elements: feature matrix and target vector
+        """
+        if target_column not in self.target_columns:
+            raise ValueError(
+                f"target_column of {target_column} provided. target_column must be "
+                f"in {tuple(self.target_columns)}."
+            )
+        y = self._load(chunk, "targets")[:, self.target_columns.index(target_column)]
+        codes = [DATASET_SPLIT_CODES[split] for split in splits]
+        rows = np.flatnonzero(
+            np.isin(self._load(chunk, "splits"), codes) & ~np.isnan(y)
+        )
+        if rng is not None:
+            rng.shuffle(rows)
+        return np.asarray(self._load(chunk, "features")[rows]), np.asarray(y[rows])
+
+    def iter_chunks(
+        self,
+        target_column: str,
+        splits: Sequence[str],
+        rng: Optional[np.random.Generator] = None,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterate over the non-empty chunks of the given datasets.
+
+        Args:
+            target_column: Name of the target column to load
+            splits: Datasets whose rows are loaded
+            rng: If provided, chunks, and rows within each chunk, are visited
+                in a random order
+
+        Returns:
+            Iterator of tuples with a feature matrix and a target vector
+        """
+        order = np.arange(self.n_chunks)
+        if rng is not None:
+            rng.shuffle(order)
+        for chunk in order:
+            X, y = self.load_chunk(chunk, target_column, splits, rng)
+            if len(y):
+                yield X, y
+
+    def count_rows(self, target_column: str, splits: Sequence[str]) -> int:
+        """Number of rows of the given datasets that have a target value"""
+        codes = [DATASET_SPLIT_CODES[split] for split in splits]
+        column = self.target_columns.index(target_column)
+        n_rows = 0
+        for chunk in range(self.n_chunks):
+            has_target = ~np.isnan(self._load(chunk, "targets")[:, column])
+            n_rows += int(
+                (np.isin(self._load(chunk, "splits"), codes) & has_target).sum()
+            )
+        return n_rows
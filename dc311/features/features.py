@@ -3,17 +3,24 @@ Create features for model
 """
 
 import logging
-from typing import List, Dict
+import os
+from typing import List, Dict, Optional
 
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
-
+from sklearn.utils import murmurhash3_32
 
 logger = logging.getLogger(__name__)
 
+# Codes that identify the dataset each row belongs to in a split code array.
+# Rows with code 0 are not assigned to any dataset.
+DATASET_SPLIT_CODES = {"train": 1, "validation": 2, "test": 3}
+
 
 def create_year_feature(series: pd.Series):
     """
@@ -97,16 +104,165 @@ def create_business_hours_feature(adddate_series):
     return df[["add_during_business_hours"]]
 
 
-def engineer_features():
+class HashingEncoder(TransformerMixin, BaseEstimator, auto_wrap_output_keys=None):
+    """
+    Encode every column as a categorical feature by hashing "column=value"
+    tokens into a fixed number of buckets. Unlike one-hot encoding, no
+    vocabulary is fit, so values that were not seen during training are hashed
+    like any other, and the width of the output does not grow with the number
+    of categories.
+
+    Args:
+        n_features: Number of hash buckets, i.e. columns of the output
+        crosses: Lists of columns whose combined values are hashed as one
+            token, e.g. [["servicecode", "ward"]]. A column may be referred to
+            by its full name or by the name after the transformer's "__" prefix
+    """
+
+    def __init__(self, n_features: int = 1024, crosses: Optional[List] = None):
+        self.n_features = n_features
+        self.crosses = crosses
+
+    def fit(self, X: pd.DataFrame, y=None):
+        """Nothing is learned, so that the encoder is stateless"""
+        return self
+
+    def set_output(self, *, transform: Optional[str] = None):
+        """
+        Set the output container of `transform`.
+
+        Args:
+            transform: {"default", "pandas"}
+                With "pandas", a DataFrame with sparse columns is returned. If
+                None, the output container is not changed
+
+        Returns:
+            Encoder object
+        """
+        if transform is not None:
+            self._output = transform
+        return self
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.array([f"hash_{i}" for i in range(self.n_features)], dtype=object)
+
+    def _find_column(self, columns: pd.Index, name: str) -> str:
+        if name in columns:
+            return name
+        matches = [col for col in columns if col.split("__")[-1] == name]
+        if len(matches) != 1:
+            raise ValueError(
+                f"Cross column {name} matches {len(matches)} columns, but it must "
+                f"match one of {columns.tolist()}."
+            )
+        return matches[0]
+
+    @staticmethod
+    def _format_value(value) -> str:
+        # Whole numbers are formatted without a trailing ".0", so that a ward of
+        # 1 and a ward of 1.0 are hashed to the same bucket
+        if isinstance(value, (float, np.floating)) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def _hash_tokens(self, name: str, tokens: List[str]) -> np.ndarray:
+        """Bucket of each "name=token" string, as computed by FeatureHasher"""
+        return np.array(
+            [
+                abs(murmurhash3_32(f"{name}={token}", seed=0)) % self.n_features
+                for token in tokens
+            ],
+            dtype=np.int32,
+        )
+
+    def transform(self, X: pd.DataFrame):
+        """
+        Hash the values of each column, and of each cross, of `X`. Each distinct
+        value is hashed once, and the rows are encoded by looking up the
+        bucket of their value.
+
+        Args:
+            X: DataFrame with the columns to encode
+
+        Returns:
+            scipy CSR matrix with `n_features` columns, or a DataFrame with
+            sparse columns if the output is set to "pandas"
+        """
+        codes, uniques, buckets = {}, {}, []
+        for col in X.columns:
+            codes[col], values = pd.factorize(X[col], use_na_sentinel=False)
+            uniques[col] = [self._format_value(value) for value in values]
+            buckets.append(self._hash_tokens(col, uniques[col])[codes[col]])
+
+        for cross in self.crosses or []:
+            cross_columns = [self._find_column(X.columns, name) for name in cross]
+            cross_codes = np.zeros(len(X), dtype=np.int64)
+            for col in cross_columns:
+                cross_codes = cross_codes * len(uniques[col]) + codes[col]
+            cross_codes, combinations = pd.factorize(cross_codes)
+            tokens = []
+            for combination in combinations:
+                parts = []
+                for col in reversed(cross_columns):
+                    combination, code = divmod(combination, len(uniques[col]))
+                    parts.append(uniques[col][code])
+                tokens.append("|".join(reversed(parts)))
+            buckets.append(
+                self._hash_tokens("|".join(cross_columns), tokens)[cross_codes]
+            )
+
+        # Every row has one token per column and cross. Tokens of a row that
+        # fall into the same bucket are summed
+        n_tokens = len(buckets)
+        matrix = sp.csr_matrix(
+            (
+                np.ones(len(X) * n_tokens, dtype=np.float32),
+                np.column_stack(buckets).ravel(),
+                np.arange(0, len(X) * n_tokens + 1, n_tokens),
+            ),
+            shape=(len(X), self.n_features),
+        )
+        matrix.sum_duplicates()
+        if getattr(self, "_output", "default") == "pandas":
+            return pd.DataFrame.sparse.from_spmatrix(
+                matrix, index=X.index, columns=self.get_feature_names_out()
+            )
+        return matrix
+
+
+def engineer_features(
+    encoding: Optional[str] = "onehot",
+    n_hash_features: Optional[int] = 1024,
+    crosses: Optional[List] = None,
+):
     """
     Create a reusable pipeline that engineers features
 
     Args:
-        None
+        encoding: {"onehot", "hashed"}
+            How the categorical features are encoded
+        n_hash_features: Number of hash buckets when encoding is "hashed"
+        crosses: Lists of columns hashed together when encoding is "hashed",
+            e.g. [["servicecode", "ward"]]
 
     Returns:
         sklearn ColumnTransformer object
     """
+    if encoding == "onehot":
+        encoder = (
+            "onehotencode",
+            OneHotEncoder(handle_unknown="ignore", sparse_output=False),
+        )
+    elif encoding == "hashed":
+        encoder = (
+            "hashencode",
+            HashingEncoder(n_features=n_hash_features, crosses=crosses),
+        )
+    else:
+        raise ValueError(
+            f"encoding of {encoding} provided. encoding must be in "
+            f"('onehot', 'hashed')."
+        )
     return Pipeline(
         [
             (
@@ -129,10 +285,7 @@ def engineer_features():
                     verbose_feature_names_out=True,
                 ),
             ),
-            (
-                "onehotencode",
-                OneHotEncoder(handle_unknown="ignore", sparse_output=False),
-            ),
+            encoder,
         ]
     )
 
@@ -153,18 +306,31 @@ def select_features(feature_list: List[str]):
     )
 
 
-def create_feature_engineering_pipeline(feature_list: List[str]):
+def create_feature_engineering_pipeline(
+    feature_list: List[str],
+    encoding: Optional[str] = "onehot",
+    n_hash_features: Optional[int] = 1024,
+    crosses: Optional[List] = None,
+):
     """
     Create a reusable feature engineering pipeline
 
     Args:
         feature_list: List of features to keep.
+        encoding: {"onehot", "hashed"}
+            How the categorical features are encoded. "hashed" creates a
+            DataFrame with `n_hash_features` sparse columns and fits no vocabulary
+        n_hash_features: Number of hash buckets when encoding is "hashed"
+        crosses: Lists of features hashed together when encoding is "hashed",
+            e.g. [["servicecode", "ward"]]
 
     Returns:
         sklearn Pipeline object
     """
     feature_selector = select_features(feature_list).set_output(transform="pandas")
-    feature_transformer = engineer_features().set_output(transform="pandas")
+    feature_transformer = engineer_features(
+        encoding, n_hash_features, crosses
+    ).set_output(transform="pandas")
     return Pipeline(
         [
             ("feature_selector", feature_selector),
@@ -173,24 +339,120 @@ def create_feature_engineering_pipeline(feature_list: List[str]):
     )
 
 
-def get_dataset_indices(
-    train_df: pd.DataFrame, validation_df: pd.DataFrame, test_df: pd.DataFrame
+def get_dataset_masks(
+    adddate_series: pd.Series,
+    train_years: List[int],
+    validation_years: List[int],
+    test_years: List[int],
 ) -> Dict:
     """
-    Assign indices associated with training, validation, and test sets to a
-    dictionary.
+    Compute boolean masks that assign each row to the training, validation, or
+    test set based on the year in which the 311 request was made.
 
     Args:
-        train_df: DataFrame with training data
-        validation_df: DataFrame with validation data
-        test_df: DataFrame with test data
+        adddate_series: A pandas Series with the `adddate` field
+        train_years: Years assigned to the training set
+        validation_years: Years assigned to the validation set
+        test_years: Years assigned to the test set
 
     Returns:
         Dictionary where the keys are "train", "validation", and "test", and the
-        values are lists of indices associated with each dataset
+        values are boolean NumPy arrays aligned with `adddate_series`
+    """
+    years = adddate_series.dt.year.to_numpy()
+    return {
+        "train": np.isin(years, train_years),
+        "validation": np.isin(years, validation_years),
+        "test": np.isin(years, test_years),
+    }
+
+
+def get_dataset_split_codes(dataset_masks: Dict) -> np.ndarray:
+    """
+    Encode dataset masks as one compact split code per row, using the codes in
+    `DATASET_SPLIT_CODES`.
+
+    Args:
+        dataset_masks: Dictionary where the keys are "train", "validation", and
+            "test", and the values are boolean arrays of equal length
+
+    Returns:
+        uint8 NumPy array with the split code of each row
+    """
+    split_codes = np.zeros(len(dataset_masks["train"]), dtype=np.uint8)
+    for key, code in DATASET_SPLIT_CODES.items():
+        split_codes[dataset_masks[key]] = code
+    return split_codes
+
+
+def get_feature_paths(path: str, encoding: Optional[str] = "onehot") -> List[str]:
     """
-    data_dict = {}
-    data_dict["train"] = train_df.index.tolist()
-    data_dict["validation"] = validation_df.index.tolist()
-    data_dict["test"] = test_df.index.tolist()
-    return data_dict
+    Get the files in which a feature table is saved. One-hot features are saved
+    as a CSV file at `path`. Hashed features are saved as a sparse matrix, with
+    the row index and column names in a second file, so that the hash buckets
+    are never written out as dense columns.
+
+    Args:
+        path: Path of the feature table, with a .csv extension
+        encoding: {"onehot", "hashed"}
+            How the categorical features were encoded
+
+    Returns:
+        List of paths, starting with the file holding the features
+    """
+    if encoding == "hashed":
+        stem = os.path.splitext(path)[0]
+        return [f"{stem}.npz", f"{stem}_index.npz"]
+    return [path]
+
+
+def save_features(
+    feature_df: pd.DataFrame, path: str, encoding: Optional[str] = "onehot"
+) -> None:
+    """
+    Save a feature table to the files given by `get_feature_paths`.
+
+    Args:
+        feature_df: DataFrame with features. With hashed encoding, its columns
+            are sparse
+        path: Path of the feature table, with a .csv extension
+        encoding: {"onehot", "hashed"}
+            How the categorical features were encoded
+
+    Returns:
+        None
+    """
+    if encoding != "hashed":
+        feature_df.to_csv(path)
+        return
+    matrix_path, index_path = get_feature_paths(path, encoding)
+    sp.save_npz(matrix_path, feature_df.sparse.to_coo().tocsr())
+    np.savez(
+        index_path,
+        index=feature_df.index.to_numpy(),
+        index_name=np.array(feature_df.index.name or ""),
+        columns=feature_df.columns.to_numpy(dtype=str),
+    )
+
+
+def load_features(path: str, encoding: Optional[str] = "onehot") -> pd.DataFrame:
+    """
+    Load a feature table saved by `save_features`.
+
+    Args:
+        path: Path of the feature table, with a .csv extension
+        encoding: {"onehot", "hashed"}
+            How the categorical features were encoded
+
+    Returns:
+        DataFrame with features, indexed like the saved table. With hashed
+        encoding, its columns are sparse
+    """
+    if encoding != "hashed":
+        return pd.read_csv(path, index_col="objectid")
+    matrix_path, index_path = get_feature_paths(path, encoding)
+    labels = np.load(index_path)
+    index = pd.Index(labels["index"], name=str(labels["index_name"]) or None)
+    return pd.DataFrame.sparse.from_spmatrix(
+        sp.load_npz(matrix_path), index=index, columns=labels["columns"].tolist()
+    )
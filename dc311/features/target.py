@@ -3,23 +3,86 @@ Create target for model
 """
 
 import logging
-from typing import Optional
+from typing import List, Optional
 
 import numpy as np
 import pandas as pd
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import Binarizer
+
+from dc311.instrumentation import instrument
 
 logger = logging.getLogger(__name__)
 
 
+def get_target_column_name(task: str, clf_threshold: Optional[int] = None) -> str:
+    """
+    Get name of the column that holds a given target in a multi-target table.
+
+    Args:
+        task: Machine learning task to be completed. Either 'regression'
+            or 'classification'
+        clf_threshold: If task = 'classification', the threshold at which the
+            target was binarized
+
+    Returns:
+        Name of target column, e.g. "target_reg" or "target_clf_5"
+    """
+    if task == "regression":
+        return "target_reg"
+    if task == "classification":
+        return f"target_clf_{str(clf_threshold)}"
+    raise ValueError(
+        f"task of {task} provided. task must be in ('classification', 'regression')."
+    )
+
+
+@instrument()
+def create_target_table(
+    df: pd.DataFrame, target_column: str, clf_thresholds: List[int]
+) -> pd.DataFrame:
+    """
+    Create the regression target and one classification target per threshold
+    in a single vectorized pass over `target_column`. `df` is not modified.
+
+    The regression target is cleaned to float32 and left missing where
+    `target_column` is missing; drop those rows before training a regression
+    model. Classification targets are uint8, where values below or equal to the
+    threshold are set to 0 and those higher are set to 1. Missing values are set
+    to 1 (under the assumption that missingness indicates incomplete 311 cases).
+
+    Args:
+        df: pandas DataFrame with model target
+        target_column: Name of column to process as model target
+        clf_thresholds: Thresholds at which to binarize classification targets
+
+    Returns:
+        pandas DataFrame with the same index as `df` and one column per target
+    """
+    days = pd.to_numeric(df[target_column], errors="coerce").to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+    thresholds = np.asarray(clf_thresholds, dtype=np.float64)
+    missing = np.isnan(days)
+
+    # NaN compares as False, so missing values are set to 1 through `missing`
+    binary = (days[:, np.newaxis] > thresholds) | missing[:, np.newaxis]
+
+    target_dict = {get_target_column_name("regression"): days.astype(np.float32)}
+    for i, threshold in enumerate(clf_thresholds):
+        target_dict[get_target_column_name("classification", threshold)] = binary[
+            :, i
+        ].astype(np.uint8)
+    return pd.DataFrame(target_dict, index=df.index)
+
+
+@instrument()
 def create_target(
     df: pd.DataFrame, target_column: str, task: str, clf_threshold: Optional[int] = None
 ) -> pd.DataFrame:
     """
     Create target for model. For regression tasks, missing values are dropped
-    and for classification tasks, missing values are kept and imputed to 999999
+    and for classification tasks, missing values are kept and set to 1
     (under the assumption that missingness indicates incomplete 311 cases).
+    `df` is not modified.
 
     Args:
         df: pandas DataFrame with model target
@@ -37,15 +100,13 @@ def create_target(
     assert task in task_values, f"Value of task '{task}' not in {task_values}."
 
     if task == "regression":
-        df["target"] = df[target_column].replace("", np.nan)
-        return df[df["target"].notna()][["target"]]
-
-    df[target_column] = pd.to_numeric(df[target_column], errors="coerce")
-
-    imputer = SimpleImputer(strategy="constant", fill_value=999999)
-    df[["target"]] = imputer.fit_transform(df[[target_column]])
-
-    binarizer = Binarizer(threshold=clf_threshold)
-    df[["target"]] = binarizer.fit_transform(df[["target"]])
+        target_df = create_target_table(df, target_column, clf_thresholds=[])
+        target_column_name = get_target_column_name("regression")
+        target_df = target_df[target_df[target_column_name].notna()]
+    else:
+        target_df = create_target_table(df, target_column, [clf_threshold])
+        target_column_name = get_target_column_name("classification", clf_threshold)
 
-    return df[["target"]]
+    return target_df[[target_column_name]].rename(
+        columns={target_column_name: "target"}
+    )
@@ -0,0 +1,362 @@
+"""
+Measure the wall time, CPU time, throughput, and memory of pipeline stages
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import functools
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Settings changed with `configure`
+SETTINGS = {
+    "enabled": True,  # Whether stages are measured at all
+    "trace_memory": False,  # Whether to measure the tracemalloc peak of stages
+    "log_mlflow": True,  # Whether to log stage metrics to the active mlflow run
+}
+
+# Stage metrics finished while no mlflow run was active, logged by
+# `log_pending_metrics`
+_pending_metrics = deque(maxlen=1000)
+# Number of times each stage has been logged to mlflow, used as the metric step
+_mlflow_steps = {}
+# Running peaks of the enclosing `trace_peak_memory` blocks
+_peak_stack = []
+_local = threading.local()
+
+
+def configure(**settings) -> None:
+    """
+    Change the instrumentation settings, e.g. with the `instrumentation`
+    section of the config file.
+
+    Args:
+        settings: Keys of `SETTINGS` and their new values
+    """
+    for key, value in settings.items():
+        if key not in SETTINGS:
+            raise ValueError(
+                f"Setting {key} provided. Setting must be in {tuple(SETTINGS)}."
+            )
+        SETTINGS[key] = value
+
+
+@contextmanager
+def trace_peak_memory() -> Iterator[Dict]:
+    """
+    Trace the peak memory allocated by Python and NumPy inside the block.
+    Memory allocated by native libraries outside of Python's allocator, such as
+    xgboost's training buffers, is not counted. Blocks can be nested.
+
+    Returns:
+        Dictionary whose `peak_memory_mb` key is set when the block exits
+    """
+    result = {}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    if _peak_stack:
+        # Keep the enclosing block's peak before it is reset
+        _, peak = tracemalloc.get_traced_memory()
+        _peak_stack[-1] = max(_peak_stack[-1], peak)
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    _peak_stack.append(0)
+    try:
+        yield result
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, _peak_stack.pop())
+        if _peak_stack:
+            _peak_stack[-1] = max(_peak_stack[-1], peak)
+        if started:
+            tracemalloc.stop()
+        result["peak_memory_mb"] = (peak - baseline) / 2**20
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Get the highest resident set size the process has reached.
+
+    Returns:
+        Peak RSS in MB, or None where the `resource` module is not available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def count_rows(obj) -> Optional[int]:
+    """
+    Count the rows of a DataFrame, Series, array, or sparse matrix.
+
+    Args:
+        obj: Object to count
+
+    Returns:
+        Number of rows, or None if `obj` has no rows
+    """
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+class Stage:
+    """
+    Metrics of one stage, filled in by `track_stage`.
+
+    Args:
+        name: Name of the stage
+        rows_in: Number of rows the stage reads
+    """
+
+    def __init__(self, name: str, rows_in: Optional[int] = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.metrics = {}
+
+    def set_rows(
+        self, rows_in: Optional[int] = None, rows_out: Optional[int] = None
+    ) -> None:
+        """
+        Record the number of rows read or written by the stage.
+        """
+        if rows_in is not None:
+            self.rows_in = rows_in
+        if rows_out is not None:
+            self.rows_out = rows_out
+
+
+def current_stage() -> Optional[Stage]:
+    """
+    Get the innermost stage being tracked in this thread.
+
+    Returns:
+        Stage object, or None if no stage is being tracked
+    """
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def record_rows(rows_in: Optional[int] = None, rows_out: Optional[int] = None) -> None:
+    """
+    Record the rows read or written by the innermost stage being tracked, for
+    functions whose arguments or return values are not tables. Does nothing
+    if no stage is being tracked.
+
+    Args:
+        rows_in: Number of rows the stage reads
+        rows_out: Number of rows the stage writes
+    """
+    stage = current_stage()
+    if stage is not None:
+        stage.set_rows(rows_in, rows_out)
+
+
+@contextmanager
+def track_stage(
+    name: str,
+    rows_in: Optional[int] = None,
+    log_level: Optional[int] = logging.INFO,
+    log_mlflow: Optional[bool] = True,
+) -> Iterator[Stage]:
+    """
+    Measure a stage of the pipeline.
+
+    When the block exits, the stage's wall time, CPU time, rows in and out,
+    rows per second, and peak RSS (plus the tracemalloc peak if the
+    `trace_memory` setting is on) are logged as one record. The metrics are
+    attached to the record as `stage_metrics`, for structured log handlers,
+    and are logged to the active mlflow run as `stage/<name>/<metric>`.
+
+    Args:
+        name: Name of the stage
+        rows_in: Number of rows the stage reads
+        log_level: Level of the log record. Use logging.DEBUG for stages that
+            run once per request
+        log_mlflow: Whether to log the metrics to mlflow
+
+    Returns:
+        Stage object, whose rows can be set inside the block
+    """
+    stage = Stage(name, rows_in)
+    if not SETTINGS["enabled"]:
+        yield stage
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(stage)
+    rss_before = get_peak_rss_mb()
+    # tracemalloc is process-wide, so only the main thread traces memory
+    in_main_thread = threading.current_thread() is threading.main_thread()
+    trace = (
+        trace_peak_memory()
+        if SETTINGS["trace_memory"] and in_main_thread
+        else _no_trace()
+    )
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        with trace as memory:
+            yield stage
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        stack.pop()
+
+    rows = stage.rows_out if stage.rows_out is not None else stage.rows_in
+    peak_rss_mb = get_peak_rss_mb()
+    stage.metrics = {
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "rows_in": stage.rows_in,
+        "rows_out": stage.rows_out,
+        "rows_per_sec": rows / wall_seconds if rows and wall_seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb,
+        "rss_growth_mb": (
+            peak_rss_mb - rss_before if peak_rss_mb is not None else None
+        ),
+        "peak_traced_mb": memory.get("peak_memory_mb"),
+    }
+    emit(name, stage.metrics, log_level, log_mlflow)
+
+
+@contextmanager
+def _no_trace() -> Iterator[Dict]:
+    yield {}
+
+
+def emit(
+    name: str,
+    metrics: Dict,
+    log_level: Optional[int] = logging.INFO,
+    log_mlflow: Optional[bool] = True,
+) -> None:
+    """
+    Log the metrics of a stage and send them to mlflow.
+
+    Args:
+        name: Name of the stage
+        metrics: Dictionary of metrics, where missing values are None
+        log_level: Level of the log record
+        log_mlflow: Whether to log the metrics to mlflow
+    """
+    if logger.isEnabledFor(log_level):
+        text = " ".join(
+            f"{key}={value:.4g}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in metrics.items()
+            if value is not None
+        )
+        logger.log(
+            log_level,
+            f"stage={name} {text}",
+            extra={"stage": name, "stage_metrics": metrics},
+        )
+
+    if log_mlflow and SETTINGS["log_mlflow"]:
+        values = {k: v for k, v in metrics.items() if v is not None}
+        if not _log_to_mlflow(name, values):
+            _pending_metrics.append((name, values))
+
+
+def _log_to_mlflow(name: str, metrics: Dict) -> bool:
+    # mlflow is only used if the caller has imported it, so that scripts that
+    # do not track runs do not pay for importing it
+    mlflow = sys.modules.get("mlflow")
+    if mlflow is None or mlflow.active_run() is None:
+        return False
+    step = _mlflow_steps.get(name, 0)
+    _mlflow_steps[name] = step + 1
+    try:
+        mlflow.log_metrics(
+            {f"stage/{name}/{key}": value for key, value in metrics.items()},
+            step=step,
+        )
+    except Exception:
+        logger.warning(f"Could not log metrics of stage {name} to mlflow")
+    return True
+
+
+def log_pending_metrics() -> int:
+    """
+    Log stage metrics that finished before an mlflow run was active, e.g. data
+    loading before `mlflow.start_run`, to the active run.
+
+    Returns:
+        Number of stages logged
+    """
+    n_logged = 0
+    while _pending_metrics:
+        name, metrics = _pending_metrics[0]
+        if not _log_to_mlflow(name, metrics):
+            break
+        _pending_metrics.popleft()
+        n_logged += 1
+    return n_logged
+
+
+def instrument(
+    name: Optional[str] = None,
+    log_level: Optional[int] = logging.INFO,
+    log_mlflow: Optional[bool] = True,
+) -> Callable:
+    """
+    Decorate a function so that each call is measured with `track_stage`.
+
+    Rows in are counted from the first argument with a shape (a DataFrame,
+    Series, array, or sparse matrix), and rows out from the return value, or
+    its first element if it is a tuple. The function can also set them with
+    `record_rows`.
+
+    Args:
+        name: Name of the stage. If None, the function's name is used
+        log_level: Level of the log records
+        log_mlflow: Whether to log the metrics to mlflow
+
+    Returns:
+        Decorator
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not SETTINGS["enabled"]:
+                return fn(*args, **kwargs)
+            rows_in = next(
+                (
+                    rows
+                    for rows in map(count_rows, (*args, *kwargs.values()))
+                    if rows is not None
+                ),
+                None,
+            )
+            with track_stage(stage_name, rows_in, log_level, log_mlflow) as stage:
+                output = fn(*args, **kwargs)
+                if stage.rows_out is None:
+                    stage.rows_out = count_rows(
+                        output[0] if isinstance(output, tuple) and output else output
+                    )
+            return output
+
+        return wrapper
+
+    return decorator
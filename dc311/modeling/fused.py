@@ -0,0 +1,196 @@
+"""
+Fuse the app's feature pipelines and models into one predictor that encodes
+each request once
+"""
+
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from dc311.modeling import lookup
+
+logger = logging.getLogger(__name__)
+
+FUSED_PREDICTOR_PATH = os.path.join("models", "fused_predictor.joblib")
+
+
+def find_projection(
+    base_features: pd.DataFrame, other_features: pd.DataFrame
+) -> Optional[np.ndarray]:
+    """
+    Find the columns of one encoded matrix that reproduce another, e.g. when two
+    one-hot encoders were fit on overlapping sets of categories.
+
+    Args:
+        base_features: Output of one feature pipeline on a probe input
+        other_features: Output of another feature pipeline on the same input
+
+    Returns:
+        Positions of the columns of `base_features` that equal `other_features`,
+        or None if `other_features` cannot be reproduced from `base_features`
+    """
+    if not set(other_features.columns) <= set(base_features.columns):
+        return None
+    columns = base_features.columns.get_indexer(other_features.columns)
+    if not np.array_equal(
+        base_features.iloc[:, columns].to_numpy(), other_features.to_numpy()
+    ):
+        return None
+    return columns
+
+
+class FusedPredictor:
+    """
+    Predict every value in `lookup.LOOKUP_OUTPUTS` with one call.
+
+    Each distinct feature pipeline transforms the input once. Models whose
+    feature pipelines are identical share the same encoded matrix, and models
+    whose feature matrix is a subset of the columns of another pipeline's
+    output reuse that output through column selection.
+
+    Args:
+        feature_pipes: Feature pipelines that are run on the input
+        sources: Dictionary where the keys are model names and the values are
+            tuples with the position of the model's pipeline in `feature_pipes`
+            and the columns selected from its output (None for all columns)
+        models: Dictionary with the loaded models
+        fingerprints: Hashes of the artifacts the predictor was built from
+    """
+
+    def __init__(
+        self,
+        feature_pipes: List,
+        sources: Dict[str, Tuple[int, Optional[np.ndarray]]],
+        models: Dict,
+        fingerprints: Optional[Dict[str, str]] = None,
+    ):
+        self.feature_pipes = feature_pipes
+        self.sources = sources
+        self.models = models
+        self.fingerprints = fingerprints or {}
+
+    @classmethod
+    def from_models(
+        cls,
+        models: Dict,
+        probe_df: pd.DataFrame,
+        fingerprints: Optional[Dict[str, str]] = None,
+    ) -> "FusedPredictor":
+        """
+        Build a predictor from the artifacts of `lookup.MODEL_ARTIFACTS`.
+
+        Identical feature pipelines are found by their joblib hash. A column
+        projection between distinct pipelines is only used if it reproduces
+        the other pipeline's output exactly on `probe_df`.
+
+        Args:
+            models: Dictionary with the loaded artifacts, keyed like
+                `lookup.MODEL_ARTIFACTS`
+            probe_df: Inputs on which pipelines are compared, e.g. every input
+                the app can receive from `lookup.build_input_grid`
+            fingerprints: Hashes of the artifacts, stored with the predictor
+
+        Returns:
+            FusedPredictor object
+        """
+        pipe_names = sorted(set(lookup.MODEL_FEATURE_PIPES.values()))
+        feature_pipes, probe_outputs, pipe_sources, hashes = [], [], {}, {}
+        for pipe_name in pipe_names:
+            pipe = models[pipe_name]
+            pipe_hash = joblib.hash(pipe)
+            if pipe_hash in hashes:
+                pipe_sources[pipe_name] = (hashes[pipe_hash], None)
+                logger.info(f"{pipe_name} is identical to another feature pipeline")
+                continue
+
+            output = pipe.transform(probe_df)
+            for i, base_output in enumerate(probe_outputs):
+                columns = find_projection(base_output, output)
+                if columns is not None:
+                    pipe_sources[pipe_name] = (i, columns)
+                    logger.info(f"{pipe_name} is a column subset of {pipe_names[i]}")
+                    break
+            else:
+                hashes[pipe_hash] = len(feature_pipes)
+                pipe_sources[pipe_name] = (len(feature_pipes), None)
+                feature_pipes.append(pipe)
+                probe_outputs.append(output)
+
+        return cls(
+            feature_pipes,
+            {
+                model: pipe_sources[pipe]
+                for model, pipe in lookup.MODEL_FEATURE_PIPES.items()
+            },
+            {model: models[model] for model in lookup.MODEL_FEATURE_PIPES},
+            fingerprints,
+        )
+
+    def predict(self, input_df: pd.DataFrame) -> np.ndarray:
+        """
+        Predict the values shown by the app for a batch of requests.
+
+        Args:
+            input_df: pandas DataFrame with `servicecode`, `ward`, and `adddate`
+
+        Returns:
+            float32 NumPy array with one row per request and one column per
+            value in `lookup.LOOKUP_OUTPUTS`
+        """
+        encoded = [pipe.transform(input_df) for pipe in self.feature_pipes]
+        features = {}
+        for model, (i, columns) in self.sources.items():
+            features[model] = (
+                encoded[i] if columns is None else encoded[i].iloc[:, columns]
+            )
+        return lookup.score_features(features, self.models)
+
+    def is_current(self, artifacts: Dict[str, str]) -> bool:
+        """
+        Check whether the predictor was built from the artifacts' current contents.
+
+        Args:
+            artifacts: Dictionary where the keys are artifact names and the
+                values are paths of the artifacts
+
+        Returns:
+            True if every artifact has the fingerprint stored in the predictor
+        """
+        try:
+            return all(
+                self.fingerprints.get(name) == lookup.get_file_fingerprint(path)
+                for name, path in artifacts.items()
+            )
+        except OSError:
+            return False
+
+
+def select_models(
+    artifacts: Dict[str, str],
+    fused_path: str,
+    get_artifact: Callable[[str], Any],
+) -> Dict:
+    """
+    Get the artifacts passed to `lookup.predict_outputs`, preferring the fused
+    predictor when it was built from the current artifacts.
+
+    Args:
+        artifacts: Dictionary where the keys are artifact names and the values
+            are paths of the artifacts
+        fused_path: Path of the fused predictor
+        get_artifact: Function that returns a loaded artifact from its name,
+            where the fused predictor is named "fused_predictor"
+
+    Returns:
+        Dictionary with only the fused predictor, or with every artifact
+    """
+    if os.path.exists(fused_path):
+        fused_predictor = get_artifact("fused_predictor")
+        if fused_predictor.is_current(artifacts):
+            return {"fused_predictor": fused_predictor}
+        logger.warning(f"{fused_path} is out of date with the models, not using it")
+    return {name: get_artifact(name) for name in artifacts}
@@ -0,0 +1,331 @@
+"""
+Precompute predictions for every input the Streamlit app can receive
+"""
+
+from datetime import date
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dc311.instrumentation import instrument
+from dc311.modeling.registry import get_file_signature
+
+logger = logging.getLogger(__name__)
+
+# Artifacts used by the app, relative to the project directory
+MODEL_ARTIFACTS = {
+    "under_21_day_model": os.path.join("models", "under_21_day_model.joblib"),
+    "under_5_day_model": os.path.join("models", "under_5_day_model.joblib"),
+    "num_days_model": os.path.join("models", "num_days_model.joblib"),
+    "feature_pipe_clf": os.path.join("models", "feature_pipeline_clf.joblib"),
+    "feature_pipe_reg": os.path.join("models", "feature_pipeline_reg.joblib"),
+}
+LOOKUP_TABLE_PATH = os.path.join("models", "prediction_lookup.npy")
+
+# Feature pipeline whose output each model was trained on
+MODEL_FEATURE_PIPES = {
+    "num_days_model": "feature_pipe_reg",
+    "under_5_day_model": "feature_pipe_clf",
+    "under_21_day_model": "feature_pipe_clf",
+}
+
+# Values predicted for each input, in the order of the table's last axis
+LOOKUP_OUTPUTS = ("num_days", "prob_under_5_days", "prob_over_21_days")
+N_WARDS = 8
+N_MONTHS = 12
+N_DAYS_OF_WEEK = 7
+
+# The models only see the month, quarter, and day of week of `adddate`, so any
+# date with the same month and day of week gets the same predictions
+REFERENCE_YEAR = 2024
+
+_fingerprints = {}
+
+
+def get_file_fingerprint(path: str) -> str:
+    """
+    Get the SHA-256 hash of a file's contents. Hashes are memoized and only
+    recomputed when the file's modification time or size changes.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        Hex digest of the file's contents
+    """
+    signature = get_file_signature(path)
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != signature:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        cached = (signature, digest.hexdigest())
+        _fingerprints[path] = cached
+    return cached[1]
+
+
+@instrument(log_level=logging.DEBUG, log_mlflow=False)
+def predict_outputs(input_df: pd.DataFrame, models: Dict) -> np.ndarray:
+    """
+    Predict the values shown by the app for a batch of requests.
+
+    Args:
+        input_df: pandas DataFrame with `servicecode`, `ward`, and `adddate`
+        models: Dictionary with the loaded artifacts, keyed like `MODEL_ARTIFACTS`,
+            or with only a "fused_predictor" built from them
+
+    Returns:
+        float32 NumPy array with one row per request and one column per value
+        in `LOOKUP_OUTPUTS`
+    """
+    if "fused_predictor" in models:
+        return models["fused_predictor"].predict(input_df)
+
+    encoded = {
+        pipe: models[pipe].transform(input_df)
+        for pipe in set(MODEL_FEATURE_PIPES.values())
+    }
+    return score_features(
+        {model: encoded[pipe] for model, pipe in MODEL_FEATURE_PIPES.items()}, models
+    )
+
+
+def score_features(features: Dict, models: Dict) -> np.ndarray:
+    """
+    Compute the values in `LOOKUP_OUTPUTS` from the feature matrix of each model.
+
+    Args:
+        features: Dictionary where the keys are the model names of
+            `MODEL_FEATURE_PIPES` and the values are their feature matrices
+        models: Dictionary with the loaded models
+
+    Returns:
+        float32 NumPy array with one row per request and one column per value
+        in `LOOKUP_OUTPUTS`
+    """
+    n_rows = len(features["num_days_model"])
+    outputs = np.empty((n_rows, len(LOOKUP_OUTPUTS)), dtype=np.float32)
+    # Predicted number of days to resolve request, never below 0
+    outputs[:, 0] = np.maximum(
+        models["num_days_model"].predict(features["num_days_model"]), 0
+    )
+    # Probability that request will take < 5 days to resolve
+    outputs[:, 1] = models["under_5_day_model"].predict_proba(
+        features["under_5_day_model"]
+    )[:, 0]
+    # Probability that request will take > 21 days to resolve
+    outputs[:, 2] = models["under_21_day_model"].predict_proba(
+        features["under_21_day_model"]
+    )[:, 1]
+    return outputs
+
+
+def get_reference_dates() -> List[date]:
+    """
+    Get one date per month and day of week, in the order of the table's month
+    and day of week axes.
+
+    Returns:
+        List of `N_MONTHS * N_DAYS_OF_WEEK` dates in `REFERENCE_YEAR`
+    """
+    dates = []
+    for month in range(1, N_MONTHS + 1):
+        # The first seven days of a month cover every day of the week
+        first_week = [date(REFERENCE_YEAR, month, day) for day in range(1, 8)]
+        by_day_of_week = {d.weekday(): d for d in first_week}
+        dates.extend(by_day_of_week[day] for day in range(N_DAYS_OF_WEEK))
+    return dates
+
+
+def build_input_grid(service_codes: List[str]) -> pd.DataFrame:
+    """
+    Enumerate every combination of service code, ward, month, and day of week,
+    in the row-major order of the lookup table.
+
+    Args:
+        service_codes: Service codes that can be requested
+
+    Returns:
+        pandas DataFrame with `servicecode`, `ward`, and `adddate`
+    """
+    code_idx, ward_idx, date_idx = np.indices(
+        (len(service_codes), N_WARDS, N_MONTHS * N_DAYS_OF_WEEK)
+    ).reshape(3, -1)
+    return pd.DataFrame(
+        {
+            "servicecode": np.asarray(service_codes, dtype=object)[code_idx],
+            "ward": ward_idx + 1,
+            "adddate": pd.to_datetime(np.asarray(get_reference_dates())[date_idx]),
+        }
+    )
+
+
+class LookupTable:
+    """
+    Predictions for every service code, ward, month, and day of week, stored as
+    a float32 array with shape (service codes, wards, months, days of week,
+    outputs). A lookup is a dictionary lookup of the service code followed by
+    array indexing.
+
+    Args:
+        table: Array of predictions
+        service_codes: Service codes of the first axis
+        fingerprints: Dictionary where the keys are artifact names and the
+            values are hashes of the artifacts the table was built from
+    """
+
+    def __init__(
+        self,
+        table: np.ndarray,
+        service_codes: List[str],
+        fingerprints: Optional[Dict[str, str]] = None,
+    ):
+        expected_shape = (
+            len(service_codes),
+            N_WARDS,
+            N_MONTHS,
+            N_DAYS_OF_WEEK,
+            len(LOOKUP_OUTPUTS),
+        )
+        if table.shape != expected_shape:
+            raise ValueError(
+                f"table has shape {table.shape}, but shape must be {expected_shape}."
+            )
+        self.table = table
+        self.service_codes = list(service_codes)
+        self.fingerprints = fingerprints or {}
+        self._code_index = {code: i for i, code in enumerate(self.service_codes)}
+
+    def lookup(self, service_code: str, ward: int, adddate: date) -> Optional[Dict]:
+        """
+        Get the predictions for one request.
+
+        Args:
+            service_code: Service code of the request
+            ward: Ward of the request, from 1 to 8
+            adddate: Date of the request
+
+        Returns:
+            Dictionary where the keys are `LOOKUP_OUTPUTS` and the values are
+            predictions, or None if the service code is not in the table
+        """
+        code_idx = self._code_index.get(service_code)
+        if code_idx is None:
+            return None
+        row = self.table[code_idx, ward - 1, adddate.month - 1, adddate.weekday()]
+        return dict(zip(LOOKUP_OUTPUTS, row.tolist()))
+
+    def is_current(self, artifacts: Dict[str, str]) -> bool:
+        """
+        Check whether the table was built from the artifacts' current contents.
+
+        Args:
+            artifacts: Dictionary where the keys are artifact names and the
+                values are paths of the artifacts
+
+        Returns:
+            True if every artifact has the fingerprint stored in the table
+        """
+        try:
+            return all(
+                self.fingerprints.get(name) == get_file_fingerprint(path)
+                for name, path in artifacts.items()
+            )
+        except OSError:
+            return False
+
+    def save(self, path: str) -> None:
+        """
+        Save the table as an uncompressed .npy file that can be memory mapped,
+        with a JSON sidecar holding the service codes and fingerprints.
+
+        Args:
+            path: Path of the .npy file
+        """
+        # Files are written under temporary names and then renamed, so that
+        # readers never see a partially written table. The sidecar is replaced
+        # first because the model registry only watches the .npy file, so a
+        # reload triggered by the new table always reads the new sidecar
+        metadata = {
+            "service_codes": self.service_codes,
+            "outputs": list(LOOKUP_OUTPUTS),
+            "reference_year": REFERENCE_YEAR,
+            "fingerprints": self.fingerprints,
+        }
+        metadata_path = get_metadata_path(path)
+        with open(f"{metadata_path}.tmp", "w") as file:
+            json.dump(metadata, file, indent=2)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+        tmp_path = f"{os.path.splitext(path)[0]}.tmp.npy"
+        np.save(tmp_path, self.table)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "LookupTable":
+        """
+        Load a table saved by `LookupTable.save`.
+
+        Args:
+            path: Path of the .npy file
+            mmap_mode: Memory-map mode passed to `np.load`
+
+        Returns:
+            LookupTable object
+        """
+        with open(get_metadata_path(path), "r") as file:
+            metadata = json.load(file)
+        if tuple(metadata["outputs"]) != LOOKUP_OUTPUTS:
+            raise ValueError(
+                f"Table outputs {metadata['outputs']} do not match {LOOKUP_OUTPUTS}."
+            )
+        return cls(
+            np.load(path, mmap_mode=mmap_mode),
+            metadata["service_codes"],
+            metadata["fingerprints"],
+        )
+
+
+def get_metadata_path(path: str) -> str:
+    """
+    Get the path of the JSON sidecar of a lookup table.
+
+    Args:
+        path: Path of the table's .npy file
+
+    Returns:
+        Path of the JSON file
+    """
+    return f"{os.path.splitext(path)[0]}.json"
+
+
+@instrument()
+def build_lookup_table(
+    service_codes: List[str],
+    models: Dict,
+    fingerprints: Optional[Dict[str, str]] = None,
+) -> LookupTable:
+    """
+    Score every input the app can receive in one batch.
+
+    Args:
+        service_codes: Service codes that can be requested
+        models: Dictionary with the loaded artifacts, keyed like `MODEL_ARTIFACTS`
+        fingerprints: Hashes of the artifacts, stored with the table
+
+    Returns:
+        LookupTable object
+    """
+    service_codes = sorted(set(service_codes))
+    input_df = build_input_grid(service_codes)
+    logger.info(f"Scoring {len(input_df)} input combinations...")
+    outputs = predict_outputs(input_df, models)
+    table = outputs.reshape(
+        len(service_codes), N_WARDS, N_MONTHS, N_DAYS_OF_WEEK, len(LOOKUP_OUTPUTS)
+    )
+    return LookupTable(table, service_codes, fingerprints)
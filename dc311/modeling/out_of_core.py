@@ -0,0 +1,467 @@
+"""
+Train models on a chunked feature store without loading the full feature
+matrix into memory
+"""
+
+from datetime import datetime
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import optuna
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.pipeline import Pipeline
+import xgboost as xgb
+
+from dc311.features.chunked import ChunkedFeatureStore
+from dc311.instrumentation import instrument
+from dc311.modeling import tracking
+from dc311.modeling import train_model as train
+
+logger = logging.getLogger(__name__)
+
+# Datasets that the model is fit on while searching, and when it is refit
+SEARCH_SPLITS = ("train",)
+REFIT_SPLITS = ("train", "validation")
+
+
+def create_sgd_model(
+    params: Dict,
+    task_type: str,
+    model_type: str,
+    n_train_rows: int,
+    random_seed: Optional[int] = 0,
+    eta0: Optional[float] = 0.05,
+):
+    """
+    Create the SGD estimator that minimizes the same objective as the in-memory
+    model with the same hyperparameters. The estimator averages its weights over
+    all steps, which keeps a constant learning rate stable for any penalty.
+
+    Args:
+        params: Dictionary of model hyperparameters
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        model_type: {"logistic", "elasticnet"}
+            Type of in-memory model that the SGD estimator replaces
+        n_train_rows: Number of training rows. LogisticRegression's `C` scales
+            the summed loss, while SGD's `alpha` scales the penalty of the mean
+            loss, so `alpha` is 1 / (C * n_train_rows)
+        random_seed: Seed provided to ensure reproducibility
+        eta0: Learning rate
+
+    Returns:
+        Unfit SGDClassifier or SGDRegressor object
+    """
+    if task_type == "classification" and model_type == "logistic":
+        return SGDClassifier(
+            loss="log_loss",
+            penalty="l2",
+            alpha=1 / (params["logreg_c"] * n_train_rows),
+            learning_rate="constant",
+            eta0=eta0,
+            average=True,
+            random_state=random_seed,
+        )
+    if task_type == "regression" and model_type == "elasticnet":
+        return SGDRegressor(
+            loss="squared_error",
+            penalty="elasticnet",
+            alpha=params["en_alpha"],
+            l1_ratio=params["en_l1_ratio"],
+            learning_rate="constant",
+            eta0=eta0,
+            average=True,
+            random_state=random_seed,
+        )
+    raise ValueError(
+        f"Out-of-core training does not support model_type {model_type} with "
+        f"task_type {task_type}. model_type must be in ('logistic', 'elasticnet', "
+        f"'xgboost')."
+    )
+
+
+@instrument(log_level=logging.DEBUG, log_mlflow=False)
+def fit_sgd(
+    store: ChunkedFeatureStore,
+    target_column: str,
+    params: Dict,
+    task_type: str,
+    model_type: str,
+    splits: Optional[Sequence[str]] = SEARCH_SPLITS,
+    n_epochs: Optional[int] = 5,
+    random_seed: Optional[int] = 0,
+    eta0: Optional[float] = 0.05,
+) -> Pipeline:
+    """
+    Fit a linear model with `partial_fit`, one chunk at a time. Chunks, and
+    rows within each chunk, are shuffled in every epoch.
+
+    Args:
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        params: Dictionary of model hyperparameters
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        model_type: {"logistic", "elasticnet"}
+            Type of in-memory model that the SGD estimator replaces
+        splits: Datasets that the model is fit on
+        n_epochs: Number of passes over the chunks
+        random_seed: Seed provided to ensure reproducibility
+        eta0: Learning rate
+
+    Returns:
+        Fit sklearn model pipeline object
+    """
+    model = create_sgd_model(
+        params,
+        task_type,
+        model_type,
+        n_train_rows=store.count_rows(target_column, splits),
+        random_seed=random_seed,
+        eta0=eta0,
+    )
+    fit_kwargs = {"classes": np.array([0, 1])} if task_type == "classification" else {}
+    rng = np.random.default_rng(random_seed)
+    for _ in range(n_epochs):
+        for X, y in store.iter_chunks(target_column, splits, rng):
+            model.partial_fit(X, y, **fit_kwargs)
+    step_name = "classifier" if task_type == "classification" else "regressor"
+    return Pipeline([(step_name, model)])
+
+
+class ChunkIterator(xgb.DataIter):
+    """
+    Feed the chunks of a store to xgboost one at a time, so that xgboost builds
+    its quantile matrix in external memory pages instead of from one array.
+
+    Args:
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        splits: Datasets whose rows are fed to xgboost
+        cache_prefix: Path prefix of the pages xgboost writes to disk
+    """
+
+    def __init__(
+        self,
+        store: ChunkedFeatureStore,
+        target_column: str,
+        splits: Sequence[str],
+        cache_prefix: str,
+    ):
+        self.store = store
+        self.target_column = target_column
+        self.splits = splits
+        self._chunk = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        while self._chunk < self.store.n_chunks:
+            X, y = self.store.load_chunk(self._chunk, self.target_column, self.splits)
+            self._chunk += 1
+            if len(y):
+                input_data(data=X, label=y)
+                return True
+        return False
+
+    def reset(self) -> None:
+        self._chunk = 0
+
+
+@instrument()
+def build_external_matrices(
+    store: ChunkedFeatureStore,
+    target_column: str,
+    cache_dir: str,
+    train_splits: Optional[Sequence[str]] = SEARCH_SPLITS,
+    holdout_splits: Optional[Sequence[str]] = ("validation",),
+    xgb_settings: Optional[Dict] = None,
+) -> Tuple:
+    """
+    Build xgboost training and holdout matrices from the chunks of a store,
+    with pages cached on disk.
+
+    Args:
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        cache_dir: Directory in which xgboost caches the matrices' pages
+        train_splits: Datasets in the training matrix
+        holdout_splits: Datasets in the holdout matrix. If None, no holdout
+            matrix is built
+        xgb_settings: `xgboost` section of the config file. With the "hist" tree
+            method, ExtMemQuantileDMatrix objects with `max_bin` bins are built
+
+    Returns:
+        Tuple with two elements: training matrix and holdout matrix (or None)
+    """
+    xgb_settings = xgb_settings or {}
+    nthread = xgb_settings.get("nthread")
+    os.makedirs(cache_dir, exist_ok=True)
+    iterators = {
+        name: ChunkIterator(store, target_column, splits, os.path.join(cache_dir, name))
+        for name, splits in (("train", train_splits), ("holdout", holdout_splits))
+        if splits
+    }
+    if xgb_settings.get("tree_method", "hist") == "hist":
+        max_bin = xgb_settings.get("max_bin", 256)
+        dtrain = xgb.ExtMemQuantileDMatrix(
+            iterators["train"], max_bin=max_bin, nthread=nthread
+        )
+        dtest = None
+        if "holdout" in iterators:
+            # The holdout matrix reuses the bins of the training matrix
+            dtest = xgb.ExtMemQuantileDMatrix(
+                iterators["holdout"], max_bin=max_bin, ref=dtrain, nthread=nthread
+            )
+    else:
+        dtrain = xgb.DMatrix(iterators["train"], nthread=nthread)
+        dtest = None
+        if "holdout" in iterators:
+            dtest = xgb.DMatrix(iterators["holdout"], nthread=nthread)
+    return dtrain, dtest
+
+
+def booster_to_pipeline(booster: xgb.Booster, task_type: str) -> Pipeline:
+    """
+    Wrap a trained booster in the same sklearn pipeline that `train.train_model`
+    returns for xgboost, so that it is used and saved like any other model.
+
+    Args:
+        booster: Trained xgboost Booster object
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+
+    Returns:
+        sklearn model pipeline object
+    """
+    if task_type == "classification":
+        step_name, model = "classifier", xgb.XGBClassifier()
+    else:
+        step_name, model = "regressor", xgb.XGBRegressor()
+    model.load_model(booster.save_raw(raw_format="json"))
+    return Pipeline([(step_name, model)])
+
+
+@instrument(log_level=logging.DEBUG, log_mlflow=False)
+def evaluate_chunks(
+    model: Pipeline,
+    store: ChunkedFeatureStore,
+    target_column: str,
+    splits: Sequence[str],
+    task_type: str,
+) -> Dict:
+    """
+    Evaluate a model on the rows of the given datasets, predicting one chunk at
+    a time. Only the targets and predictions are held in memory.
+
+    Args:
+        model: A fit model pipeline object
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        splits: Datasets on which the model is evaluated
+        task_type: {'classification', 'regression'}
+            Type of task that will be performed with model
+
+    Returns:
+        Dictionary where the keys are evaluation metrics and the values
+        are the metric values.
+    """
+    y_true, y_score = [], []
+    for X, y in store.iter_chunks(target_column, splits):
+        y_true.append(y)
+        if task_type == "classification":
+            y_score.append(model.predict_proba(X)[:, 1])
+        else:
+            y_score.append(model.predict(X))
+    return train.compute_metrics(
+        np.concatenate(y_true), np.concatenate(y_score), task_type
+    )
+
+
+def objective(
+    trial: optuna.trial.Trial,
+    store: ChunkedFeatureStore,
+    target_column: str,
+    config: Dict,
+    xgb_matrices: Optional[Tuple] = None,
+    parent_run_id: Optional[str] = None,
+    run_logger: Optional[tracking.BatchedRunLogger] = None,
+) -> float:
+    """
+    Fit one model on the training chunks and score it on the validation chunks.
+
+    Args:
+        trial: optuna Trial object on which to optimize
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        config: Contents of the config file
+        xgb_matrices: Training and holdout matrices from
+            `build_external_matrices`, shared by every xgboost trial
+        parent_run_id: ID of the mlflow run under which the trial's run is nested
+        run_logger: Batched logger from `tracking.open_run_logger`
+
+    Returns:
+        Score of objective function associated with training run
+    """
+    task_type, model_type = config["task_type"], config["model_type"]
+    out_of_core_config = config.get("out_of_core", {})
+    child_run_name = (
+        f"child_run_{trial.number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    )
+    with tracking.start_run(child_run_name, parent_run_id, run_logger) as run:
+        params = train.suggest_params(trial, task_type, model_type, config["ranges"])
+        run.log_params(params)
+        try:
+            if model_type == "xgboost":
+                dtrain, dtest = xgb_matrices
+                early_stopping_rounds = config.get("early_stopping_rounds")
+                booster = train.train_xgb_booster(
+                    dtrain=dtrain,
+                    dtest=dtest,
+                    params=params,
+                    task_type=task_type,
+                    random_seed=config["random_seed"],
+                    early_stopping_rounds=early_stopping_rounds,
+                    callbacks=[train.XGBoostPruningCallback(trial)],
+                    xgb_settings=config.get("xgboost"),
+                )
+                iteration_range = (0, 0)
+                if early_stopping_rounds:
+                    run.log_metric("xgb_best_iteration", booster.best_iteration)
+                    trial.set_user_attr("xgb_best_iteration", booster.best_iteration)
+                    iteration_range = (0, booster.best_iteration + 1)
+                metric_dict = train.compute_metrics(
+                    dtest.get_label(),
+                    booster.predict(dtest, iteration_range=iteration_range),
+                    task_type,
+                )
+            else:
+                model = fit_sgd(
+                    store,
+                    target_column,
+                    params,
+                    task_type,
+                    model_type,
+                    n_epochs=out_of_core_config.get("n_epochs", 5),
+                    random_seed=config["random_seed"],
+                    eta0=out_of_core_config.get("eta0", 0.05),
+                )
+                metric_dict = evaluate_chunks(
+                    model, store, target_column, ("validation",), task_type
+                )
+        except optuna.TrialPruned:
+            run.set_tag("pruned", True)
+            raise
+
+        run.log_metrics(metric_dict)
+        return metric_dict[train.OBJECTIVE_METRICS[task_type]]
+
+
+def run_search(
+    store: ChunkedFeatureStore,
+    target_column: str,
+    config: Dict,
+    cache_dir: str,
+    run_logger: Optional[tracking.BatchedRunLogger] = None,
+) -> Tuple[Dict, float]:
+    """
+    Search for the best hyperparameters with an optuna study whose trials
+    stream the store's chunks.
+
+    Args:
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        config: Contents of the config file
+        cache_dir: Directory in which xgboost caches its external memory pages
+        run_logger: Batched logger from `tracking.open_run_logger`
+
+    Returns:
+        Tuple with two elements: best hyperparameters and their holdout score
+    """
+    if config["pca"]:
+        raise ValueError("pca is not supported with out-of-core training.")
+    xgb_matrices = None
+    if config["model_type"] == "xgboost":
+        logger.info("Building external memory xgboost matrices shared by all trials...")
+        xgb_matrices = build_external_matrices(
+            store,
+            target_column,
+            os.path.join(cache_dir, "search"),
+            xgb_settings=config.get("xgboost"),
+        )
+
+    sampler = optuna.samplers.TPESampler(seed=config["random_seed"])
+    study = optuna.create_study(
+        direction="minimize",
+        sampler=sampler,
+        pruner=train.create_pruner(config.get("pruner")),
+    )
+    study.optimize(
+        lambda trial: objective(
+            trial=trial,
+            store=store,
+            target_column=target_column,
+            config=config,
+            xgb_matrices=xgb_matrices,
+            run_logger=run_logger,
+        ),
+        n_trials=config["n_trials"],
+    )
+    return train.get_best_params(study.best_trial), study.best_trial.value
+
+
+def fit_model(
+    store: ChunkedFeatureStore,
+    target_column: str,
+    params: Dict,
+    config: Dict,
+    cache_dir: str,
+    splits: Optional[List[str]] = REFIT_SPLITS,
+) -> Pipeline:
+    """
+    Refit a model with the best hyperparameters on the chunks of the given
+    datasets.
+
+    Args:
+        store: Chunked feature store
+        target_column: Name of the target column in the store
+        params: Dictionary of model hyperparameters
+        config: Contents of the config file
+        cache_dir: Directory in which xgboost caches its external memory pages
+        splits: Datasets that the model is fit on
+
+    Returns:
+        Fit sklearn model pipeline object
+    """
+    if config["model_type"] == "xgboost":
+        dtrain, _ = build_external_matrices(
+            store,
+            target_column,
+            os.path.join(cache_dir, "refit"),
+            train_splits=splits,
+            holdout_splits=None,
+            xgb_settings=config.get("xgboost"),
+        )
+        booster = train.train_xgb_booster(
+            dtrain=dtrain,
+            dtest=None,
+            params=params,
+            task_type=config["task_type"],
+            random_seed=config["random_seed"],
+            xgb_settings=config.get("xgboost"),
+        )
+        return booster_to_pipeline(booster, config["task_type"])
+
+    out_of_core_config = config.get("out_of_core", {})
+    return fit_sgd(
+        store,
+        target_column,
+        params,
+        config["task_type"],
+        config["model_type"],
+        splits=splits,
+        n_epochs=out_of_core_config.get("n_epochs", 5),
+        random_seed=config["random_seed"],
+        eta0=out_of_core_config.get("eta0", 0.05),
+    )
@@ -0,0 +1,298 @@
+"""
+Run optuna trials in parallel across a process pool
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import json
+import logging
+import multiprocessing
+import os
+from typing import Dict, List, Optional
+
+import mlflow
+import numpy as np
+import optuna
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+import scipy.sparse as sp
+from threadpoolctl import threadpool_limits
+
+from dc311.modeling import tracking
+from dc311.modeling import train_model as train
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by BLAS/OpenMP libraries when they are loaded
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+def save_training_data(data: train.TrainingData, cache_dir: str) -> None:
+    """
+    Save training data as uncompressed .npy files that worker processes can
+    memory map instead of receiving pickled copies.
+
+    Args:
+        data: Train and holdout matrices from `train.prepare_training_data`
+        cache_dir: Directory in which to save the arrays
+
+    Returns:
+        None. Arrays and a `metadata.json` file are saved to `cache_dir`.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    metadata = {"feature_names": data.feature_names, "sparse": {}}
+    for name in ("X_train", "y_train", "X_test", "y_test"):
+        arr = getattr(data, name)
+        if sp.issparse(arr):
+            metadata["sparse"][name] = list(arr.shape)
+            np.save(os.path.join(cache_dir, f"{name}_data.npy"), arr.data)
+            np.save(os.path.join(cache_dir, f"{name}_indices.npy"), arr.indices)
+            np.save(os.path.join(cache_dir, f"{name}_indptr.npy"), arr.indptr)
+        else:
+            np.save(os.path.join(cache_dir, f"{name}.npy"), arr)
+    with open(os.path.join(cache_dir, "metadata.json"), "w") as file:
+        json.dump(metadata, file)
+
+
+def load_training_data(
+    cache_dir: str, mmap_mode: Optional[str] = "r"
+) -> train.TrainingData:
+    """
+    Load training data saved by `save_training_data`.
+
+    Args:
+        cache_dir: Directory in which the arrays were saved
+        mmap_mode: Memory-map mode passed to `np.load`. With the default "r",
+            all processes share the same read-only pages of the arrays
+
+    Returns:
+        TrainingData backed by the memory-mapped arrays
+    """
+    with open(os.path.join(cache_dir, "metadata.json"), "r") as file:
+        metadata = json.load(file)
+
+    arrays = {}
+    for name in ("X_train", "y_train", "X_test", "y_test"):
+        if name in metadata["sparse"]:
+            arrays[name] = sp.csr_matrix(
+                (
+                    np.load(os.path.join(cache_dir, f"{name}_data.npy"), mmap_mode),
+                    np.load(os.path.join(cache_dir, f"{name}_indices.npy"), mmap_mode),
+                    np.load(os.path.join(cache_dir, f"{name}_indptr.npy"), mmap_mode),
+                ),
+                shape=tuple(metadata["sparse"][name]),
+                copy=False,
+            )
+        else:
+            arrays[name] = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode)
+    return train.TrainingData(feature_names=metadata["feature_names"], **arrays)
+
+
+def create_journal_storage(storage_path: str) -> JournalStorage:
+    """
+    Create a local optuna storage that several processes can share.
+
+    Args:
+        storage_path: Path of the journal file
+
+    Returns:
+        optuna JournalStorage object backed by the journal file
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(storage_path)), exist_ok=True)
+    return JournalStorage(JournalFileBackend(storage_path))
+
+
+@contextmanager
+def limit_thread_env(n_threads: int):
+    """
+    Temporarily set the thread count environment variables of BLAS/OpenMP
+    libraries, so that processes started within the context inherit them.
+
+    Args:
+        n_threads: Number of threads each library may use
+    """
+    previous = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(n_threads) for var in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _run_worker(
+    worker_id: int,
+    n_trials: int,
+    study_name: str,
+    storage_path: str,
+    cache_dir: str,
+    n_threads: int,
+    tracking_uri: str,
+    experiment_id: str,
+    parent_run_id: str,
+    objective_kwargs: Dict,
+    pruner_config: Optional[Dict] = None,
+    fidelity_fractions: Optional[List[float]] = None,
+    tracking_config: Optional[Dict] = None,
+) -> int:
+    """
+    Run a share of the study's trials in a worker process.
+
+    Returns:
+        Number of trials run by the worker
+    """
+    with threadpool_limits(limits=n_threads):
+        optuna.logging.enable_propagation()
+        mlflow.set_tracking_uri(tracking_uri)
+        mlflow.set_experiment(experiment_id=experiment_id)
+
+        data = load_training_data(cache_dir)
+        # xgboost matrices and fidelity levels are built once per worker and
+        # shared by all of the worker's trials
+        xgb_settings = dict(objective_kwargs.get("xgb_settings") or {})
+        xgb_settings["nthread"] = n_threads
+        xgb_matrices, fidelity_levels = None, None
+        model_type = objective_kwargs.get("model_type")
+        if fidelity_fractions:
+            fidelity_levels = train.build_fidelity_levels(
+                data,
+                fidelity_fractions,
+                task_type=objective_kwargs["task_type"],
+                model_type=model_type,
+                pca=objective_kwargs.get("pca"),
+                random_seed=objective_kwargs.get("random_seed", 0),
+                xgb_settings=xgb_settings,
+            )
+        elif model_type == "xgboost" and not objective_kwargs.get("pca"):
+            xgb_matrices = train.build_xgb_matrices(data, xgb_settings)
+
+        # Workers need distinct seeds, otherwise they suggest the same parameters
+        seed = objective_kwargs.get("random_seed", 0) + worker_id
+        study = optuna.load_study(
+            study_name=study_name,
+            storage=create_journal_storage(storage_path),
+            sampler=optuna.samplers.TPESampler(seed=seed),
+            pruner=train.create_pruner(pruner_config),
+        )
+        # Each worker queues its trial runs on its own logger
+        with tracking.open_run_logger(tracking_config, experiment_id) as run_logger:
+            study.optimize(
+                lambda trial: train.objective(
+                    trial=trial,
+                    data=data,
+                    n_threads=n_threads,
+                    parent_run_id=parent_run_id,
+                    xgb_matrices=xgb_matrices,
+                    fidelity_levels=fidelity_levels,
+                    run_logger=run_logger,
+                    **objective_kwargs,
+                ),
+                n_trials=n_trials,
+            )
+    return n_trials
+
+
+def optimize_in_parallel(
+    data: train.TrainingData,
+    study_name: str,
+    storage_path: str,
+    cache_dir: str,
+    n_trials: int,
+    n_jobs: int,
+    parent_run_id: str,
+    objective_kwargs: Dict,
+    n_threads: Optional[int] = None,
+    direction: Optional[str] = "minimize",
+    pruner_config: Optional[Dict] = None,
+    fidelity_fractions: Optional[List[float]] = None,
+    tracking_config: Optional[Dict] = None,
+) -> optuna.study.Study:
+    """
+    Optimize a study with trials spread across a pool of worker processes.
+
+    Workers coordinate through a journal file storage and memory map the
+    training data from `cache_dir`, so the matrices are never pickled.
+    Each trial's mlflow run is nested under `parent_run_id`.
+
+    Args:
+        data: Train and holdout matrices from `train.prepare_training_data`
+        study_name: Name of the optuna study
+        storage_path: Path of the journal file shared by the workers
+        cache_dir: Directory in which to save memory-mapped training data
+        n_trials: Total number of trials across all workers
+        n_jobs: Number of worker processes
+        parent_run_id: ID of the mlflow run under which trial runs are nested
+        objective_kwargs: Keyword arguments passed to `train.objective`, other
+            than `trial`, `data`, `n_threads`, and `parent_run_id`
+        n_threads: Number of BLAS/xgboost threads per worker. If None, the
+            available cores are divided evenly among the workers
+        direction: {"minimize", "maximize"}
+            Direction of optimization
+        pruner_config: `pruner` section of the config file, passed to
+            `train.create_pruner` in every worker
+        fidelity_fractions: Fractions of the training set used by a
+            multi-fidelity search. If None, trials train on the full training set
+        tracking_config: `tracking` section of the config file, passed to
+            `tracking.open_run_logger` in every worker
+
+    Returns:
+        optuna Study object with the results of all trials
+    """
+    if n_threads is None:
+        n_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+
+    logger.info(f"Saving training data for workers to {cache_dir}...")
+    save_training_data(data, cache_dir)
+
+    study = optuna.create_study(
+        study_name=study_name,
+        storage=create_journal_storage(storage_path),
+        direction=direction,
+        load_if_exists=True,
+    )
+
+    trials_per_worker = [
+        n_trials // n_jobs + (1 if i < n_trials % n_jobs else 0) for i in range(n_jobs)
+    ]
+    active_run = mlflow.get_run(parent_run_id)
+    logger.info(
+        f"Running {n_trials} trials across {n_jobs} workers "
+        f"with {n_threads} threads each..."
+    )
+    with limit_thread_env(n_threads):
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_worker,
+                    worker_id=worker_id,
+                    n_trials=worker_trials,
+                    study_name=study_name,
+                    storage_path=storage_path,
+                    cache_dir=cache_dir,
+                    n_threads=n_threads,
+                    tracking_uri=mlflow.get_tracking_uri(),
+                    experiment_id=active_run.info.experiment_id,
+                    parent_run_id=parent_run_id,
+                    objective_kwargs=objective_kwargs,
+                    pruner_config=pruner_config,
+                    fidelity_fractions=fidelity_fractions,
+                    tracking_config=tracking_config,
+                )
+                for worker_id, worker_trials in enumerate(trials_per_worker)
+                if worker_trials > 0
+            ]
+            for future in futures:
+                future.result()
+
+    return study
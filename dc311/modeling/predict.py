@@ -0,0 +1,263 @@
+"""
+Score files of 311 requests in chunks across a pool of worker processes
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, Iterator, Optional
+
+import joblib
+import pandas as pd
+
+from dc311.instrumentation import instrument, record_rows
+from dc311.modeling import fused, lookup
+from dc311.modeling.parallel import limit_thread_env
+
+logger = logging.getLogger(__name__)
+
+# Columns read from request files, other than the ID column
+INPUT_COLUMNS = ["servicecode", "ward", "adddate"]
+
+# Models loaded once by each worker process
+_worker_models = None
+
+
+def get_file_format(path: str) -> str:
+    """
+    Get the format of a request file from its extension.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        "csv" or "parquet"
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(
+        f"File extension {extension} is not supported. "
+        f"extension must be in ('.csv', '.parquet', '.pq')."
+    )
+
+
+def iter_chunks(
+    path: str, chunk_size: int, id_column: Optional[str] = "objectid"
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV or Parquet file of requests in chunks, so that memory use is
+    bounded by the chunk size instead of the size of the file.
+
+    Args:
+        path: Path of the file
+        chunk_size: Number of rows per chunk
+        id_column: Column identifying each request, used as the index of the
+            chunks. If None, rows are identified by their position in the file
+
+    Returns:
+        Iterator of pandas DataFrames with `INPUT_COLUMNS`
+    """
+    columns = INPUT_COLUMNS + ([id_column] if id_column else [])
+    if get_file_format(path) == "csv":
+        chunks = pd.read_csv(
+            path, usecols=columns, parse_dates=["adddate"], chunksize=chunk_size
+        )
+    else:
+        import pyarrow.parquet as pq
+
+        chunks = (
+            batch.to_pandas()
+            for batch in pq.ParquetFile(path).iter_batches(
+                batch_size=chunk_size, columns=columns
+            )
+        )
+
+    n_rows = 0
+    for chunk in chunks:
+        if id_column:
+            chunk = chunk.set_index(id_column)
+        else:
+            chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+        chunk["adddate"] = pd.to_datetime(chunk["adddate"])
+        n_rows += len(chunk)
+        yield chunk
+
+
+def load_models(artifacts: Dict[str, str], fused_path: Optional[str] = None) -> Dict:
+    """
+    Load the feature pipelines and models used to score requests.
+
+    Args:
+        artifacts: Dictionary where the keys are the artifact names of
+            `lookup.MODEL_ARTIFACTS` and the values are paths of joblib files
+        fused_path: Path of a fused predictor built from the artifacts. It is
+            loaded instead of the artifacts if it exists and is up to date
+
+    Returns:
+        Dictionary with the loaded artifacts
+    """
+    if fused_path is None:
+        return {name: joblib.load(path) for name, path in artifacts.items()}
+    paths = {**artifacts, "fused_predictor": fused_path}
+    return fused.select_models(
+        artifacts, fused_path, lambda name: joblib.load(paths[name])
+    )
+
+
+@instrument(log_level=logging.DEBUG, log_mlflow=False)
+def score_chunk(chunk: pd.DataFrame, models: Dict) -> pd.DataFrame:
+    """
+    Score a chunk of requests with the same predictions that the app shows.
+
+    Args:
+        chunk: pandas DataFrame with `INPUT_COLUMNS`
+        models: Dictionary with the loaded artifacts, from `load_models`
+
+    Returns:
+        pandas DataFrame with one float32 column per value in
+        `lookup.LOOKUP_OUTPUTS`, indexed like `chunk`
+    """
+    outputs = lookup.predict_outputs(chunk, models)
+    return pd.DataFrame(outputs, index=chunk.index, columns=lookup.LOOKUP_OUTPUTS)
+
+
+def _init_worker(artifacts: Dict[str, str], fused_path: Optional[str]) -> None:
+    global _worker_models
+    _worker_models = load_models(artifacts, fused_path)
+
+
+def _score_in_worker(chunk: pd.DataFrame) -> pd.DataFrame:
+    return score_chunk(chunk, _worker_models)
+
+
+class PredictionWriter:
+    """
+    Append scored chunks to a CSV or Parquet file.
+
+    Args:
+        path: Path of the output file. Its extension sets the format
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.file_format = get_file_format(path)
+        self._parquet_writer = None
+        self._n_chunks = 0
+
+    def write(self, predictions: pd.DataFrame) -> None:
+        if self.file_format == "csv":
+            predictions.to_csv(
+                self.path,
+                mode="w" if self._n_chunks == 0 else "a",
+                header=self._n_chunks == 0,
+            )
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            batch = pa.Table.from_pandas(predictions)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, batch.schema)
+            self._parquet_writer.write_table(batch)
+        self._n_chunks += 1
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+@instrument()
+def predict_file(
+    input_path: str,
+    output_path: str,
+    artifacts: Dict[str, str],
+    chunk_size: Optional[int] = 100_000,
+    n_jobs: Optional[int] = 1,
+    id_column: Optional[str] = "objectid",
+    log_every: Optional[int] = 10,
+    fused_path: Optional[str] = None,
+) -> Dict:
+    """
+    Score every request in a file and write the predictions in the same order.
+
+    With `n_jobs` > 1, chunks are scored in a pool of worker processes that
+    each load the models once. At most two chunks per worker are read ahead of
+    the writer, so memory stays bounded by the chunk size.
+
+    Args:
+        input_path: Path of the CSV or Parquet file of requests
+        output_path: Path of the CSV or Parquet file of predictions
+        artifacts: Dictionary where the keys are the artifact names of
+            `lookup.MODEL_ARTIFACTS` and the values are paths of joblib files
+        chunk_size: Number of rows per chunk
+        n_jobs: Number of worker processes. If 1, chunks are scored in the
+            current process
+        id_column: Column identifying each request, written with the predictions
+        log_every: Number of chunks between progress logs
+        fused_path: Path of a fused predictor, used instead of the artifacts if
+            it is up to date with them
+
+    Returns:
+        Dictionary with the number of rows scored, seconds taken, and rows per
+        second
+    """
+    start = time.perf_counter()
+    n_rows = 0
+    writer = PredictionWriter(output_path)
+
+    def write(predictions: pd.DataFrame, n_chunks: int) -> None:
+        nonlocal n_rows
+        writer.write(predictions)
+        n_rows += len(predictions)
+        if n_chunks % log_every == 0:
+            elapsed = time.perf_counter() - start
+            logger.info(f"Scored {n_rows} rows ({n_rows / elapsed:,.0f} rows/sec)")
+
+    chunks = iter_chunks(input_path, chunk_size, id_column)
+    n_chunks = 0
+    try:
+        if n_jobs == 1:
+            models = load_models(artifacts, fused_path)
+            for chunk in chunks:
+                n_chunks += 1
+                write(score_chunk(chunk, models), n_chunks)
+        else:
+            # Each worker gets one BLAS/OpenMP thread so that workers do not
+            # oversubscribe the cores
+            with limit_thread_env(1), ProcessPoolExecutor(
+                max_workers=n_jobs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(artifacts, fused_path),
+            ) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(_score_in_worker, chunk))
+                    if len(pending) >= 2 * n_jobs:
+                        n_chunks += 1
+                        write(pending.popleft().result(), n_chunks)
+                while pending:
+                    n_chunks += 1
+                    write(pending.popleft().result(), n_chunks)
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    record_rows(rows_out=n_rows)
+    stats = {
+        "n_rows": n_rows,
+        "seconds": seconds,
+        "rows_per_sec": n_rows / seconds if seconds > 0 else float("nan"),
+    }
+    logger.info(
+        f"Scored {n_rows} rows in {seconds:.2f}s "
+        f"({stats['rows_per_sec']:,.0f} rows/sec) with {n_jobs} process(es)"
+    )
+    return stats
@@ -0,0 +1,190 @@
+"""
+Load model artifacts lazily, share them process-wide, and reload them when
+their files change
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedArtifact(NamedTuple):
+    """
+    Artifact held by a ModelRegistry, with the file signature it was loaded from.
+    """
+
+    obj: Any
+    signature: Tuple[int, int]
+    load_seconds: float
+    loaded_at: float
+
+
+def get_file_signature(path: str) -> Tuple[int, int]:
+    """
+    Get a cheap signature of a file that changes whenever the file is rewritten.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        Tuple with two elements: modification time in nanoseconds, and size in
+        bytes
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModelRegistry:
+    """
+    Registry of joblib artifacts that are loaded on first use and then shared
+    by every caller in the process.
+
+    Every `check_interval` seconds, `get` compares the file of an artifact with
+    the file it was loaded from. When the file has changed, the new artifact
+    is loaded, in a background thread unless `background` is False, and
+    swapped in once it is fully loaded. Until then, callers keep getting the
+    previous artifact. If the new file cannot be loaded, e.g. because it is
+    still being written, the previous artifact is kept and loading is tried
+    again at the next check.
+
+    Args:
+        artifacts: Dictionary where the keys are artifact names and the values
+            are paths of joblib files
+        check_interval: Minimum number of seconds between checks of a file
+        background: Whether changed artifacts are reloaded in a background
+            thread instead of in the caller of `get`
+        loaders: Dictionary where the keys are artifact names and the values
+            are functions that load an artifact from its path. Artifacts without
+            a loader are loaded with `joblib.load`
+    """
+
+    def __init__(
+        self,
+        artifacts: Dict[str, str],
+        check_interval: Optional[float] = 2.0,
+        background: Optional[bool] = True,
+        loaders: Optional[Dict[str, Callable[[str], Any]]] = None,
+    ):
+        self.artifacts = dict(artifacts)
+        self.check_interval = check_interval
+        self.background = background
+        self.loaders = loaders or {}
+        self._loaded = {}
+        self._last_checked = {}
+        self._reloading = set()
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.artifacts}
+
+    def get(self, name: str) -> Any:
+        """
+        Get an artifact, loading it if it has not been loaded yet.
+
+        Args:
+            name: Name of the artifact
+
+        Returns:
+            Loaded artifact
+        """
+        if name not in self.artifacts:
+            raise ValueError(
+                f"Artifact {name} is not registered. "
+                f"name must be in {tuple(self.artifacts)}."
+            )
+
+        loaded = self._loaded.get(name)
+        if loaded is None:
+            # Only one caller loads an artifact, the others wait for it
+            with self._load_locks[name]:
+                loaded = self._loaded.get(name)
+                if loaded is None:
+                    loaded = self._load(name)
+            return loaded.obj
+
+        now = time.monotonic()
+        if now - self._last_checked.get(name, 0.0) >= self.check_interval:
+            self._last_checked[name] = now
+            self._check(name, loaded)
+        return self._loaded[name].obj
+
+    def load_times(self) -> Dict[str, float]:
+        """
+        Get the number of seconds it took to load each loaded artifact.
+
+        Returns:
+            Dictionary where the keys are artifact names and the values are
+            load times in seconds
+        """
+        return {name: loaded.load_seconds for name, loaded in self._loaded.items()}
+
+    def _load(self, name: str) -> LoadedArtifact:
+        path = self.artifacts[name]
+        start = time.perf_counter()
+        signature = get_file_signature(path)
+        obj = self.loaders.get(name, joblib.load)(path)
+        loaded = LoadedArtifact(
+            obj, signature, time.perf_counter() - start, time.time()
+        )
+        # Replacing the dictionary entry swaps the artifact for all callers at once
+        self._loaded[name] = loaded
+        self._last_checked[name] = time.monotonic()
+        logger.info(f"Loaded {name} from {path} in {loaded.load_seconds:.3f}s")
+        return loaded
+
+    def _check(self, name: str, loaded: LoadedArtifact) -> None:
+        try:
+            changed = get_file_signature(self.artifacts[name]) != loaded.signature
+        except OSError:
+            logger.warning(f"Could not read {self.artifacts[name]}, keeping {name}")
+            return
+        if not changed:
+            return
+
+        with self._lock:
+            if name in self._reloading:
+                return
+            self._reloading.add(name)
+        if self.background:
+            threading.Thread(target=self._reload, args=(name,), daemon=True).start()
+        else:
+            self._reload(name)
+
+    def _reload(self, name: str) -> None:
+        try:
+            with self._load_locks[name]:
+                self._load(name)
+        except Exception:
+            logger.exception(f"Failed to reload {name}, keeping previous version")
+        finally:
+            with self._lock:
+                self._reloading.discard(name)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(artifacts: Dict[str, str], **kwargs) -> ModelRegistry:
+    """
+    Get the process-wide registry of a set of artifacts, creating it on first
+    use. Scripts that are re-executed within the same process, like Streamlit
+    apps, get the same registry and its loaded artifacts on every run.
+
+    Args:
+        artifacts: Dictionary where the keys are artifact names and the values
+            are paths of joblib files
+        **kwargs: Keyword arguments passed to ModelRegistry when it is created
+
+    Returns:
+        ModelRegistry object
+    """
+    key = tuple(sorted(artifacts.items()))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(artifacts, **kwargs)
+        return _registries[key]
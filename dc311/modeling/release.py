@@ -0,0 +1,381 @@
+"""
+Train every production model in one invocation, sharing the loaded data and
+the machine's cores among the models' studies
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+from datetime import datetime
+import logging
+import multiprocessing
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import joblib
+import mlflow
+import mlflow.sklearn
+from mlflow.tracking import MlflowClient
+import numpy as np
+import optuna
+import pandas as pd
+import scipy.sparse as sp
+from threadpoolctl import threadpool_limits
+
+import dc311.features.target as targ
+from dc311.modeling import lookup, parallel, tracking
+from dc311.modeling import train_model as train
+
+logger = logging.getLogger(__name__)
+
+# Shared feature pipeline saved by `create_features --multi-target`
+SHARED_FEATURE_PIPELINE_PATH = os.path.join("models", "feature_pipeline.joblib")
+
+
+def get_model_name(task_type: str, target_threshold: Optional[int] = None) -> str:
+    """
+    Get the name under which a model is saved in `models/`.
+
+    Args:
+        task_type: {"classification", "regression"}
+        target_threshold: Threshold of the classification target
+
+    Returns:
+        Name of the model, e.g. "under_5_day_model" or "num_days_model"
+    """
+    if task_type == "classification":
+        return f"under_{target_threshold}_day_model"
+    if task_type == "regression":
+        return "num_days_model"
+    raise ValueError(
+        f"task_type of {task_type} provided. task_type must be in "
+        f"('classification', 'regression')."
+    )
+
+
+def get_model_configs(config: Dict) -> Dict[str, Dict]:
+    """
+    Get the config of each model listed in `models` of the `release` section.
+    Each entry of the list replaces keys of the config file, such as
+    `task_type`, `target_threshold`, `model_type`, or `n_trials`.
+
+    Args:
+        config: Contents of the config file
+
+    Returns:
+        Dictionary from model name to the config the model is trained with
+    """
+    model_configs = {}
+    for spec in config.get("release", {}).get("models", []):
+        model_config = copy.deepcopy(config)
+        model_config.update(spec)
+        name = get_model_name(
+            model_config["task_type"], model_config.get("target_threshold")
+        )
+        if name in model_configs:
+            raise ValueError(f"{name} is listed more than once in `release`.")
+        model_configs[name] = model_config
+    if not model_configs:
+        raise ValueError("No models listed in `models` of the `release` section.")
+    return model_configs
+
+
+def _save_model_data(
+    feature_df: pd.DataFrame,
+    target_df: pd.DataFrame,
+    split_codes: np.ndarray,
+    model_configs: Dict[str, Dict],
+    cache_dir: str,
+    dtype: Optional[str] = "float32",
+    sparse: Optional[bool] = False,
+) -> Dict[str, Dict]:
+    """
+    Save the training data of every model for `parallel.load_training_data`.
+    Feature matrices are saved once per set of rows, and shared by every model
+    trained on those rows, e.g. all classification models.
+
+    Returns:
+        Dictionary from model name to a dictionary with the directory of its
+        feature matrices and the directory of its targets
+    """
+    data_dirs = {}
+    saved_rows = set()
+    for name, model_config in model_configs.items():
+        column = targ.get_target_column_name(
+            model_config["task_type"], model_config.get("target_threshold")
+        )
+        if column not in target_df.columns:
+            raise ValueError(
+                f"{column} not found in the target table. Add "
+                f"{model_config.get('target_threshold')} to `target_thresholds` "
+                "and re-create features with `--multi-target`."
+            )
+        has_target = target_df[column].notna().to_numpy()
+        if has_target.all():
+            rows_key, rows = "all_rows", slice(None)
+        else:
+            rows_key, rows = f"rows_with_{column}", has_target
+        model_target_df = target_df.iloc[rows][[column]].rename(
+            columns={column: "target"}
+        )
+
+        for holdout_set_type in ("validation", "test"):
+            rows_dir = os.path.join(cache_dir, rows_key, holdout_set_type)
+            if (rows_key, holdout_set_type) not in saved_rows:
+                data = train.prepare_training_data(
+                    feature_df=feature_df.iloc[rows],
+                    target_df=model_target_df,
+                    split_codes=split_codes[rows],
+                    holdout_set_type=holdout_set_type,
+                    dtype=dtype,
+                    sparse=sparse,
+                )
+                parallel.save_training_data(data, rows_dir)
+                saved_rows.add((rows_key, holdout_set_type))
+
+            # Targets are split like the feature matrices of the same rows
+            _, y_train, _, y_test = train.split_data(
+                feature_df.iloc[rows, :0],
+                model_target_df,
+                split_codes[rows],
+                holdout_set_type,
+            )
+            target_dir = os.path.join(cache_dir, name, holdout_set_type)
+            os.makedirs(target_dir, exist_ok=True)
+            np.save(os.path.join(target_dir, "y_train.npy"), y_train.to_numpy())
+            np.save(os.path.join(target_dir, "y_test.npy"), y_test.to_numpy())
+            data_dirs.setdefault(name, {})[holdout_set_type] = (rows_dir, target_dir)
+    return data_dirs
+
+
+def _load_model_data(rows_dir: str, target_dir: str) -> train.TrainingData:
+    """Memory map a model's feature matrices and targets"""
+    data = parallel.load_training_data(rows_dir)
+    return data._replace(
+        y_train=np.load(os.path.join(target_dir, "y_train.npy"), mmap_mode="r"),
+        y_test=np.load(os.path.join(target_dir, "y_test.npy"), mmap_mode="r"),
+    )
+
+
+def _to_frame(X, feature_names: List[str]):
+    """Name the columns of a dense matrix, as the app's feature pipelines do"""
+    return X if sp.issparse(X) else pd.DataFrame(X, columns=feature_names)
+
+
+def _train_release_model(
+    name: str,
+    model_config: Dict,
+    data_dirs: Dict,
+    n_threads: int,
+    tracking_uri: str,
+    experiment_id: str,
+    output_path: str,
+    retrain_with_test_set: Optional[bool] = False,
+) -> Dict:
+    """
+    Search hyperparameters for one model, then fit it with the best ones on
+    the training and validation sets, evaluate it on the test set, and log it
+    to its own mlflow run. Runs in a worker process.
+
+    Returns:
+        Dictionary with the model's name, mlflow run ID, best holdout score,
+        and test metrics
+    """
+    task_type = model_config["task_type"]
+    with threadpool_limits(limits=n_threads):
+        optuna.logging.enable_propagation()
+        mlflow.set_tracking_uri(tracking_uri)
+        mlflow.set_experiment(experiment_id=experiment_id)
+
+        data = _load_model_data(*data_dirs["validation"])
+        run_name = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        with mlflow.start_run(run_name=run_name) as run:
+            mlflow.log_params(
+                {
+                    "release_model": name,
+                    "task_type": task_type,
+                    "model_type": model_config["model_type"],
+                    "target_threshold": model_config.get("target_threshold"),
+                }
+            )
+            with tracking.open_run_logger(
+                model_config.get("tracking"), experiment_id
+            ) as run_logger:
+                best_params, best_value = train.run_search(
+                    data, model_config, run_logger, n_threads, run.info.run_id
+                )
+            logger.info(f"Best params of {name} are: {best_params}")
+
+            final = _load_model_data(*data_dirs["test"])
+            X_train = _to_frame(final.X_train, final.feature_names)
+            X_test = _to_frame(final.X_test, final.feature_names)
+            fit_kwargs = {
+                "params": best_params,
+                "task_type": task_type,
+                "model_type": model_config["model_type"],
+                "pca": model_config["pca"],
+                "random_seed": model_config["random_seed"],
+                "n_threads": n_threads,
+                "xgb_settings": model_config.get("xgboost"),
+            }
+            model = train.train_model(X=X_train, y=final.y_train, **fit_kwargs)
+            metric_dict = train.evaluate_model(model, X_test, final.y_test, task_type)
+            mlflow.sklearn.log_model(model, "best_model")
+            mlflow.log_params(best_params)
+            mlflow.log_metric("best_val_score", best_value)
+            mlflow.log_metrics({f"test_{k}": v for k, v in metric_dict.items()})
+
+            if retrain_with_test_set:
+                logger.info(f"Retraining {name} with the test set...")
+                if sp.issparse(final.X_train):
+                    X_all = sp.vstack([final.X_train, final.X_test], format="csr")
+                else:
+                    X_all = pd.concat([X_train, X_test], ignore_index=True)
+                model = train.train_model(
+                    X=X_all,
+                    y=np.concatenate([final.y_train, final.y_test]),
+                    **fit_kwargs,
+                )
+                retrain_metrics = train.evaluate_model(
+                    model, X_test, final.y_test, task_type
+                )
+                mlflow.log_metrics(
+                    {f"train_{k}": v for k, v in retrain_metrics.items()}
+                )
+
+        joblib.dump(model, output_path)
+    return {
+        "name": name,
+        "run_id": run.info.run_id,
+        "best_value": best_value,
+        "metrics": metric_dict,
+    }
+
+
+def allocate_threads(n_models: int, n_jobs: int) -> List[int]:
+    """
+    Divide a CPU budget among models trained at the same time.
+
+    Args:
+        n_models: Number of models
+        n_jobs: Number of cores shared by the models
+
+    Returns:
+        Number of threads of each model. Models beyond the budget get one
+        thread each and wait for a free worker
+    """
+    n_workers = max(1, min(n_models, n_jobs))
+    return [
+        max(1, n_jobs // n_workers + (1 if i < n_jobs % n_workers else 0))
+        for i in range(n_models)
+    ]
+
+
+def train_release(
+    feature_df: pd.DataFrame,
+    target_df: pd.DataFrame,
+    split_codes: np.ndarray,
+    config: Dict,
+    project_dir: str,
+    cache_dir: str,
+    retrain_with_test_set: Optional[bool] = False,
+) -> List[Dict]:
+    """
+    Train every model in the `release` section on one feature matrix and
+    target table, as created by `create_features --multi-target`.
+
+    The matrices are saved once to `cache_dir` and memory mapped by one worker
+    process per model, and the models' studies run at the same time, sharing
+    `n_jobs` of the `release` section (all cores if not set). The models only
+    replace those in `models/` once every model has been trained, together
+    with the shared feature pipeline, which is saved under the name of each
+    model's feature pipeline in the app.
+
+    Args:
+        feature_df: DataFrame with features
+        target_df: Target table from `targ.create_target_table`
+        split_codes: Array with one split code per row of `feature_df`
+        config: Contents of the config file
+        project_dir: Directory with the `models` folder
+        cache_dir: Directory in which to save memory-mapped training data
+        retrain_with_test_set: Whether to refit each model on the training,
+            validation, and test sets before saving it
+
+    Returns:
+        List of dictionaries with the name, mlflow run ID, best holdout score,
+        and test metrics of each model
+    """
+    model_configs = get_model_configs(config)
+    logger.info(f"Saving training data of {list(model_configs)} to {cache_dir}...")
+    data_dirs = _save_model_data(
+        feature_df,
+        target_df,
+        split_codes,
+        model_configs,
+        cache_dir,
+        dtype=config.get("training_dtype", "float32"),
+        sparse=config.get("sparse_features", False),
+    )
+
+    n_jobs = config.get("release", {}).get("n_jobs") or os.cpu_count() or 1
+    threads = allocate_threads(len(model_configs), n_jobs)
+    client = MlflowClient(tracking_uri=config["tracking_uri"])
+    experiment = client.get_experiment_by_name(config["experiment_name"])
+    experiment_id = (
+        experiment.experiment_id
+        if experiment
+        else client.create_experiment(config["experiment_name"])
+    )
+    models_dir = os.path.join(project_dir, "models")
+    tmp_paths = {
+        name: os.path.join(models_dir, f".{name}.joblib.tmp") for name in model_configs
+    }
+
+    logger.info(
+        f"Training {len(model_configs)} models with {n_jobs} cores, "
+        f"{threads} threads each..."
+    )
+    results = []
+    try:
+        with parallel.limit_thread_env(min(threads)):
+            with ProcessPoolExecutor(
+                max_workers=min(len(model_configs), n_jobs),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _train_release_model,
+                        name=name,
+                        model_config=model_config,
+                        data_dirs=data_dirs[name],
+                        n_threads=n_threads,
+                        tracking_uri=config["tracking_uri"],
+                        experiment_id=experiment_id,
+                        output_path=tmp_paths[name],
+                        retrain_with_test_set=retrain_with_test_set,
+                    )
+                    for (name, model_config), n_threads in zip(
+                        model_configs.items(), threads
+                    )
+                ]
+                results = [future.result() for future in futures]
+
+        # Every model trained, so the release replaces the previous one
+        pipeline_path = os.path.join(project_dir, SHARED_FEATURE_PIPELINE_PATH)
+        pipe_names = {
+            lookup.MODEL_FEATURE_PIPES[name]
+            for name in model_configs
+            if name in lookup.MODEL_FEATURE_PIPES
+        }
+        for pipe_name in sorted(pipe_names):
+            artifact_path = os.path.join(project_dir, lookup.MODEL_ARTIFACTS[pipe_name])
+            shutil.copyfile(pipeline_path, f"{artifact_path}.tmp")
+            os.replace(f"{artifact_path}.tmp", artifact_path)
+        for name in model_configs:
+            os.replace(tmp_paths[name], os.path.join(models_dir, f"{name}.joblib"))
+            logger.info(f"Saved {name} to {models_dir}")
+    finally:
+        for path in tmp_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+    return results
@@ -0,0 +1,220 @@
+"""
+Serve model predictions over HTTP, scoring concurrent requests in micro-batches
+"""
+
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+from flask import Flask, jsonify, request
+import numpy as np
+import pandas as pd
+
+from dc311.modeling import fused, lookup
+from dc311.modeling.predict import INPUT_COLUMNS
+from dc311.modeling.registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collect rows submitted by concurrent callers and score them together, so
+    that the models run one vectorized predict call per batch instead of one
+    per request.
+
+    A batch is scored once it holds `max_batch_size` rows or `max_wait_ms`
+    milliseconds after its first row arrived, whichever comes first. The wait
+    bounds the latency added to any request.
+
+    Args:
+        predict_fn: Function that takes a pandas DataFrame of rows and returns
+            an array with one row of predictions per input row
+        max_batch_size: Maximum number of rows scored at once. Larger
+            submissions are scored on their own
+        max_wait_ms: Maximum number of milliseconds a row waits for other rows
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[pd.DataFrame], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.n_batches = 0
+        self.n_rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, rows: pd.DataFrame) -> Future:
+        """
+        Queue rows to be scored with the next batch.
+
+        Args:
+            rows: pandas DataFrame of rows to score
+
+        Returns:
+            Future whose result is the array of predictions for `rows`
+        """
+        future = Future()
+        self._queue.put((rows, future))
+        return future
+
+    def close(self) -> None:
+        """
+        Score the rows still queued and stop the background thread.
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            n_rows = len(item[0])
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while n_rows < self.max_batch_size:
+                try:
+                    item = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+            self._score(batch)
+
+    def _score(self, batch: List) -> None:
+        try:
+            outputs = self.predict_fn(pd.concat([rows for rows, _ in batch]))
+        except Exception as e:
+            logger.exception("Failed to score batch")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.n_batches += 1
+        start = 0
+        for rows, future in batch:
+            stop = start + len(rows)
+            future.set_result(outputs[start:stop])
+            start = stop
+        self.n_rows += start
+
+
+def parse_requests(records: List[Dict]) -> pd.DataFrame:
+    """
+    Validate request records and convert them to model inputs.
+
+    Args:
+        records: List of dictionaries with `servicecode`, `ward`, and `adddate`
+
+    Returns:
+        pandas DataFrame with `INPUT_COLUMNS`
+    """
+    if not isinstance(records, list) or not records:
+        raise ValueError("Requests must be a non-empty list of objects.")
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"Request {i} must be an object.")
+        missing = [column for column in INPUT_COLUMNS if column not in record]
+        if missing:
+            raise ValueError(f"Request {i} is missing fields {missing}.")
+
+    input_df = pd.DataFrame.from_records(records, columns=INPUT_COLUMNS)
+    input_df["ward"] = pd.to_numeric(input_df["ward"], errors="raise").astype(int)
+    input_df["adddate"] = pd.to_datetime(input_df["adddate"], format="ISO8601")
+    return input_df
+
+
+def create_app(
+    model_registry: ModelRegistry,
+    max_batch_size: int = 64,
+    max_wait_ms: float = 5.0,
+) -> Flask:
+    """
+    Create the prediction service.
+
+    Endpoints:
+        GET /health: Status and batching statistics
+        POST /predict: One request object, returns one prediction object
+        POST /predict_batch: {"requests": [...]}, returns {"predictions": [...]}
+
+    Each request object has `servicecode`, `ward`, and `adddate`, and each
+    prediction object has the keys in `lookup.LOOKUP_OUTPUTS`.
+
+    Args:
+        model_registry: Registry holding the artifacts of `lookup.MODEL_ARTIFACTS`,
+            and optionally a "fused_predictor" that is used while it is up to
+            date with them. Models are fetched from it for every batch, so
+            retrained models are served without a restart
+        max_batch_size: Maximum number of rows scored at once
+        max_wait_ms: Maximum number of milliseconds a request waits for other
+            requests to join its batch
+
+    Returns:
+        Flask app. Its `batcher` attribute holds the MicroBatcher
+    """
+
+    artifacts = {
+        name: model_registry.artifacts[name] for name in lookup.MODEL_ARTIFACTS
+    }
+    fused_path = model_registry.artifacts.get("fused_predictor")
+
+    def predict_fn(input_df: pd.DataFrame) -> np.ndarray:
+        if fused_path is None:
+            models = {name: model_registry.get(name) for name in artifacts}
+        else:
+            models = fused.select_models(artifacts, fused_path, model_registry.get)
+        return lookup.predict_outputs(input_df, models)
+
+    app = Flask(__name__)
+    app.batcher = MicroBatcher(predict_fn, max_batch_size, max_wait_ms)
+
+    def score(records: List[Dict]) -> List[Dict]:
+        outputs = app.batcher.submit(parse_requests(records)).result()
+        return [dict(zip(lookup.LOOKUP_OUTPUTS, row)) for row in outputs.tolist()]
+
+    @app.errorhandler(ValueError)
+    def handle_value_error(e):
+        return jsonify({"error": str(e)}), 400
+
+    @app.get("/health")
+    def health():
+        return jsonify(
+            {
+                "status": "ok",
+                "n_batches": app.batcher.n_batches,
+                "n_rows": app.batcher.n_rows,
+            }
+        )
+
+    @app.post("/predict")
+    def predict():
+        return jsonify(score([request.get_json(force=True)])[0])
+
+    @app.post("/predict_batch")
+    def predict_batch():
+        body = request.get_json(force=True)
+        if not isinstance(body, dict) or "requests" not in body:
+            raise ValueError('Body must be an object with a "requests" list.')
+        return jsonify({"predictions": score(body["requests"])})
+
+    return app
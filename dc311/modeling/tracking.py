@@ -0,0 +1,471 @@
+"""
+Log mlflow runs through an in-memory queue that is flushed in batches
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+import uuid
+
+import mlflow
+from mlflow.entities import Metric, Param, RunTag
+from mlflow.tracking import MlflowClient
+from mlflow.utils.mlflow_tags import MLFLOW_PARENT_RUN_ID, MLFLOW_RUN_NAME
+
+logger = logging.getLogger(__name__)
+
+# Limits of a single mlflow `log_batch` request
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_TAGS_PER_BATCH = 100
+MAX_ENTITIES_PER_BATCH = 1000
+
+TRACKING_MODES = ("sync", "async", "offline")
+
+# Markers put on the queue to end the current batch early
+_FLUSH = object()
+_STOP = object()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MlflowBatchWriter:
+    """
+    Write queued run records to mlflow with as few requests as possible.
+
+    Records are dictionaries with an "op" key, as created by `QueuedRun`.
+    Runs are referred to by local IDs, which are mapped to the IDs of the
+    mlflow runs created for them. IDs without a mapping, like the ID of a
+    parent run created outside the queue, are used as they are.
+
+    Args:
+        client: mlflow client used for all requests. If None, a client for
+            the current tracking URI is created
+        experiment_id: If provided, runs are created in this experiment instead
+            of the experiment stored in their records
+    """
+
+    def __init__(
+        self,
+        client: Optional[MlflowClient] = None,
+        experiment_id: Optional[str] = None,
+    ):
+        self.client = client or MlflowClient()
+        self.experiment_id = experiment_id
+        self.run_ids = {}
+
+    def write(self, records: List[Dict]) -> None:
+        """
+        Create, log to, and end the runs in `records`, with one `log_batch`
+        request per run unless mlflow's batch limits are exceeded.
+
+        Args:
+            records: Run records in the order they were queued
+        """
+        metrics = defaultdict(list)
+        params = defaultdict(dict)
+        tags = defaultdict(dict)
+        ended = []
+        for record in records:
+            op = record["op"]
+            if op == "create_run":
+                run_tags = {MLFLOW_RUN_NAME: record["run_name"]}
+                if record.get("parent_run_id"):
+                    parent_run_id = record["parent_run_id"]
+                    run_tags[MLFLOW_PARENT_RUN_ID] = self.run_ids.get(
+                        parent_run_id, parent_run_id
+                    )
+                run = self.client.create_run(
+                    experiment_id=self.experiment_id or record["experiment_id"],
+                    start_time=record["start_time"],
+                    tags=run_tags,
+                    run_name=record["run_name"],
+                )
+                self.run_ids[record["run"]] = run.info.run_id
+            elif op == "metrics":
+                metrics[record["run"]].extend(
+                    Metric(key, value, record["timestamp"], record["step"] or 0)
+                    for key, value in record["values"].items()
+                )
+            elif op == "params":
+                params[record["run"]].update(record["values"])
+            elif op == "tags":
+                tags[record["run"]].update(record["values"])
+            elif op == "end_run":
+                ended.append(record)
+            else:
+                raise ValueError(
+                    f"op of {op} is not supported. op must be in "
+                    f"('create_run', 'metrics', 'params', 'tags', 'end_run')."
+                )
+
+        for run in set(metrics) | set(params) | set(tags):
+            self._log_batch(
+                self.run_ids.get(run, run),
+                metrics[run],
+                [Param(key, value) for key, value in params[run].items()],
+                [RunTag(key, value) for key, value in tags[run].items()],
+            )
+        for record in ended:
+            self.client.set_terminated(
+                self.run_ids.get(record["run"], record["run"]),
+                status=record["status"],
+                end_time=record["end_time"],
+            )
+
+    def _log_batch(
+        self,
+        run_id: str,
+        metrics: List[Metric],
+        params: List[Param],
+        tags: List[RunTag],
+    ) -> None:
+        while metrics or params or tags:
+            batch_params, params = (
+                params[:MAX_PARAMS_TAGS_PER_BATCH],
+                params[MAX_PARAMS_TAGS_PER_BATCH:],
+            )
+            batch_tags, tags = (
+                tags[:MAX_PARAMS_TAGS_PER_BATCH],
+                tags[MAX_PARAMS_TAGS_PER_BATCH:],
+            )
+            n_metrics = min(
+                MAX_METRICS_PER_BATCH,
+                MAX_ENTITIES_PER_BATCH - len(batch_params) - len(batch_tags),
+            )
+            batch_metrics, metrics = metrics[:n_metrics], metrics[n_metrics:]
+            self.client.log_batch(
+                run_id, metrics=batch_metrics, params=batch_params, tags=batch_tags
+            )
+
+
+class JsonLinesWriter:
+    """
+    Append run records to a compact JSON lines file, which can be replayed
+    into mlflow later with `replay_offline_log`.
+
+    Args:
+        path: Path of the file
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+
+    def write(self, records: List[Dict]) -> None:
+        """
+        Append `records` to the file, one JSON object per line.
+
+        Args:
+            records: Run records in the order they were queued
+        """
+        with open(self.path, "a") as file:
+            for record in records:
+                file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+class QueuedRun:
+    """
+    Handle of a run started by `BatchedRunLogger.start_run`. Its logging
+    methods match the mlflow fluent API, but only put records on the queue.
+    """
+
+    def __init__(self, run_logger: "BatchedRunLogger", run_id: str):
+        self.run_logger = run_logger
+        self.run_id = run_id
+
+    def log_params(self, params: Dict) -> None:
+        values = {key: str(value) for key, value in params.items()}
+        self.run_logger.put({"op": "params", "run": self.run_id, "values": values})
+
+    def log_param(self, key: str, value) -> None:
+        self.log_params({key: value})
+
+    def log_metrics(self, metrics: Dict, step: Optional[int] = None) -> None:
+        self.run_logger.put(
+            {
+                "op": "metrics",
+                "run": self.run_id,
+                "values": {key: float(value) for key, value in metrics.items()},
+                "step": step,
+                "timestamp": _now_ms(),
+            }
+        )
+
+    def log_metric(self, key: str, value: float, step: Optional[int] = None) -> None:
+        self.log_metrics({key: value}, step=step)
+
+    def set_tag(self, key: str, value) -> None:
+        self.set_tags({key: value})
+
+    def set_tags(self, tags: Dict) -> None:
+        values = {key: str(value) for key, value in tags.items()}
+        self.run_logger.put({"op": "tags", "run": self.run_id, "values": values})
+
+
+class BatchedRunLogger:
+    """
+    Queue the params, metrics, and tags of mlflow runs in memory and write
+    them in batches from a background thread, so that logging does not block
+    training. Runs are created and ended through the queue as well.
+
+    Queued records are always written when the logger is closed, so it should
+    be used as a context manager around the study.
+
+    Args:
+        experiment_id: ID of the mlflow experiment in which runs are created
+        offline_path: If provided, records are appended to this JSON lines file
+            instead of being sent to mlflow
+        flush_interval: Maximum number of seconds records wait on the queue
+            before they are written
+        max_batch_records: Maximum number of records written at once
+        client: mlflow client used in online mode. If None, a client for the
+            current tracking URI is created
+    """
+
+    def __init__(
+        self,
+        experiment_id: str,
+        offline_path: Optional[str] = None,
+        flush_interval: Optional[float] = 1.0,
+        max_batch_records: Optional[int] = 1000,
+        client: Optional[MlflowClient] = None,
+    ):
+        self.experiment_id = experiment_id
+        self.flush_interval = flush_interval
+        self.max_batch_records = max_batch_records
+        if offline_path:
+            self.writer = JsonLinesWriter(offline_path)
+        else:
+            self.writer = MlflowBatchWriter(client)
+        self.n_failed = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="mlflow-batch-logger", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "BatchedRunLogger":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def put(self, record: Dict) -> None:
+        if self._closed:
+            raise RuntimeError("Cannot log to a closed BatchedRunLogger.")
+        self._queue.put(record)
+
+    @contextmanager
+    def start_run(
+        self, run_name: Optional[str] = None, parent_run_id: Optional[str] = None
+    ) -> Iterator[QueuedRun]:
+        """
+        Start a run, ending it as FINISHED when the context exits normally and
+        as FAILED when it exits with an exception.
+
+        Args:
+            run_name: Name of the run
+            parent_run_id: ID of the run under which the run is nested
+
+        Returns:
+            QueuedRun handle used to log to the run
+        """
+        run_id = uuid.uuid4().hex
+        self.put(
+            {
+                "op": "create_run",
+                "run": run_id,
+                "experiment_id": self.experiment_id,
+                "run_name": run_name,
+                "parent_run_id": parent_run_id,
+                "start_time": _now_ms(),
+            }
+        )
+        status = "FAILED"
+        try:
+            yield QueuedRun(self, run_id)
+            status = "FINISHED"
+        finally:
+            self.put(
+                {
+                    "op": "end_run",
+                    "run": run_id,
+                    "status": status,
+                    "end_time": _now_ms(),
+                }
+            )
+
+    def flush(self) -> None:
+        """
+        Block until every record queued so far has been written.
+        """
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        Write all queued records and stop the background thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.n_failed:
+            logger.error(f"{self.n_failed} mlflow records could not be written.")
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            # Collect records until the flush interval has passed since the
+            # first one, the batch is full, or a marker is found
+            records, n_items, marker, deadline = [], 0, None, None
+            while len(records) < self.max_batch_records:
+                timeout = None
+                if deadline is not None:
+                    timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                n_items += 1
+                if item is _FLUSH or item is _STOP:
+                    marker = item
+                    break
+                records.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            stop = marker is _STOP
+
+            try:
+                if records:
+                    self.writer.write(records)
+            except Exception:
+                self.n_failed += len(records)
+                logger.exception(f"Failed to write {len(records)} mlflow records")
+            finally:
+                for _ in range(n_items):
+                    self._queue.task_done()
+
+
+@contextmanager
+def start_run(
+    run_name: Optional[str] = None,
+    parent_run_id: Optional[str] = None,
+    run_logger: Optional[BatchedRunLogger] = None,
+):
+    """
+    Start a nested mlflow run, either directly or through a batched logger.
+
+    Args:
+        run_name: Name of the run
+        parent_run_id: ID of the run under which the run is nested. If None,
+            the run is nested under the active run
+        run_logger: If provided, the run is logged through this logger.
+            Otherwise, every logging call is sent to mlflow right away
+
+    Returns:
+        Object with the mlflow fluent logging methods (`log_params`,
+        `log_metrics`, `log_metric`, `set_tag`) bound to the run
+    """
+    if run_logger is None:
+        with mlflow.start_run(
+            nested=True, run_name=run_name, parent_run_id=parent_run_id
+        ):
+            yield mlflow
+        return
+
+    if parent_run_id is None and mlflow.active_run() is not None:
+        parent_run_id = mlflow.active_run().info.run_id
+    with run_logger.start_run(run_name, parent_run_id) as run:
+        yield run
+
+
+@contextmanager
+def open_run_logger(
+    tracking_config: Optional[Dict], experiment_id: str
+) -> Iterator[Optional[BatchedRunLogger]]:
+    """
+    Open the run logger described by the `tracking` section of the config file,
+    and close it, writing all queued records, when the context exits.
+
+    Args:
+        tracking_config: Dictionary where "mode" is one of {"sync", "async",
+            "offline"}, with optional "flush_interval" and "offline_dir" keys.
+            If None, runs are logged synchronously
+        experiment_id: ID of the mlflow experiment in which runs are created
+
+    Returns:
+        BatchedRunLogger, or None in sync mode
+    """
+    tracking_config = tracking_config or {}
+    mode = tracking_config.get("mode", "sync")
+    if mode not in TRACKING_MODES:
+        raise ValueError(
+            f"tracking mode of {mode} is not supported. "
+            f"mode must be in {TRACKING_MODES}."
+        )
+    if mode == "sync":
+        yield None
+        return
+
+    offline_path = None
+    if mode == "offline":
+        offline_path = os.path.join(
+            tracking_config.get("offline_dir", "data/mlflow_offline"),
+            f"runs_{experiment_id}_{_now_ms()}_{os.getpid()}.jsonl",
+        )
+        logger.info(f"Logging runs offline to {offline_path}")
+    with BatchedRunLogger(
+        experiment_id,
+        offline_path=offline_path,
+        flush_interval=tracking_config.get("flush_interval", 1.0),
+    ) as run_logger:
+        yield run_logger
+
+
+def replay_offline_log(
+    path: str,
+    experiment_id: Optional[str] = None,
+    client: Optional[MlflowClient] = None,
+    chunk_size: Optional[int] = 1000,
+) -> int:
+    """
+    Replay a JSON lines file written in offline mode into mlflow.
+
+    Args:
+        path: Path of the file
+        experiment_id: If provided, runs are created in this experiment instead
+            of the experiment in which they were logged
+        client: mlflow client used for all requests. If None, a client for the
+            current tracking URI is created
+        chunk_size: Number of records written at once
+
+    Returns:
+        Number of records replayed
+    """
+    writer = MlflowBatchWriter(client, experiment_id=experiment_id)
+    n_records = 0
+    records = []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            records.append(json.loads(line))
+            if len(records) >= chunk_size:
+                writer.write(records)
+                n_records += len(records)
+                records = []
+    if records:
+        writer.write(records)
+        n_records += len(records)
+    return n_records
@@ -2,14 +2,18 @@
 Functionality to train model using optuna
 """
 
+import copy
 from datetime import datetime
 import logging
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import warnings
 
-import mlflow
+import numpy as np
 import optuna
 import pandas as pd
+import scipy.sparse as sp
 from sklearn.decomposition import PCA
+from sklearn.exceptions import ConvergenceWarning
 from sklearn.linear_model import ElasticNet, LogisticRegression
 from sklearn.metrics import (
     brier_score_loss,
@@ -23,14 +27,23 @@ from sklearn.metrics import (
 from sklearn.pipeline import Pipeline
 import xgboost as xgb
 
+from dc311.features.features import DATASET_SPLIT_CODES
+from dc311.instrumentation import instrument
+from dc311.modeling import tracking
 
 logger = logging.getLogger(__name__)
 
+# Metric that the hyperparameter search minimizes for each task type
+OBJECTIVE_METRICS = {
+    "classification": "brier_score_loss",
+    "regression": "median_absolute_error",
+}
+
 
 def split_data(
     feature_df: pd.DataFrame,
     target_df: pd.DataFrame,
-    data_split_dict: Dict,
+    split_codes: np.ndarray,
     holdout_set_type: Optional[str] = "validation",
 ) -> Tuple:
     """
@@ -38,9 +51,9 @@ def split_data(
 
     Args:
         feature_df: DataFrame with features
-        target_df: DataFrame with targets
-        data_split_dict: Dictionary with indices on which to split data into train
-            and test sets
+        target_df: DataFrame with targets, row-aligned with `feature_df`
+        split_codes: Array with one split code per row of `feature_df`, as
+            created by `dc311.features.features.get_dataset_split_codes`
         holdout_set_type: {"validation", "test"}
             Whether the holdout set should be from the validation or test set. If
             from the test set, then the training set is composed of the training
@@ -50,21 +63,214 @@ def split_data(
         Tuple with four elements: train features, train targets, test features,
         test targets
     """
+    if len(split_codes) != len(feature_df) or len(split_codes) != len(target_df):
+        raise ValueError(
+            f"split_codes has {len(split_codes)} rows, but feature_df has "
+            f"{len(feature_df)} rows and target_df has {len(target_df)} rows."
+        )
+
     if holdout_set_type == "validation":
-        X_train = feature_df.loc[data_split_dict["train"]]
-        y_train = target_df.loc[data_split_dict["train"]]["target"]
-        X_test = feature_df.loc[data_split_dict["validation"]]
-        y_test = target_df.loc[data_split_dict["validation"]]["target"]
+        train_mask = split_codes == DATASET_SPLIT_CODES["train"]
+        test_mask = split_codes == DATASET_SPLIT_CODES["validation"]
     elif holdout_set_type == "test":
-        train_plus_val_idx = data_split_dict["train"] + data_split_dict["validation"]
-        X_train = feature_df.loc[train_plus_val_idx]
-        y_train = target_df.loc[train_plus_val_idx]["target"]
-        X_test = feature_df.loc[data_split_dict["test"]]
-        y_test = target_df.loc[data_split_dict["test"]]["target"]
+        train_mask = np.isin(
+            split_codes,
+            [DATASET_SPLIT_CODES["train"], DATASET_SPLIT_CODES["validation"]],
+        )
+        test_mask = split_codes == DATASET_SPLIT_CODES["test"]
+    else:
+        raise ValueError(
+            f"holdout_set_type of {holdout_set_type} is not supported. "
+            f"holdout_set_type must be in ('validation', 'test')."
+        )
+
+    X_train = feature_df[train_mask]
+    y_train = target_df["target"][train_mask]
+    X_test = feature_df[test_mask]
+    y_test = target_df["target"][test_mask]
 
     return X_train, y_train, X_test, y_test
 
 
+class TrainingData(NamedTuple):
+    """
+    Train and holdout matrices materialized once and shared read-only by every
+    trial of a study.
+    """
+
+    X_train: np.ndarray
+    y_train: np.ndarray
+    X_test: np.ndarray
+    y_test: np.ndarray
+    feature_names: List[str]
+
+
+def _to_read_only(X):
+    """Mark a dense or sparse matrix as read-only so trials cannot modify it"""
+    arrays = [X.data, X.indices, X.indptr] if sp.issparse(X) else [X]
+    for arr in arrays:
+        arr.flags.writeable = False
+    return X
+
+
+@instrument()
+def prepare_training_data(
+    feature_df: pd.DataFrame,
+    target_df: pd.DataFrame,
+    split_codes: np.ndarray,
+    holdout_set_type: Optional[str] = "validation",
+    dtype: Optional[str] = "float32",
+    sparse: Optional[bool] = False,
+) -> TrainingData:
+    """
+    Split data into train and test sets and convert them to contiguous NumPy
+    arrays (or CSR matrices), so that the split and conversion happen once per
+    study rather than once per trial.
+
+    Args:
+        feature_df: DataFrame with features
+        target_df: DataFrame with targets, row-aligned with `feature_df`
+        split_codes: Array with one split code per row of `feature_df`
+        holdout_set_type: {"validation", "test"}
+            Whether the holdout set should be from the validation or test set
+        dtype: NumPy dtype of the feature matrices
+        sparse: Whether to store the feature matrices as CSR sparse matrices
+
+    Returns:
+        TrainingData with read-only train features, train targets, test
+        features, test targets, and the feature names
+    """
+    X_train, y_train, X_test, y_test = split_data(
+        feature_df, target_df, split_codes, holdout_set_type
+    )
+    # Hashed features are loaded with sparse columns, which are converted
+    # without densifying them
+    sparse_columns = all(isinstance(d, pd.SparseDtype) for d in feature_df.dtypes)
+    matrices = []
+    for X in (X_train, X_test):
+        if sparse and sparse_columns:
+            X = X.sparse.to_coo().tocsr().astype(dtype)
+        else:
+            X = np.ascontiguousarray(X.to_numpy(dtype=dtype))
+            if sparse:
+                X = sp.csr_matrix(X)
+        matrices.append(_to_read_only(X))
+    return TrainingData(
+        X_train=matrices[0],
+        y_train=_to_read_only(np.ascontiguousarray(y_train.to_numpy())),
+        X_test=matrices[1],
+        y_test=_to_read_only(np.ascontiguousarray(y_test.to_numpy())),
+        feature_names=feature_df.columns.tolist(),
+    )
+
+
+class FidelityLevel(NamedTuple):
+    """
+    Stratified subsample of the training set used at one fidelity level of a
+    multi-fidelity search.
+    """
+
+    fraction: float
+    data: TrainingData
+    xgb_matrices: Optional[Tuple] = None
+
+
+def get_stratified_order(
+    y: np.ndarray,
+    task_type: str,
+    random_seed: Optional[int] = 0,
+    n_bins: Optional[int] = 10,
+) -> np.ndarray:
+    """
+    Get a random ordering of rows where every prefix is stratified by target,
+    so that nested subsamples of any size keep the target distribution.
+
+    Args:
+        y: Targets of the training set
+        task_type: {"regression", "classification"}
+            For classification, rows are stratified by class. For regression,
+            rows are stratified by quantile bins of the target
+        random_seed: Seed provided to ensure reproducibility
+        n_bins: Number of quantile bins used for regression targets
+
+    Returns:
+        Array of row positions
+    """
+    rng = np.random.default_rng(random_seed)
+    if task_type == "regression":
+        edges = np.quantile(y, np.linspace(0, 1, n_bins + 1)[1:-1])
+        strata = np.digitize(y, edges)
+    else:
+        strata = np.asarray(y)
+
+    # Spread each stratum's rows evenly over [0, 1), then sort all rows together
+    keys = np.empty(len(strata))
+    jitter = rng.random(len(strata))
+    for stratum in np.unique(strata):
+        positions = np.flatnonzero(strata == stratum)
+        ranks = rng.permutation(len(positions))
+        keys[positions] = (ranks + jitter[positions]) / len(positions)
+    return np.argsort(keys, kind="stable")
+
+
+@instrument()
+def build_fidelity_levels(
+    data: TrainingData,
+    fractions: List[float],
+    task_type: str,
+    model_type: Optional[str] = "logistic",
+    pca: Optional[bool] = False,
+    random_seed: Optional[int] = 0,
+    xgb_settings: Optional[Dict] = None,
+) -> List[FidelityLevel]:
+    """
+    Build nested, stratified subsamples of the training set once per study, one
+    per fraction. Each subsample keeps the full holdout set.
+
+    Args:
+        data: Train and holdout matrices from `prepare_training_data`
+        fractions: Fractions of the training set, from smallest to largest
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        model_type: {"logistic", "xgboost", "elasticnet"}
+            Type of model to train. For xgboost without PCA, the xgboost matrices
+            of each level are built as well
+        pca: Whether PCA is applied before the model
+        random_seed: Seed provided to ensure reproducibility
+        xgb_settings: `xgboost` section of the config file
+
+    Returns:
+        List of FidelityLevel objects, ordered like `fractions`
+    """
+    if list(fractions) != sorted(fractions) or not 0 < fractions[0] <= 1:
+        raise ValueError(
+            f"fractions {fractions} must be increasing and between 0 and 1."
+        )
+
+    order = get_stratified_order(data.y_train, task_type, random_seed)
+    levels = []
+    for fraction in fractions:
+        n_rows = max(1, int(round(fraction * len(order))))
+        if n_rows >= len(order):
+            level_data = data
+        else:
+            # Sorting the rows keeps memory access sequential
+            rows = np.sort(order[:n_rows])
+            level_data = data._replace(
+                X_train=_to_read_only(data.X_train[rows]),
+                y_train=_to_read_only(data.y_train[rows]),
+            )
+        xgb_matrices = None
+        if model_type == "xgboost" and not pca:
+            xgb_matrices = build_xgb_matrices(level_data, xgb_settings)
+        levels.append(FidelityLevel(fraction, level_data, xgb_matrices))
+        logger.info(f"Fidelity level {fraction}: {n_rows} training rows")
+    return levels
+
+
+# Called in every trial, so the stage is not logged to mlflow, which would
+# write to the trial's run with a blocking call
+@instrument(log_level=logging.DEBUG, log_mlflow=False)
 def train_model(
     X: pd.DataFrame,
     y: pd.DataFrame,
@@ -73,6 +279,11 @@ def train_model(
     model_type: Optional[str] = "logistic",
     pca: Optional[bool] = False,
     random_seed: Optional[int] = 0,
+    n_threads: Optional[int] = None,
+    eval_set: Optional[Tuple] = None,
+    early_stopping_rounds: Optional[int] = None,
+    callbacks: Optional[List] = None,
+    xgb_settings: Optional[Dict] = None,
 ):
     """
     Fit an sklearn model pipeline object.
@@ -88,10 +299,24 @@ def train_model(
         pca: Whether to apply principal component analysis to the feature data before
             passing the data to the classification model object
         random_seed: Seed provided to ensure reproducibility
+        n_threads: Number of threads used by xgboost. If None, xgboost uses all
+            available cores
+        eval_set: Tuple of holdout features and targets that xgboost scores
+            after every boosting round. Ignored by other model types
+        early_stopping_rounds: If provided with `eval_set`, stop boosting once
+            the holdout score has not improved for this many rounds
+        callbacks: xgboost TrainingCallback objects called after every boosting
+            round, e.g. `XGBoostPruningCallback`
+        xgb_settings: `xgboost` section of the config file, with the
+            `tree_method`, `max_bin`, and `nthread` used by xgboost
 
     Returns:
         Fit sklearn model pipeline object
     """
+    xgb_settings = xgb_settings or {}
+    if n_threads is None:
+        n_threads = xgb_settings.get("nthread")
+
     steps = []
     if pca:
         steps.append(
@@ -118,6 +343,9 @@ def train_model(
                         max_depth=params["xgb_max_depth"],
                         learning_rate=params["xgb_learning_rate"],
                         random_state=random_seed,
+                        n_jobs=n_threads,
+                        tree_method=xgb_settings.get("tree_method", "hist"),
+                        max_bin=xgb_settings.get("max_bin", 256),
                     ),
                 )
             )
@@ -146,6 +374,9 @@ def train_model(
                         max_depth=params["xgb_max_depth"],
                         learning_rate=params["xgb_learning_rate"],
                         random_state=random_seed,
+                        n_jobs=n_threads,
+                        tree_method=xgb_settings.get("tree_method", "hist"),
+                        max_bin=xgb_settings.get("max_bin", 256),
                     ),
                 )
             )
@@ -155,10 +386,187 @@ def train_model(
             )
 
     model_pipeline = Pipeline(steps)
-    model_pipeline.fit(X, y)
+    if model_type != "xgboost" or eval_set is None:
+        model_pipeline.fit(X, y)
+        return model_pipeline
+
+    # Fit preprocessing steps first, so that the holdout set can be transformed
+    # before xgboost scores it during boosting
+    X_eval, y_eval = eval_set
+    for _, step in model_pipeline.steps[:-1]:
+        X = step.fit_transform(X, y)
+        X_eval = step.transform(X_eval)
+    model_pipeline.steps[-1][1].set_params(
+        early_stopping_rounds=early_stopping_rounds,
+        callbacks=callbacks,
+        eval_metric="logloss" if task_type == "classification" else "rmse",
+    )
+    model_pipeline.steps[-1][1].fit(X, y, eval_set=[(X_eval, y_eval)], verbose=False)
     return model_pipeline
 
 
+@instrument()
+def build_xgb_matrices(
+    data: TrainingData, xgb_settings: Optional[Dict] = None
+) -> Tuple:
+    """
+    Build the xgboost training and holdout matrices once, so that every trial
+    of a study reuses the same converted data and quantile sketch.
+
+    Args:
+        data: Train and holdout matrices from `prepare_training_data`
+        xgb_settings: `xgboost` section of the config file. With the "hist" tree
+            method, QuantileDMatrix objects with `max_bin` bins are built
+
+    Returns:
+        Tuple with two elements: training matrix and holdout matrix
+    """
+    xgb_settings = xgb_settings or {}
+    nthread = xgb_settings.get("nthread")
+    if xgb_settings.get("tree_method", "hist") == "hist":
+        max_bin = xgb_settings.get("max_bin", 256)
+        dtrain = xgb.QuantileDMatrix(
+            data.X_train, label=data.y_train, max_bin=max_bin, nthread=nthread
+        )
+        # The holdout matrix reuses the bins of the training matrix
+        dtest = xgb.QuantileDMatrix(
+            data.X_test, label=data.y_test, ref=dtrain, max_bin=max_bin, nthread=nthread
+        )
+    else:
+        dtrain = xgb.DMatrix(data.X_train, label=data.y_train, nthread=nthread)
+        dtest = xgb.DMatrix(data.X_test, label=data.y_test, nthread=nthread)
+    return dtrain, dtest
+
+
+def train_xgb_booster(
+    dtrain: xgb.DMatrix,
+    dtest: Optional[xgb.DMatrix],
+    params: Dict,
+    task_type: str,
+    random_seed: Optional[int] = 0,
+    n_threads: Optional[int] = None,
+    early_stopping_rounds: Optional[int] = None,
+    callbacks: Optional[List] = None,
+    xgb_settings: Optional[Dict] = None,
+) -> xgb.Booster:
+    """
+    Train an xgboost booster directly on prebuilt matrices, scoring the holdout
+    matrix after every boosting round.
+
+    Args:
+        dtrain: Training matrix from `build_xgb_matrices`
+        dtest: Holdout matrix from `build_xgb_matrices`. If None, no holdout set
+            is scored, e.g. when the final model is refit
+        params: Dictionary of model hyperparameters
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        random_seed: Seed provided to ensure reproducibility
+        n_threads: Number of threads used by xgboost. If None, `nthread` from
+            `xgb_settings` is used
+        early_stopping_rounds: Stop boosting once the holdout score has not
+            improved for this many rounds
+        callbacks: xgboost TrainingCallback objects called after every boosting
+            round, e.g. `XGBoostPruningCallback`
+        xgb_settings: `xgboost` section of the config file
+
+    Returns:
+        Trained xgboost Booster object
+    """
+    xgb_settings = xgb_settings or {}
+    if n_threads is None:
+        n_threads = xgb_settings.get("nthread")
+
+    booster_params = {
+        "max_depth": params["xgb_max_depth"],
+        "learning_rate": params["xgb_learning_rate"],
+        "tree_method": xgb_settings.get("tree_method", "hist"),
+        "max_bin": xgb_settings.get("max_bin", 256),
+        "seed": random_seed,
+    }
+    if n_threads is not None:
+        booster_params["nthread"] = n_threads
+    if task_type == "classification":
+        booster_params["objective"] = "binary:logistic"
+        booster_params["eval_metric"] = "logloss"
+    elif task_type == "regression":
+        booster_params["objective"] = "reg:squarederror"
+        booster_params["eval_metric"] = "rmse"
+    else:
+        raise ValueError(
+            f"task_type of {task_type} is not supported. "
+            f"task_type must be in ('classification', 'regression')."
+        )
+
+    return xgb.train(
+        booster_params,
+        dtrain,
+        num_boost_round=params["xgb_n_estimators"],
+        evals=[(dtest, "validation")] if dtest is not None else [],
+        early_stopping_rounds=early_stopping_rounds,
+        callbacks=callbacks,
+        verbose_eval=False,
+    )
+
+
+class XGBoostPruningCallback(xgb.callback.TrainingCallback):
+    """
+    Report the holdout score of every boosting round to optuna and stop
+    training once the trial's pruner decides the trial is not promising.
+    """
+
+    def __init__(self, trial: optuna.trial.Trial, data_name: Optional[str] = None):
+        """
+        Args:
+            trial: optuna Trial object to which scores are reported
+            data_name: Name of evaluation set in xgboost's evaluation log. If None,
+                the last evaluation set is used
+        """
+        self.trial = trial
+        self.data_name = data_name
+
+    def after_iteration(self, model, epoch: int, evals_log: Dict) -> bool:
+        data_name = self.data_name or list(evals_log)[-1]
+        metric_name = list(evals_log[data_name])[-1]
+        score = evals_log[data_name][metric_name][-1]
+        if isinstance(score, tuple):
+            score = score[0]
+        self.trial.report(float(score), step=epoch)
+        if self.trial.should_prune():
+            raise optuna.TrialPruned(
+                f"Trial {self.trial.number} pruned at boosting round {epoch}."
+            )
+        return False
+
+
+def create_pruner(pruner_config: Optional[Dict] = None) -> optuna.pruners.BasePruner:
+    """
+    Create an optuna pruner from the `pruner` section of the config file.
+
+    Args:
+        pruner_config: Dictionary where "type" is one of {"none", "median",
+            "successive_halving", "hyperband"} and the remaining keys are passed
+            to the optuna pruner. If None, trials are never pruned
+
+    Returns:
+        optuna pruner object
+    """
+    pruners = {
+        "none": optuna.pruners.NopPruner,
+        "median": optuna.pruners.MedianPruner,
+        "successive_halving": optuna.pruners.SuccessiveHalvingPruner,
+        "hyperband": optuna.pruners.HyperbandPruner,
+    }
+    pruner_kwargs = dict(pruner_config or {})
+    pruner_type = pruner_kwargs.pop("type", "none")
+    if pruner_type not in pruners:
+        raise ValueError(
+            f"pruner type of {pruner_type} is not supported. "
+            f"pruner type must be in {tuple(pruners)}."
+        )
+    return pruners[pruner_type](**pruner_kwargs)
+
+
+@instrument(log_level=logging.DEBUG, log_mlflow=False)
 def evaluate_model(
     model: Pipeline, X_test: pd.DataFrame, y_test: pd.DataFrame, task_type: str
 ) -> Dict:
@@ -177,19 +585,43 @@ def evaluate_model(
         are the metric values recorded during model evaluation.
     """
     if task_type == "classification":
-        y_proba = model.predict_proba(X_test)[:, 1]
+        return compute_metrics(y_test, model.predict_proba(X_test)[:, 1], task_type)
+    if task_type == "regression":
+        return compute_metrics(y_test, model.predict(X_test), task_type)
+
+    raise ValueError(
+        f"task_type of {task_type} is not supported. "
+        f"task_type must be in ('classification', 'regression')."
+    )
+
+
+def compute_metrics(y_test: np.ndarray, y_score: np.ndarray, task_type: str) -> Dict:
+    """
+    Compute evaluation metrics from model predictions.
+
+    Args:
+        y_test: Ground truth labels
+        y_score: Predicted probability of the positive class for classification,
+            or predicted value for regression
+        task_type: {'classification', 'regression'}
+            Type of task that will be performed with model
+
+    Returns:
+        Dictionary where the keys are evaluation metrics and the values
+        are the metric values.
+    """
+    if task_type == "classification":
         return {
-            "brier_score_loss": brier_score_loss(y_test, y_proba),
-            "roc_auc_score": roc_auc_score(y_test, y_proba),
-            "average_precision_score": average_precision_score(y_test, y_proba),
+            "brier_score_loss": brier_score_loss(y_test, y_score),
+            "roc_auc_score": roc_auc_score(y_test, y_score),
+            "average_precision_score": average_precision_score(y_test, y_score),
         }
     if task_type == "regression":
-        y_pred = model.predict(X_test)
         return {
-            "mean_squared_error": mean_squared_error(y_test, y_pred),
-            "mean_absolute_error": mean_absolute_error(y_test, y_pred),
-            "median_absolute_error": median_absolute_error(y_test, y_pred),
-            "r2_score": r2_score(y_test, y_pred),
+            "mean_squared_error": mean_squared_error(y_test, y_score),
+            "mean_absolute_error": mean_absolute_error(y_test, y_score),
+            "median_absolute_error": median_absolute_error(y_test, y_score),
+            "r2_score": r2_score(y_test, y_score),
         }
 
     raise ValueError(
@@ -198,16 +630,181 @@ def evaluate_model(
     )
 
 
+def fit_and_evaluate(
+    data: TrainingData,
+    params: Dict,
+    task_type: str,
+    model_type: Optional[str] = "logistic",
+    pca: Optional[bool] = False,
+    random_seed: Optional[int] = 0,
+    n_threads: Optional[int] = None,
+    early_stopping_rounds: Optional[int] = None,
+    xgb_settings: Optional[Dict] = None,
+    xgb_matrices: Optional[Tuple] = None,
+    callbacks: Optional[List] = None,
+) -> Tuple:
+    """
+    Fit one model on the training set and evaluate it on the holdout set.
+    Without PCA, xgboost trains on prebuilt xgboost matrices.
+
+    Args:
+        data: Train and holdout matrices from `prepare_training_data`
+        params: Dictionary of model hyperparameters
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        model_type: {"logistic", "xgboost", "elasticnet"}
+            Type of model to train
+        pca: Whether to apply principal component analysis before the model
+        random_seed: Seed provided to ensure reproducibility
+        n_threads: Number of threads used by xgboost
+        early_stopping_rounds: Number of boosting rounds without improvement on
+            the holdout set after which xgboost stops
+        xgb_settings: `xgboost` section of the config file
+        xgb_matrices: Training and holdout matrices from `build_xgb_matrices`. If
+            None, they are built from `data`
+        callbacks: xgboost TrainingCallback objects called after every round
+
+    Returns:
+        Tuple with two elements: dictionary of holdout metrics, and the best
+        boosting iteration (None unless xgboost stopped early)
+    """
+    best_iteration = None
+    if model_type == "xgboost" and not pca:
+        if xgb_matrices is None:
+            xgb_matrices = build_xgb_matrices(data, xgb_settings)
+        dtrain, dtest = xgb_matrices
+        booster = train_xgb_booster(
+            dtrain=dtrain,
+            dtest=dtest,
+            params=params,
+            task_type=task_type,
+            random_seed=random_seed,
+            n_threads=n_threads,
+            early_stopping_rounds=early_stopping_rounds,
+            callbacks=callbacks,
+            xgb_settings=xgb_settings,
+        )
+        iteration_range = (0, 0)
+        if early_stopping_rounds:
+            best_iteration = booster.best_iteration
+            iteration_range = (0, best_iteration + 1)
+        y_score = booster.predict(dtest, iteration_range=iteration_range)
+        return compute_metrics(data.y_test, y_score, task_type), best_iteration
+
+    model = train_model(
+        X=data.X_train,
+        y=data.y_train,
+        params=params,
+        task_type=task_type,
+        model_type=model_type,
+        pca=pca,
+        random_seed=random_seed,
+        n_threads=n_threads,
+        eval_set=(data.X_test, data.y_test),
+        early_stopping_rounds=early_stopping_rounds,
+        callbacks=callbacks,
+        xgb_settings=xgb_settings,
+    )
+    if model_type == "xgboost" and early_stopping_rounds:
+        best_iteration = model.steps[-1][1].best_iteration
+    return evaluate_model(model, data.X_test, data.y_test, task_type), best_iteration
+
+
+def suggest_params(
+    trial: optuna.trial.Trial, task_type: str, model_type: str, ranges: Dict
+) -> Dict:
+    """
+    Sample the hyperparameters of one trial from the ranges in the config file.
+
+    Args:
+        trial: optuna Trial object from which hyperparameters are sampled
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        model_type: {"logistic", "xgboost", "elasticnet"}
+            Type of model to train
+        ranges: Dictionary including ranges for hyperparameters for optuna to sample
+            from
+
+    Returns:
+        Dictionary of model hyperparameters
+    """
+    params = {}
+
+    # xgboost can be used for regression or classification
+    if model_type == "xgboost":
+        max_depth_range = ranges["xgb_max_depth"]
+        n_estimators_range = ranges["xgb_n_estimators"]
+        lr_range = ranges["xgb_learning_rate"]
+        params["xgb_max_depth"] = trial.suggest_int(
+            "xgb_max_depth",
+            int(max_depth_range["min"]),
+            int(max_depth_range["max"]),
+        )
+        params["xgb_n_estimators"] = trial.suggest_int(
+            "xgb_n_estimators",
+            int(n_estimators_range["min"]),
+            int(n_estimators_range["max"]),
+        )
+        params["xgb_learning_rate"] = trial.suggest_float(
+            "xgb_learning_rate",
+            float(lr_range["min"]),
+            float(lr_range["max"]),
+            log=True,
+        )
+
+    elif task_type == "classification":
+        if model_type == "logistic":
+            c_range = ranges["logreg_c"]
+            params["logreg_c"] = trial.suggest_float(
+                "logreg_c", float(c_range["min"]), float(c_range["max"]), log=True
+            )
+
+        else:
+            raise ValueError(
+                f"model_type {model_type} is not supported when task_type is classification."
+            )
+    elif task_type == "regression":
+        if model_type == "elasticnet":
+            alpha_range = ranges["en_alpha"]
+            l1_ratio_range = ranges["en_l1_ratio"]
+            params["en_alpha"] = trial.suggest_float(
+                "en_alpha",
+                float(alpha_range["min"]),
+                float(alpha_range["max"]),
+            )
+            params["en_l1_ratio"] = trial.suggest_float(
+                "en_l1_ratio",
+                float(l1_ratio_range["min"]),
+                float(l1_ratio_range["max"]),
+            )
+        else:
+            raise ValueError(
+                f"model_type {model_type} is not supported when task_type is regression."
+            )
+    else:
+        raise ValueError(
+            f"task_type is {task_type} but task_type must be in"
+            f"('classification', 'regression')"
+        )
+
+    return params
+
+
 def objective(
     trial: optuna.trial.Trial,
-    feature_df: pd.DataFrame,
-    target_df: pd.DataFrame,
-    data_split_dict: Dict,
+    data: TrainingData,
     task_type: str,
     model_type: Optional[str] = "logistic",
     pca: Optional[bool] = False,
     ranges: Optional[Dict] = None,
     random_seed: Optional[int] = 0,
+    n_threads: Optional[int] = None,
+    parent_run_id: Optional[str] = None,
+    early_stopping_rounds: Optional[int] = None,
+    xgb_settings: Optional[Dict] = None,
+    xgb_matrices: Optional[Tuple] = None,
+    fidelity_levels: Optional[List] = None,
+    run_logger: Optional[tracking.BatchedRunLogger] = None,
 ) -> float:
     """
     Define objective function to optimize model
@@ -216,10 +813,8 @@ def objective(
         trial: optuna Trial object on which to optimize
         tracking_uri: mlflow tracking uri that defines where logged data will be stored
         experiment_name: Name of experiment associated with mlflow runs
-        feature_df: DataFrame of features for model training run
-        target_df: DataFrame with targets associated with features
-        data_split_dict: Dictionary that specifies indices for samples associated with
-            train and test sets
+        data: Train and holdout matrices from `prepare_training_data`, shared
+            by every trial of the study
         task_type: {"regression", "classification"}
             Type of machine learning task
         model_type: {"logistic", "xgboost"}
@@ -229,6 +824,24 @@ def objective(
         ranges: Dictionary including ranges for hyperparameters for optuna to sample
             from
         random_seed: Seed provided to ensure reproducibility
+        n_threads: Number of threads used by xgboost. If None, xgboost uses all
+            available cores
+        parent_run_id: ID of the mlflow run under which the trial's run is nested.
+            Needed when the trial runs in a process without an active parent run
+        early_stopping_rounds: Number of boosting rounds without improvement on
+            the holdout set after which xgboost stops. xgboost trials also report
+            their holdout score every round, so the study's pruner can stop them
+        xgb_settings: `xgboost` section of the config file
+        xgb_matrices: Training and holdout matrices from `build_xgb_matrices`,
+            shared by every xgboost trial of the study. If None, they are built
+            in the trial. Not used when `pca` is True
+        fidelity_levels: FidelityLevel objects from `build_fidelity_levels`. If
+            provided, the trial trains on each level's subsample in turn, from
+            the smallest to the full training set, and the study's pruner decides
+            after each level whether the trial moves up to the next one
+        run_logger: Batched logger from `tracking.open_run_logger`. If provided,
+            the trial's mlflow run is logged through its queue instead of with
+            blocking calls
 
     Returns:
         Score of objective function associated with training run
@@ -236,91 +849,69 @@ def objective(
     child_run_name = (
         f"child_run_{trial.number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     )
-    with mlflow.start_run(nested=True, run_name=child_run_name):
-        X_train, y_train, X_test, y_test = split_data(
-            feature_df, target_df, data_split_dict
-        )
-        params = {}
-
-        # xgboost can be used for regression or classification
-        if model_type == "xgboost":
-            max_depth_range = ranges["xgb_max_depth"]
-            n_estimators_range = ranges["xgb_n_estimators"]
-            lr_range = ranges["xgb_learning_rate"]
-            params["xgb_max_depth"] = trial.suggest_int(
-                "xgb_max_depth",
-                int(max_depth_range["min"]),
-                int(max_depth_range["max"]),
-            )
-            params["xgb_n_estimators"] = trial.suggest_int(
-                "xgb_n_estimators",
-                int(n_estimators_range["min"]),
-                int(n_estimators_range["max"]),
-            )
-            params["xgb_learning_rate"] = trial.suggest_float(
-                "xgb_learning_rate",
-                float(lr_range["min"]),
-                float(lr_range["max"]),
-                log=True,
-            )
-
-        elif task_type == "classification":
-            if model_type == "logistic":
-                c_range = ranges["logreg_c"]
-                params["logreg_c"] = trial.suggest_float(
-                    "logreg_c", float(c_range["min"]), float(c_range["max"]), log=True
-                )
-
-            else:
-                raise ValueError(
-                    f"model_type {model_type} is not supported when task_type is classification."
-                )
-        elif task_type == "regression":
-            if model_type == "elasticnet":
-                alpha_range = ranges["en_alpha"]
-                l1_ratio_range = ranges["en_l1_ratio"]
-                params["en_alpha"] = trial.suggest_float(
-                    "en_alpha",
-                    float(alpha_range["min"]),
-                    float(alpha_range["max"]),
-                )
-                params["en_l1_ratio"] = trial.suggest_float(
-                    "en_l1_ratio",
-                    float(l1_ratio_range["min"]),
-                    float(l1_ratio_range["max"]),
-                )
-            else:
-                raise ValueError(
-                    f"model_type {model_type} is not supported when task_type is regression."
-                )
-        else:
-            raise ValueError(
-                f"task_type is {task_type} but task_type must be in"
-                f"('classification', 'regression')"
-            )
+    with tracking.start_run(child_run_name, parent_run_id, run_logger) as run:
+        params = suggest_params(trial, task_type, model_type, ranges)
 
         if pca:
             params["pca_n_components"] = trial.suggest_int(
                 "pca_n_components",
                 float(ranges["pca_n_components"]["min"]),
-                len(X_train.columns),
+                data.X_train.shape[1],
             )
 
-        model = train_model(
-            X=X_train,
-            y=y_train,
-            params=params,
-            task_type=task_type,
-            model_type=model_type,
-            pca=pca,
-            random_seed=random_seed,
-        )
-        mlflow.log_params(params)
+        # Log parameters before training, so that they are kept for pruned trials
+        run.log_params(params)
+        fit_kwargs = {
+            "params": params,
+            "task_type": task_type,
+            "model_type": model_type,
+            "pca": pca,
+            "random_seed": random_seed,
+            "n_threads": n_threads,
+            "early_stopping_rounds": early_stopping_rounds,
+            "xgb_settings": xgb_settings,
+        }
+        objective_metric = OBJECTIVE_METRICS[task_type]
+        try:
+            if fidelity_levels:
+                # Each fidelity level is one step, so the pruner compares trials
+                # trained on the same fraction of the training set
+                for step, level in enumerate(fidelity_levels):
+                    metric_dict, best_iteration = fit_and_evaluate(
+                        data=level.data, xgb_matrices=level.xgb_matrices, **fit_kwargs
+                    )
+                    score = metric_dict[objective_metric]
+                    run.log_metrics(
+                        {
+                            "fidelity_fraction": level.fraction,
+                            f"fidelity_{objective_metric}": score,
+                        },
+                        step=step,
+                    )
+                    trial.report(score, step=step)
+                    if step < len(fidelity_levels) - 1 and trial.should_prune():
+                        raise optuna.TrialPruned(
+                            f"Trial {trial.number} pruned at training set "
+                            f"fraction {level.fraction}."
+                        )
+            else:
+                metric_dict, best_iteration = fit_and_evaluate(
+                    data=data,
+                    xgb_matrices=xgb_matrices,
+                    callbacks=[XGBoostPruningCallback(trial)],
+                    **fit_kwargs,
+                )
+        except optuna.TrialPruned:
+            run.set_tag("pruned", True)
+            raise
+
+        if best_iteration is not None:
+            run.log_metric("xgb_best_iteration", best_iteration)
+            trial.set_user_attr("xgb_best_iteration", best_iteration)
 
-        metric_dict = evaluate_model(model, X_test, y_test, task_type)
         if task_type == "classification":
             params["objective"] = "clf:min_brier_score"
-            mlflow.log_metrics(
+            run.log_metrics(
                 {
                     "brier_score_loss": metric_dict["brier_score_loss"],
                     "roc_auc_score": metric_dict["roc_auc_score"],
@@ -331,7 +922,7 @@ def objective(
 
         if task_type == "regression":
             params["objective"] = "reg:min_mean_squared_error"
-            mlflow.log_metrics(
+            run.log_metrics(
                 {
                     "mean_squared_error": metric_dict["mean_squared_error"],
                     "mean_absolute_error": metric_dict["mean_absolute_error"],
@@ -340,3 +931,365 @@ def objective(
                 }
             )
             return metric_dict["median_absolute_error"]
+
+
+def get_best_params(trial: optuna.trial.FrozenTrial) -> Dict:
+    """
+    Get the hyperparameters with which the best model is refit. If xgboost
+    stopped early in the trial, the number of boosting rounds is set to the
+    trial's best iteration, so that the refit model matches the scored one.
+
+    Args:
+        trial: Best trial of an optuna study
+
+    Returns:
+        Dictionary of model hyperparameters
+    """
+    params = dict(trial.params)
+    best_iteration = trial.user_attrs.get("xgb_best_iteration")
+    if best_iteration is not None:
+        params["xgb_n_estimators"] = best_iteration + 1
+    return params
+
+
+def get_regularization_path(
+    model_type: str,
+    ranges: Dict,
+    n_points: Optional[int] = 50,
+    n_l1_ratios: Optional[int] = 3,
+) -> List[Dict]:
+    """
+    Get the grid of regularization strengths visited by a path search, ordered
+    from the strongest to the weakest regularization so that each fit can warm
+    start from the previous, simpler solution.
+
+    Args:
+        model_type: {"logistic", "elasticnet"}
+            Type of model to train
+        ranges: Dictionary including ranges for hyperparameters
+        n_points: Number of regularization strengths on the path
+        n_l1_ratios: Number of `en_l1_ratio` values for which an `en_alpha` path
+            is created. Only used when model_type is "elasticnet"
+
+    Returns:
+        List of parameter dictionaries in the order in which they should be fit
+    """
+    if model_type == "logistic":
+        c_range = ranges["logreg_c"]
+        c_grid = np.geomspace(float(c_range["min"]), float(c_range["max"]), n_points)
+        return [{"logreg_c": float(c)} for c in c_grid]
+
+    if model_type == "elasticnet":
+        alpha_range = ranges["en_alpha"]
+        l1_ratio_range = ranges["en_l1_ratio"]
+        alpha_max = float(alpha_range["max"])
+        # A geometric grid cannot reach an alpha of 0, so it stops four orders of
+        # magnitude below the maximum when the minimum is 0
+        alpha_min = max(float(alpha_range["min"]), alpha_max * 1e-4)
+        alpha_grid = np.geomspace(alpha_max, alpha_min, n_points)
+        l1_ratio_grid = np.linspace(
+            float(l1_ratio_range["min"]), float(l1_ratio_range["max"]), n_l1_ratios
+        )
+        return [
+            {"en_alpha": float(alpha), "en_l1_ratio": float(l1_ratio)}
+            for l1_ratio in l1_ratio_grid
+            for alpha in alpha_grid
+        ]
+
+    raise ValueError(
+        f"model_type of {model_type} is not supported by path search. "
+        f"model_type must be in ('logistic', 'elasticnet')."
+    )
+
+
+def search_regularization_path(
+    data: TrainingData,
+    task_type: str,
+    model_type: str,
+    ranges: Dict,
+    n_points: Optional[int] = 50,
+    n_l1_ratios: Optional[int] = 3,
+    random_seed: Optional[int] = 0,
+    run_logger: Optional[tracking.BatchedRunLogger] = None,
+) -> Tuple[Dict, float]:
+    """
+    Fit a whole path of regularization strengths with warm starts, reusing the
+    coefficients of the previous point, and score each point on the holdout set.
+    The path is logged to a nested mlflow run, with one step per point.
+
+    Args:
+        data: Train and holdout matrices from `prepare_training_data`
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        model_type: {"logistic", "elasticnet"}
+            Type of model to train
+        ranges: Dictionary including ranges for hyperparameters
+        n_points: Number of regularization strengths on the path
+        n_l1_ratios: Number of `en_l1_ratio` values for which an `en_alpha` path
+            is created. Only used when model_type is "elasticnet"
+        random_seed: Seed provided to ensure reproducibility
+        run_logger: Batched logger from `tracking.open_run_logger`. If provided,
+            the path is logged through its queue instead of with blocking calls
+
+    Returns:
+        Tuple with two elements: parameters of the best point on the path, and
+        the score of that point (Brier score for classification, median absolute
+        error for regression)
+    """
+    if task_type == "classification" and model_type == "logistic":
+        model = LogisticRegression(warm_start=True, random_state=random_seed)
+    elif task_type == "regression" and model_type == "elasticnet":
+        model = ElasticNet(warm_start=True, random_state=random_seed)
+    else:
+        raise ValueError(
+            f"Path search does not support model_type {model_type} with "
+            f"task_type {task_type}."
+        )
+
+    objective_metric = OBJECTIVE_METRICS[task_type]
+    path = get_regularization_path(model_type, ranges, n_points, n_l1_ratios)
+    best_params, best_score = None, np.inf
+    run_name = f"regularization_path_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    with tracking.start_run(run_name, run_logger=run_logger) as run:
+        run.log_params({"path_n_points": n_points, "path_model_type": model_type})
+        for step, params in enumerate(path):
+            if model_type == "logistic":
+                model.set_params(C=params["logreg_c"])
+            else:
+                if step > 0 and params["en_l1_ratio"] != path[step - 1]["en_l1_ratio"]:
+                    # Restart from zero coefficients at the top of each alpha path
+                    model = ElasticNet(warm_start=True, random_state=random_seed)
+                model.set_params(
+                    alpha=params["en_alpha"], l1_ratio=params["en_l1_ratio"]
+                )
+            model.fit(data.X_train, data.y_train)
+
+            metric_dict = evaluate_model(model, data.X_test, data.y_test, task_type)
+            run.log_metrics({**params, **metric_dict}, step=step)
+            if metric_dict[objective_metric] < best_score:
+                best_params, best_score = params, metric_dict[objective_metric]
+
+        run.log_params({f"best_{key}": value for key, value in best_params.items()})
+        run.log_metric(f"best_{objective_metric}", best_score)
+
+    logger.info(f"Best point on regularization path: {best_params}")
+    return best_params, best_score
+
+
+def run_search(
+    data: TrainingData,
+    config: Dict,
+    run_logger: Optional[tracking.BatchedRunLogger] = None,
+    n_threads: Optional[int] = None,
+    parent_run_id: Optional[str] = None,
+) -> Tuple[Dict, float]:
+    """
+    Search for the best hyperparameters in this process, with the search mode
+    of the config file: a warm-started regularization path, or an optuna study
+    whose trials run one after another.
+
+    Args:
+        data: Train and holdout matrices from `prepare_training_data`
+        config: Contents of the config file
+        run_logger: Batched logger from `tracking.open_run_logger`
+        n_threads: Number of threads used by xgboost. If None, `nthread` of the
+            `xgboost` section of the config is used
+        parent_run_id: ID of the mlflow run under which trial runs are nested
+
+    Returns:
+        Tuple with two elements: best hyperparameters and their holdout score
+    """
+    if config.get("search_mode", "optuna") == "path":
+        # The path does not search the number of PCA components, so the best
+        # point could not be refit
+        if config["pca"]:
+            raise ValueError("pca is not supported when search_mode is path.")
+        path_config = config.get("path_search", {})
+        return search_regularization_path(
+            data=data,
+            task_type=config["task_type"],
+            model_type=config["model_type"],
+            ranges=config["ranges"],
+            n_points=path_config.get("n_points", 50),
+            n_l1_ratios=path_config.get("n_l1_ratios", 3),
+            random_seed=config["random_seed"],
+            run_logger=run_logger,
+        )
+
+    xgb_settings = dict(config.get("xgboost") or {})
+    if n_threads is not None:
+        xgb_settings["nthread"] = n_threads
+    xgb_matrices, fidelity_levels = None, None
+    fidelity_config = config.get("fidelity") or {}
+    if fidelity_config.get("enabled", False):
+        logger.info("Building subsamples for fidelity levels...")
+        fidelity_levels = build_fidelity_levels(
+            data,
+            fidelity_config["fractions"],
+            task_type=config["task_type"],
+            model_type=config["model_type"],
+            pca=config["pca"],
+            random_seed=config["random_seed"],
+            xgb_settings=xgb_settings,
+        )
+    elif config["model_type"] == "xgboost" and not config["pca"]:
+        logger.info("Building xgboost matrices shared by all trials...")
+        xgb_matrices = build_xgb_matrices(data, xgb_settings)
+
+    sampler = optuna.samplers.TPESampler(seed=config["random_seed"])
+    study = optuna.create_study(
+        direction="minimize",
+        sampler=sampler,
+        pruner=create_pruner(config.get("pruner")),
+    )
+    study.optimize(
+        lambda trial: objective(
+            trial=trial,
+            data=data,
+            task_type=config["task_type"],
+            model_type=config["model_type"],
+            pca=config["pca"],
+            ranges=config["ranges"],
+            random_seed=config["random_seed"],
+            n_threads=n_threads,
+            parent_run_id=parent_run_id,
+            early_stopping_rounds=config.get("early_stopping_rounds"),
+            xgb_settings=xgb_settings,
+            xgb_matrices=xgb_matrices,
+            fidelity_levels=fidelity_levels,
+            run_logger=run_logger,
+        ),
+        n_trials=config["n_trials"],
+    )
+    return get_best_params(study.best_trial), study.best_trial.value
+
+
+def get_update_masks(
+    adddate_series: pd.Series, holdout_fraction: Optional[float] = 0.2
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split newly arrived records by time into the records a model is updated on
+    and the most recent records, which are held out to check the update.
+
+    Args:
+        adddate_series: A pandas Series with the `adddate` field of the new records
+        holdout_fraction: Fraction of the new records, the most recent ones, that
+            are held out
+
+    Returns:
+        Tuple with two elements: boolean NumPy arrays selecting the update
+        records and the holdout records
+    """
+    if not 0 < holdout_fraction < 1:
+        raise ValueError(
+            f"holdout_fraction is {holdout_fraction}, but holdout_fraction must be "
+            f"in (0, 1)."
+        )
+    order = np.argsort(adddate_series.to_numpy(), kind="stable")
+    n_holdout = max(1, int(round(len(order) * holdout_fraction)))
+    holdout_mask = np.zeros(len(order), dtype=bool)
+    holdout_mask[order[-n_holdout:]] = True
+    return ~holdout_mask, holdout_mask
+
+
+@instrument()
+def update_model(
+    model: Pipeline,
+    X: pd.DataFrame,
+    y: pd.DataFrame,
+    task_type: str,
+    n_rounds: Optional[int] = 50,
+    n_epochs: Optional[int] = 1,
+    max_iter: Optional[int] = 5,
+    n_threads: Optional[int] = None,
+) -> Pipeline:
+    """
+    Continue training a fit model pipeline on newly arrived records instead of
+    refitting it from scratch. The preprocessing steps of the pipeline, such as
+    PCA, are not refit. xgboost models add boosting rounds to the saved booster,
+    models with `partial_fit` (e.g. the SGD models of out-of-core training) take
+    more passes over the new records, and LogisticRegression and ElasticNet run
+    a few solver iterations warm started from their saved coefficients.
+
+    Args:
+        model: A fit model pipeline object. It is not modified
+        X: Features of the new records
+        y: Targets of the new records
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        n_rounds: Number of boosting rounds added to xgboost models
+        n_epochs: Number of `partial_fit` passes over the new records
+        max_iter: Number of solver iterations of warm-started models
+        n_threads: Number of threads used by xgboost. If None, the saved
+            setting is used
+
+    Returns:
+        Updated copy of the model pipeline object
+    """
+    model = copy.deepcopy(model)
+    for _, step in model.steps[:-1]:
+        X = step.transform(X)
+    estimator = model.steps[-1][1]
+
+    if isinstance(estimator, xgb.XGBModel):
+        booster = estimator.get_booster()
+        estimator.set_params(
+            n_estimators=n_rounds, early_stopping_rounds=None, callbacks=None
+        )
+        if n_threads is not None:
+            estimator.set_params(n_jobs=n_threads)
+        estimator.fit(X, y, xgb_model=booster, verbose=False)
+    elif hasattr(estimator, "partial_fit"):
+        fit_kwargs = (
+            {"classes": estimator.classes_} if task_type == "classification" else {}
+        )
+        for _ in range(n_epochs):
+            estimator.partial_fit(X, y, **fit_kwargs)
+    elif isinstance(estimator, (LogisticRegression, ElasticNet)):
+        estimator.set_params(warm_start=True, max_iter=max_iter)
+        # Stopping after a few iterations is intended, so that the update stays
+        # close to the saved coefficients
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=ConvergenceWarning)
+            estimator.fit(X, y)
+    else:
+        raise ValueError(
+            f"Model of type {type(estimator).__name__} cannot be updated. The model "
+            f"must be an xgboost model, a LogisticRegression or ElasticNet model, or "
+            f"a model with `partial_fit`."
+        )
+    return model
+
+
+def check_update(
+    model: Pipeline,
+    updated_model: Pipeline,
+    X_holdout: pd.DataFrame,
+    y_holdout: pd.DataFrame,
+    task_type: str,
+    tolerance: Optional[float] = 0.0,
+) -> Tuple[bool, Dict, Dict]:
+    """
+    Compare a model with its update on held-out records.
+
+    Args:
+        model: The saved model pipeline object
+        updated_model: Model pipeline object returned by `update_model`
+        X_holdout: Features of the held-out records
+        y_holdout: Targets of the held-out records
+        task_type: {"regression", "classification"}
+            Type of machine learning task
+        tolerance: Amount by which the update may worsen the holdout score (the
+            metric in `OBJECTIVE_METRICS`) and still be accepted
+
+    Returns:
+        Tuple with three elements: whether the update is accepted, and the
+        holdout metrics of the saved and updated models
+    """
+    metric_dict = evaluate_model(model, X_holdout, y_holdout, task_type)
+    updated_metric_dict = evaluate_model(updated_model, X_holdout, y_holdout, task_type)
+    objective_metric = OBJECTIVE_METRICS[task_type]
+    score = metric_dict[objective_metric]
+    updated_score = updated_metric_dict[objective_metric]
+    accepted = bool(updated_score <= score + tolerance)
+    return accepted, metric_dict, updated_metric_dict
@@ -0,0 +1,618 @@
+"""
+Run the stages of the pipeline in dependency order, in parallel where they are
+independent, and skip stages whose inputs have not changed
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import copy
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import yaml
+
+import dc311.features.features as feat
+from dc311.modeling import fused, lookup, release
+from dc311.modeling.registry import get_file_signature
+
+logger = logging.getLogger(__name__)
+
+# Config keys read by the stages of `get_default_stages`. A stage reruns when
+# the value of one of its keys changes
+EXTRACT_CONFIG_KEYS = [
+    "dc_311_data_api_endpoints",
+    "api_query_parameters",
+    "max_num_records",
+]
+FEATURE_CONFIG_KEYS = [
+    "features",
+    "feature_encoding",
+    "task_type",
+    "target_threshold",
+    "target_thresholds",
+    "train_year",
+    "validation_year",
+    "test_year",
+]
+TRAINING_CONFIG_KEYS = FEATURE_CONFIG_KEYS + [
+    "model_type",
+    "pca",
+    "random_seed",
+    "n_trials",
+    "ranges",
+    "training_dtype",
+    "sparse_features",
+    "search_mode",
+    "path_search",
+    "early_stopping_rounds",
+    "pruner",
+    "fidelity",
+    "xgboost",
+]
+
+# Statuses of the stages in a run summary
+STATUSES = ("ran", "skipped", "failed", "blocked")
+
+
+class PipelineStage:
+    """
+    A command that reads input files and writes output files.
+
+    Args:
+        name: Name of the stage
+        command: Arguments of the command, run from the project directory
+        inputs: Paths of the files the stage reads, relative to the project
+            directory. The stage runs after the stages that write them
+        outputs: Paths of the files the stage writes, relative to the project
+            directory
+        config_keys: Keys of the config file the stage reads
+        config_overrides: Config values that replace those of the config file
+            for this stage only
+    """
+
+    def __init__(
+        self,
+        name: str,
+        command: List[str],
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+        config_keys: Optional[List[str]] = None,
+        config_overrides: Optional[Dict] = None,
+    ):
+        self.name = name
+        self.command = command
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.config_keys = config_keys or []
+        self.config_overrides = config_overrides or {}
+
+
+def _script_stage(name: str, script: str, args: List[str], **kwargs) -> PipelineStage:
+    # A script is an input of its own stage, so that the stage reruns when the
+    # script changes
+    kwargs["inputs"] = kwargs.get("inputs", []) + [
+        os.path.join("scripts", f"{script}.py")
+    ]
+    command = [sys.executable, "-m", f"scripts.{script}", *args]
+    return PipelineStage(name, command, **kwargs)
+
+
+def get_default_stages(config: Dict) -> List[PipelineStage]:
+    """
+    Get the stages of the pipeline run by `scripts/pipeline.sh`: extract each
+    year, preprocess, create features for each task type, train each model
+    listed in `models` of the `release` section, and build the fused predictor
+    and lookup table.
+
+    Args:
+        config: Contents of the config file
+
+    Returns:
+        List of stages
+    """
+    raw_csvs = []
+    stages = []
+    for year in config["dc_311_data_api_endpoints"]:
+        raw_json = os.path.join("data", "raw", f"dc_311_{year}_data.json")
+        raw_csv = os.path.join("data", "raw", f"dc_311_{year}_data.csv")
+        raw_csvs.append(raw_csv)
+        stages.append(
+            _script_stage(
+                f"extract_{year}",
+                "extract_data",
+                ["-y", str(year), "-f"],
+                outputs=[raw_json, raw_csv],
+                config_keys=EXTRACT_CONFIG_KEYS,
+            )
+        )
+
+    preprocessed = os.path.join("data", "interim", "dc_311_preprocessed_data.csv")
+    stages.append(
+        _script_stage(
+            "preprocess",
+            "preprocess_data",
+            ["-f", "-i", *(os.path.basename(path) for path in raw_csvs)],
+            inputs=raw_csvs,
+            outputs=[preprocessed],
+        )
+    )
+
+    encoding = config.get("feature_encoding", {}).get("mode", "onehot")
+    model_configs = release.get_model_configs(config)
+    task_types = {model_config["task_type"] for model_config in model_configs.values()}
+    thresholds = sorted(
+        model_config["target_threshold"]
+        for model_config in model_configs.values()
+        if model_config["task_type"] == "classification"
+    )
+    processed = {}
+    for task_type, suffix in (("classification", "clf"), ("regression", "reg")):
+        if task_type not in task_types:
+            continue
+        if task_type == "classification":
+            # Features are created once, with one target per threshold
+            args = ["-f", "-t"]
+            target_names = [f"processed_target_clf_{t}.csv" for t in thresholds]
+            overrides = {
+                "task_type": task_type,
+                "target_threshold": thresholds[0],
+                "target_thresholds": thresholds,
+            }
+        else:
+            args = ["-f"]
+            target_names = ["processed_target_reg.csv"]
+            overrides = {"task_type": task_type}
+        feature_path = os.path.join(
+            "data", "processed", f"processed_features_{suffix}.csv"
+        )
+        processed[task_type] = feat.get_feature_paths(feature_path, encoding) + [
+            os.path.join("data", "processed", f"dataset_splits_{suffix}.npy")
+        ]
+        target_paths = [os.path.join("data", "processed", n) for n in target_names]
+        stages.append(
+            _script_stage(
+                f"features_{suffix}",
+                "create_features",
+                args,
+                inputs=[preprocessed],
+                outputs=[
+                    os.path.join("models", f"feature_pipeline_{suffix}.joblib"),
+                    *processed[task_type],
+                    *target_paths,
+                ],
+                config_keys=FEATURE_CONFIG_KEYS,
+                config_overrides=overrides,
+            )
+        )
+
+    # One model is trained for each model of the `release` section, which
+    # lists the models the app serves
+    model_paths = []
+    for name, model_config in model_configs.items():
+        task_type = model_config["task_type"]
+        if task_type == "classification":
+            target_name = f"processed_target_clf_{model_config['target_threshold']}.csv"
+        else:
+            target_name = "processed_target_reg.csv"
+        model_path = os.path.join("models", f"{name}.joblib")
+        model_paths.append(model_path)
+        stages.append(
+            _script_stage(
+                f"train_{name}",
+                "run_training",
+                ["-s"],
+                inputs=[
+                    *processed[task_type],
+                    os.path.join("data", "processed", target_name),
+                ],
+                outputs=[model_path],
+                config_keys=TRAINING_CONFIG_KEYS,
+                config_overrides={
+                    key: model_config[key]
+                    for key in TRAINING_CONFIG_KEYS
+                    if key in model_config
+                },
+            )
+        )
+
+    # Served artifacts that no stage writes, which happens when a model of
+    # `lookup.MODEL_ARTIFACTS` is missing from `release`, are read as they are
+    artifacts = list(lookup.MODEL_ARTIFACTS.values())
+    artifacts += [path for path in model_paths if path not in artifacts]
+    categories_path = os.path.join("streamlit_app", "request_categories.json")
+    stages.append(
+        _script_stage(
+            "build_fused_predictor",
+            "build_fused_predictor",
+            ["-f"],
+            inputs=[*artifacts, categories_path],
+            outputs=[fused.FUSED_PREDICTOR_PATH],
+        )
+    )
+    stages.append(
+        _script_stage(
+            "build_lookup_table",
+            "build_lookup_table",
+            ["-f"],
+            inputs=[*artifacts, categories_path],
+            outputs=[lookup.LOOKUP_TABLE_PATH],
+        )
+    )
+    return stages
+
+
+def get_dependencies(stages: List[PipelineStage]) -> Dict[str, List[str]]:
+    """
+    Find the stages each stage depends on, i.e. the stages that write its
+    inputs.
+
+    Args:
+        stages: List of stages
+
+    Returns:
+        Dictionary from the name of each stage to the names of the stages it
+        depends on
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) < len(names):
+        raise ValueError("Stage names must be unique.")
+    writers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in writers:
+                raise ValueError(
+                    f"{path} is written by {writers[path]} and {stage.name}. "
+                    "Each file must be written by one stage."
+                )
+            writers[path] = stage.name
+
+    dependencies = {
+        stage.name: sorted(
+            {writers[path] for path in stage.inputs if path in writers} - {stage.name}
+        )
+        for stage in stages
+    }
+
+    # Visit the stages depth first to find cycles
+    visited, visiting = set(), set()
+
+    def visit(name: str):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage {name} depends on itself.")
+        visiting.add(name)
+        for dependency in dependencies[name]:
+            visit(dependency)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in names:
+        visit(name)
+    return dependencies
+
+
+class FileHasher:
+    """
+    Hash the contents of files. Hashes are kept with the file's modification
+    time and size, and are only recomputed when those change, so that large
+    files are not read on every run.
+
+    Args:
+        cache: Dictionary from path to the signature and hash of the file,
+            saved between runs
+    """
+
+    def __init__(self, cache: Optional[Dict] = None):
+        self.cache = cache if cache is not None else {}
+        self._lock = threading.Lock()
+
+    def hash(self, path: str) -> str:
+        """
+        Get the SHA-256 hash of a file's contents.
+
+        Args:
+            path: Path of the file
+
+        Returns:
+            Hex digest of the file's contents
+        """
+        signature = list(get_file_signature(path))
+        with self._lock:
+            cached = self.cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        with self._lock:
+            self.cache[path] = [signature, digest.hexdigest()]
+        return digest.hexdigest()
+
+
+class PipelineRunner:
+    """
+    Run stages in dependency order on a pool of threads, each waiting on one
+    stage's process, so that independent stages run at the same time.
+
+    A stage is skipped if it last succeeded with the same command, config
+    values, and input contents, and its outputs are unchanged since. The hashes
+    this is decided with are saved to `state_path` after each stage.
+
+    Args:
+        stages: List of stages
+        config: Contents of the config file
+        project_dir: Directory the stages run in, and their paths are relative to
+        state_path: Path of the JSON file with the hashes of previous runs
+        log_dir: Directory where the output of each stage is saved as
+            `<stage>.log`
+        max_workers: Number of stages run at the same time. If None, the number
+            of CPUs is used
+    """
+
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        config: Dict,
+        project_dir: str,
+        state_path: str,
+        log_dir: str,
+        max_workers: Optional[int] = None,
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        self.dependencies = get_dependencies(stages)
+        self.config = config
+        self.project_dir = project_dir
+        self.state_path = state_path
+        self.log_dir = log_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.state = self._load_state()
+        self.hasher = FileHasher(self.state["files"])
+        self._lock = threading.Lock()
+
+    def _load_state(self) -> Dict:
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as file:
+                return json.load(file)
+        return {"stages": {}, "files": {}}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        with self._lock:
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self.state, file, indent=2)
+            os.replace(tmp_path, self.state_path)
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.project_dir, path)
+
+    def get_stage_config(self, stage: PipelineStage) -> Dict:
+        """
+        Get the config a stage runs with.
+
+        Args:
+            stage: Stage object
+
+        Returns:
+            The config file's contents, updated with the stage's overrides
+        """
+        config = copy.deepcopy(self.config)
+        config.update(stage.config_overrides)
+        return config
+
+    def get_input_hash(self, stage: PipelineStage) -> str:
+        """
+        Hash the command, config values, and input contents of a stage.
+
+        Args:
+            stage: Stage object
+
+        Returns:
+            Hex digest
+        """
+        config = self.get_stage_config(stage)
+        digest = hashlib.sha256()
+        digest.update(
+            json.dumps(
+                {
+                    # The interpreter's path differs between machines
+                    "command": stage.command[1:],
+                    "config": {key: config.get(key) for key in stage.config_keys},
+                },
+                sort_keys=True,
+                default=str,
+            ).encode()
+        )
+        for path in sorted(stage.inputs):
+            digest.update(path.encode())
+            digest.update(self.hasher.hash(self._path(path)).encode())
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage: PipelineStage, input_hash: str) -> bool:
+        """
+        Check whether a stage last succeeded with the same inputs, and its
+        outputs have not changed since.
+
+        Args:
+            stage: Stage object
+            input_hash: Hash from `get_input_hash`
+
+        Returns:
+            True if the stage can be skipped
+        """
+        previous = self.state["stages"].get(stage.name)
+        if previous is None or previous["input_hash"] != input_hash:
+            return False
+        for path in stage.outputs:
+            if not os.path.exists(self._path(path)):
+                return False
+            if self.hasher.hash(self._path(path)) != previous["outputs"].get(path):
+                return False
+        return True
+
+    def run_stage(self, stage: PipelineStage, force: Optional[bool] = False) -> Dict:
+        """
+        Run a stage unless it is up to date.
+
+        Args:
+            stage: Stage object
+            force: Whether to run the stage even if it is up to date
+
+        Returns:
+            Dictionary with the stage's name, status, and seconds
+        """
+        start = time.perf_counter()
+        input_hash = self.get_input_hash(stage)
+        if not force and self.is_up_to_date(stage, input_hash):
+            logger.info(f"Skipping {stage.name}, whose inputs are unchanged.")
+            return {
+                "stage": stage.name,
+                "status": "skipped",
+                "seconds": time.perf_counter() - start,
+            }
+
+        env = os.environ.copy()
+        if stage.config_overrides:
+            config_path = os.path.join(self.log_dir, f"{stage.name}_config.yaml")
+            with open(config_path, "w") as file:
+                yaml.safe_dump(self.get_stage_config(stage), file)
+            env["DC_311_CONFIG_PATH"] = config_path
+
+        log_path = os.path.join(self.log_dir, f"{stage.name}.log")
+        logger.info(f"Running {stage.name}. Output is saved to {log_path}")
+        with open(log_path, "w") as log_file:
+            returncode = subprocess.run(
+                stage.command,
+                cwd=self.project_dir,
+                env=env,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+            ).returncode
+        seconds = time.perf_counter() - start
+
+        missing = [
+            path for path in stage.outputs if not os.path.exists(self._path(path))
+        ]
+        if returncode != 0 or missing:
+            reason = f"with exit code {returncode}"
+            if returncode == 0:
+                reason = f"without writing {missing}"
+            logger.error(
+                f"{stage.name} failed after {seconds:.1f}s {reason}. See {log_path}"
+            )
+            with self._lock:
+                self.state["stages"].pop(stage.name, None)
+            self._save_state()
+            return {"stage": stage.name, "status": "failed", "seconds": seconds}
+
+        logger.info(f"{stage.name} finished in {seconds:.1f}s")
+        outputs = {path: self.hasher.hash(self._path(path)) for path in stage.outputs}
+        with self._lock:
+            self.state["stages"][stage.name] = {
+                "input_hash": input_hash,
+                "outputs": outputs,
+            }
+        self._save_state()
+        return {"stage": stage.name, "status": "ran", "seconds": seconds}
+
+    def run(
+        self,
+        force: Optional[bool] = False,
+        rerun: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """
+        Run every stage once the stages it depends on have finished. Stages
+        that depend on a failed stage are not run.
+
+        Args:
+            force: Whether to run every stage, even if it is up to date
+            rerun: Names of stages to run even if they are up to date
+
+        Returns:
+            List of dictionaries with the name, status, and seconds of each
+            stage, in the order they finished
+        """
+        rerun = set(rerun or [])
+        unknown = rerun - set(self.stages)
+        if unknown:
+            raise ValueError(
+                f"Stages {sorted(unknown)} provided. Stages must be in "
+                f"{tuple(self.stages)}."
+            )
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        pending = dict(self.dependencies)
+        statuses = {}
+        summary = []
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, dependencies in list(pending.items()):
+                    if any(
+                        statuses.get(d) in ("failed", "blocked") for d in dependencies
+                    ):
+                        logger.warning(
+                            f"Not running {name}, which depends on a failed stage."
+                        )
+                        statuses[name] = "blocked"
+                        summary.append(
+                            {"stage": name, "status": "blocked", "seconds": 0.0}
+                        )
+                        del pending[name]
+                    elif all(d in statuses for d in dependencies):
+                        future = executor.submit(
+                            self._run_safely, self.stages[name], force or name in rerun
+                        )
+                        running[future] = name
+                        del pending[name]
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    statuses[running.pop(future)] = result["status"]
+                    summary.append(result)
+        return summary
+
+    def _run_safely(self, stage: PipelineStage, force: bool) -> Dict:
+        try:
+            return self.run_stage(stage, force)
+        except Exception as e:
+            logger.exception(f"{stage.name} failed: {e}")
+            return {"stage": stage.name, "status": "failed", "seconds": 0.0}
+
+
+def format_summary(summary: List[Dict], wall_seconds: float) -> str:
+    """
+    Format a run summary as a table, with the total time of the run.
+
+    Args:
+        summary: List of results from `PipelineRunner.run`
+        wall_seconds: Seconds the whole run took
+
+    Returns:
+        Table as a string
+    """
+    width = max([len("stage")] + [len(result["stage"]) for result in summary])
+    lines = [f"{'stage':<{width}}  {'status':<7}  {'seconds':>9}"]
+    for result in summary:
+        lines.append(
+            f"{result['stage']:<{width}}  {result['status']:<7}  "
+            f"{result['seconds']:>9.1f}"
+        )
+    stage_seconds = sum(result["seconds"] for result in summary)
+    counts = ", ".join(
+        f"{sum(r['status'] == status for r in summary)} {status}" for status in STATUSES
+    )
+    lines.append(
+        f"Run took {wall_seconds:.1f}s for {stage_seconds:.1f}s of stages. {counts}"
+    )
+    return "\n".join(lines)
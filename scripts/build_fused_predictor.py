@@ -0,0 +1,88 @@
+"""
+Fuse the app's feature pipelines and models into one predictor that encodes
+each request once
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import joblib
+from dotenv import load_dotenv
+
+from config.logging_config import setup_logging
+from dc311.modeling import fused, lookup
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=False,
+        help="Path of the fused predictor. If not provided, default path is "
+        "`models/fused_predictor.joblib`.",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rebuild the fused predictor even if it was built from the current "
+        "models",
+    )
+    args = parser.parse_args()
+
+    try:
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        artifacts = {
+            name: os.path.join(project_dir, path)
+            for name, path in lookup.MODEL_ARTIFACTS.items()
+        }
+        fused_path = args.output or os.path.join(
+            project_dir, fused.FUSED_PREDICTOR_PATH
+        )
+
+        if os.path.exists(fused_path) and not args.force:
+            if joblib.load(fused_path).is_current(artifacts):
+                logger.info("Fused predictor is up to date with the models!")
+                return
+
+        categories_path = os.path.join(
+            project_dir, "streamlit_app", "request_categories.json"
+        )
+        with open(categories_path, "r") as file:
+            service_codes = list(json.load(file)["All Requests"].values())
+
+        logger.info("Loading models...")
+        models = {name: joblib.load(path) for name, path in artifacts.items()}
+        fingerprints = {
+            name: lookup.get_file_fingerprint(path) for name, path in artifacts.items()
+        }
+
+        logger.info("Building fused predictor...")
+        # Feature pipelines are compared on every input the app can receive
+        fused_predictor = fused.FusedPredictor.from_models(
+            models, lookup.build_input_grid(service_codes), fingerprints
+        )
+        logger.info(
+            f"{len(fused_predictor.feature_pipes)} feature pipeline(s) run per "
+            f"prediction"
+        )
+
+        logger.info(f"Saving fused predictor to {fused_path}...")
+        joblib.dump(fused_predictor, fused_path)
+        logger.info("Save complete.")
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Precompute the app's predictions for every service code, ward, month, and day
+of week
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import joblib
+from dotenv import load_dotenv
+
+from config.logging_config import setup_logging
+from dc311.modeling import lookup
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=False,
+        help="Path of the lookup table. If not provided, default path is "
+        "`models/prediction_lookup.npy`.",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rebuild the lookup table even if it was built from the current models",
+    )
+    args = parser.parse_args()
+
+    try:
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        artifacts = {
+            name: os.path.join(project_dir, path)
+            for name, path in lookup.MODEL_ARTIFACTS.items()
+        }
+        table_path = args.output or os.path.join(project_dir, lookup.LOOKUP_TABLE_PATH)
+
+        if os.path.exists(table_path) and not args.force:
+            if lookup.LookupTable.load(table_path).is_current(artifacts):
+                logger.info("Lookup table is up to date with the models!")
+                return
+
+        categories_path = os.path.join(
+            project_dir, "streamlit_app", "request_categories.json"
+        )
+        with open(categories_path, "r") as file:
+            service_codes = list(json.load(file)["All Requests"].values())
+
+        logger.info("Loading models...")
+        models = {name: joblib.load(path) for name, path in artifacts.items()}
+        fingerprints = {
+            name: lookup.get_file_fingerprint(path) for name, path in artifacts.items()
+        }
+
+        logger.info("Building lookup table...")
+        table = lookup.build_lookup_table(service_codes, models, fingerprints)
+
+        logger.info(f"Saving lookup table to {table_path}...")
+        table.save(table_path)
+        logger.info("Save complete.")
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,19 @@ Engineer features and target
 
 import argparse
 import joblib
-import json
 import logging
 import os
 
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
 import yaml
 
 from config.logging_config import setup_logging
+import dc311.features.chunked as chunked
 import dc311.features.features as feat
 import dc311.features.target as targ
+from dc311 import instrumentation
 
 
 def main():
@@ -38,97 +40,191 @@ def main():
         action="store_true",
         help="Re-create features and target even if they already exist",
     )
+    parser.add_argument(
+        "-m",
+        "--multi-target",
+        action="store_true",
+        help="Fit the feature pipeline once and save one feature matrix with a "
+        "target table holding the regression target and every threshold in "
+        "`target_thresholds`. If not provided, features and target are created "
+        "for `task_type` and `target_threshold` only.",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunked",
+        action="store_true",
+        help="Transform and save the features, target, and split codes in chunks "
+        "of `chunk_rows` rows from the `out_of_core` section of the config file, "
+        "for `run_training --out-of-core`, instead of as CSV files. The full "
+        "feature matrix is never held in memory.",
+    )
+    parser.add_argument(
+        "-t",
+        "--all-thresholds",
+        action="store_true",
+        help="Save one classification target for every threshold in "
+        "`target_thresholds`, next to classification features created once. If "
+        "not provided, only the target of `target_threshold` is saved.",
+    )
     args = parser.parse_args()
 
     try:
         config_path = os.getenv("DC_311_CONFIG_PATH")
         with open(config_path, "r") as file:
             config = yaml.safe_load(file)
+        instrumentation.configure(**config.get("instrumentation", {}))
 
         logger.debug("Fetching name of directory with data to be preprocessed...")
+        project_dir = os.path.dirname(os.path.dirname(__file__))
         if args.input:
             data_path = args.input
         else:
-            project_dir = os.path.dirname(os.path.dirname(__file__))
             data_path = os.path.join(
                 project_dir, "data", "interim", "dc_311_preprocessed_data.csv"
             )
         logger.debug(f"Data to preprocess is saved in directory: {data_path}")
 
         out_file_dir = os.path.join(project_dir, "data", "processed")
-        if config["task_type"] == "classification":
+        if args.multi_target:
+            pipe_file_name = "feature_pipeline.joblib"
+            feat_file_name = "processed_features.csv"
+            targ_file_name = "processed_targets.csv"
+            split_file_name = "dataset_splits.npy"
+        elif config["task_type"] == "classification":
             pipe_file_name = "feature_pipeline_clf.joblib"
             feat_file_name = "processed_features_clf.csv"
             targ_file_name = (
                 f"processed_target_clf_{str(config['target_threshold'])}.csv"
             )
-            index_file_name = "dataset_indices_clf.json"
+            split_file_name = "dataset_splits_clf.npy"
+            if args.all_thresholds:
+                if args.chunked:
+                    raise ValueError("--all-thresholds cannot be used with --chunked.")
+                targ_file_names = {
+                    targ.get_target_column_name(
+                        "classification", threshold
+                    ): f"processed_target_clf_{threshold}.csv"
+                    for threshold in config["target_thresholds"]
+                }
         elif config["task_type"] == "regression":
             pipe_file_name = "feature_pipeline_reg.joblib"
             feat_file_name = "processed_features_reg.csv"
             targ_file_name = "processed_target_reg.csv"
-            index_file_name = "dataset_indices_reg.json"
+            split_file_name = "dataset_splits_reg.npy"
+            if args.all_thresholds:
+                raise ValueError(
+                    "--all-thresholds can only be used for classification features."
+                )
         else:
             raise ValueError(
                 f"task_type of {config['task_type']} provided. task_type "
                 f"must be in ('classification', 'regression')."
             )
+        if not args.all_thresholds or args.multi_target:
+            targ_file_names = {"target": targ_file_name}
 
-        if (
-            os.path.exists(os.path.join(out_file_dir, feat_file_name))
-            and os.path.exists(os.path.join(out_file_dir, targ_file_name))
-            and not args.force
-        ):
+        chunk_dir = os.path.join(
+            out_file_dir, feat_file_name.replace(".csv", "_chunks")
+        )
+        encoding_config = config.get("feature_encoding", {})
+        encoding = encoding_config.get("mode", "onehot")
+        feat_path = os.path.join(out_file_dir, feat_file_name)
+        if args.chunked:
+            already_created = os.path.exists(
+                os.path.join(chunk_dir, chunked.MANIFEST_FILE_NAME)
+            )
+        else:
+            out_paths = feat.get_feature_paths(feat_path, encoding) + [
+                *(
+                    os.path.join(out_file_dir, name)
+                    for name in targ_file_names.values()
+                ),
+                os.path.join(out_file_dir, split_file_name),
+            ]
+            already_created = all(os.path.exists(path) for path in out_paths)
+        if already_created and not args.force:
             logger.debug("Features and target already created!")
         else:
-            dc311_df = pd.read_csv(data_path)
-            dc311_df = dc311_df.set_index("objectid")
-            dc311_df["adddate"] = pd.to_datetime(dc311_df["adddate"])
+            # Only read the columns needed to build features and targets
+            usecols = set(config["features"]) | {"objectid", "days_to_resolve"}
+            with instrumentation.track_stage("read_preprocessed_data") as stage:
+                dc311_df = pd.read_csv(
+                    data_path,
+                    usecols=lambda col: col in usecols,
+                    index_col="objectid",
+                    parse_dates=["adddate"],
+                )
+                stage.set_rows(rows_out=len(dc311_df))
 
             logger.info("Creating target...")
-            train_years = (
-                config["train_year"] + config["validation_year"] + config["test_year"]
-            )
-            target_df = targ.create_target(
-                df=dc311_df[dc311_df["adddate"].dt.year.isin(train_years)],
-                target_column="days_to_resolve",
-                task=config["task_type"],
-                clf_threshold=config["target_threshold"],
-            )
-
-            # Ensure feature_df and target_df have same objectids
-            feature_df = dc311_df.copy(deep=True)
-            if len(feature_df) > len(target_df):
-                logger.info(
-                    f"Reducing size of feature_df from {len(feature_df)} to {len(target_df)}..."
+            if args.multi_target:
+                target_df = targ.create_target_table(
+                    df=dc311_df,
+                    target_column="days_to_resolve",
+                    clf_thresholds=config["target_thresholds"],
+                )
+            elif args.all_thresholds:
+                target_df = targ.create_target_table(
+                    df=dc311_df,
+                    target_column="days_to_resolve",
+                    clf_thresholds=config["target_thresholds"],
                 )
-                feature_df = feature_df.loc[target_df.index]
+                target_df = target_df[list(targ_file_names)]
             else:
-                target_df = target_df.loc[feature_df.index]
+                target_df = targ.create_target_table(
+                    df=dc311_df,
+                    target_column="days_to_resolve",
+                    clf_thresholds=[config["target_threshold"]],
+                )
+                target_df = target_df[
+                    [
+                        targ.get_target_column_name(
+                            config["task_type"], config["target_threshold"]
+                        )
+                    ]
+                ]
+                target_df.columns = ["target"]
 
             logger.info("Splitting data into training, validaton, and test sets...")
-            train_df = feature_df[
-                feature_df["adddate"].dt.year.isin(config["train_year"])
-            ]
-            validation_df = feature_df[
-                feature_df["adddate"].dt.year.isin(config["validation_year"])
-            ]
-            test_df = feature_df[
-                feature_df["adddate"].dt.year.isin(config["test_year"])
-            ]
-            logger.info("Data split complete.")
-
-            feature_pipe = feat.create_feature_engineering_pipeline(config["features"])
+            dataset_masks = feat.get_dataset_masks(
+                dc311_df["adddate"],
+                train_years=config["train_year"],
+                validation_years=config["validation_year"],
+                test_years=config["test_year"],
+            )
+            # Rows in the train, validation, or test set
+            keep_mask = np.logical_or.reduce(list(dataset_masks.values()))
+            if not args.multi_target and config["task_type"] == "regression":
+                # Regression rows with a missing target cannot be used
+                keep_mask &= target_df["target"].notna().to_numpy()
 
-            logger.info("Creating features for training set...")
-            train_df = feature_pipe.fit_transform(train_df)
+            # Take all kept rows in one positional pass, so that features and
+            # target stay aligned row by row without any label lookups
+            if not keep_mask.all():
+                logger.info(
+                    f"Reducing size of data from {len(dc311_df)} to "
+                    f"{keep_mask.sum()} rows..."
+                )
+                keep_positions = np.flatnonzero(keep_mask)
+                dc311_df = dc311_df.take(keep_positions)
+                target_df = target_df.take(keep_positions)
+                dataset_masks = {
+                    key: mask[keep_positions] for key, mask in dataset_masks.items()
+                }
+            logger.info("Data split complete.")
 
-            logger.info("Creating features for validation set...")
-            validation_df = feature_pipe.transform(validation_df)
+            feature_pipe = feat.create_feature_engineering_pipeline(
+                config["features"],
+                encoding=encoding,
+                n_hash_features=encoding_config.get("n_hash_features", 1024),
+                crosses=encoding_config.get("crosses"),
+            )
 
-            logger.info("Creating features for test set...")
-            test_df = feature_pipe.transform(test_df)
-            logger.info("Features created successfully.")
+            logger.info("Fitting feature engineering pipeline on training set...")
+            with instrumentation.track_stage(
+                "feature_pipeline_fit", rows_in=int(dataset_masks["train"].sum())
+            ):
+                feature_pipe.fit(dc311_df[dataset_masks["train"]])
 
             pipeline_path = os.path.join(
                 os.path.dirname(__file__), "..", "models", pipe_file_name
@@ -138,32 +234,75 @@ def main():
             logger.info("Pipeline saved!")
 
             logger.info("Target created successfully.")
-            logger.info(f"Target balance: {target_df['target'].value_counts()}")
+            for col in target_df.columns:
+                if col == targ.get_target_column_name("regression"):
+                    num_missing = target_df[col].isna().sum()
+                    logger.info(f"Missing values in {col}: {num_missing}")
+                else:
+                    balance = target_df[col].value_counts()
+                    logger.info(f"Target balance of {col}: {balance}")
 
-            logger.info("Getting dataset indices...")
-            dataset_indices = feat.get_dataset_indices(train_df, validation_df, test_df)
-            logger.info("Dataset indices retrieved.")
+            logger.info("Getting dataset split codes...")
+            split_codes = feat.get_dataset_split_codes(dataset_masks)
+            logger.info("Dataset split codes retrieved.")
 
-            logger.info(
-                "Concatenating train, validation, and test sets back together..."
-            )
-            feature_df = pd.concat([train_df, validation_df, test_df])
-            logger.info("Concatenation complete.")
+            if args.chunked:
+                # The fit pipeline transforms each row independently, so each
+                # chunk is transformed and saved on its own
+                logger.info(
+                    f"Creating features and saving them in chunks to {chunk_dir}..."
+                )
+                with instrumentation.track_stage(
+                    "feature_pipeline_transform", rows_in=len(dc311_df)
+                ) as stage:
+                    n_rows = chunked.write_feature_chunks(
+                        feature_pipe,
+                        dc311_df,
+                        target_df,
+                        split_codes,
+                        chunk_dir,
+                        chunk_rows=config.get("out_of_core", {}).get(
+                            "chunk_rows", 100000
+                        ),
+                        dtype=config.get("training_dtype", "float32"),
+                    )
+                    stage.set_rows(rows_out=n_rows)
+                logger.info("Save complete.")
+                return
+
+            # The fit pipeline transforms each row independently, so the
+            # training, validation, and test sets are transformed in one call
+            logger.info("Creating features for training, validation, and test sets...")
+            with instrumentation.track_stage(
+                "feature_pipeline_transform", rows_in=len(dc311_df)
+            ) as stage:
+                feature_df = feature_pipe.transform(dc311_df)
+                stage.set_rows(rows_out=len(feature_df))
+            del dc311_df
+            logger.info("Features created successfully.")
 
             logger.info(
                 "Ensuring feature and target dataframes have identical indices..."
             )
+            assert np.array_equal(
+                feature_df.index.to_numpy(), target_df.index.to_numpy()
+            )
 
-            # Ensure that indices of feature_df and target_df match
-            feature_df = feature_df.loc[target_df.index]
-            assert feature_df.index.tolist() == target_df.index.tolist()
-
-            logger.info(f"Saving features, target, and indices to {out_file_dir}")
-            feature_df.to_csv(os.path.join(out_file_dir, feat_file_name))
-            target_df.to_csv(os.path.join(out_file_dir, targ_file_name))
+            logger.info(
+                f"Saving features, target, and split codes to {out_file_dir}"
+            )
+            feat.save_features(feature_df, feat_path, encoding)
+            if args.multi_target:
+                target_df.to_csv(os.path.join(out_file_dir, targ_file_name))
+            else:
+                # Each target is saved in its own file under the column name
+                # `run_training` reads
+                for column, name in targ_file_names.items():
+                    target_df[[column]].set_axis(["target"], axis=1).to_csv(
+                        os.path.join(out_file_dir, name)
+                    )
 
-            with open(os.path.join(out_file_dir, index_file_name), "w") as json_file:
-                json.dump(dataset_indices, json_file, indent=4)
+            np.save(os.path.join(out_file_dir, split_file_name), split_codes)
             logger.info("Save complete.")
     except Exception as e:
         logger.exception(f"There was an error: {e}")
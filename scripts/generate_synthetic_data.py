@@ -0,0 +1,115 @@
+"""
+Generate synthetic DC 311 data in the raw formats of the DC 311 API
+"""
+
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+import yaml
+
+from config.logging_config import setup_logging
+from dc311.data import synthetic
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r",
+        "--n-rows",
+        type=int,
+        required=True,
+        help="Number of requests generated per year",
+    )
+    parser.add_argument(
+        "-y",
+        "--years",
+        nargs="+",
+        type=int,
+        help="Years to generate, one file per year. If not provided, the "
+        "training, validation, and test years of the config file are used.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=synthetic.FILE_FORMATS,
+        default="csv",
+        help="Format of the files. json matches the files downloaded by "
+        "extract_data.py and csv matches the files read by preprocess_data.py.",
+    )
+    parser.add_argument(
+        "-d",
+        "--directory",
+        type=str,
+        required=False,
+        help="Directory where files are saved. If not provided, default directory "
+        "is `data/synthetic/`. Files are named like the raw data, so the directory "
+        "can be passed to preprocess_data.py.",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        default=100_000,
+        help="Number of requests generated at a time by each process",
+    )
+    parser.add_argument(
+        "-n",
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        required=False,
+        help="Seed of the generator. If not provided, `random_seed` of the config "
+        "file is used.",
+    )
+    args = parser.parse_args()
+
+    try:
+        config_path = os.getenv("DC_311_CONFIG_PATH")
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        out_dir = args.directory or os.path.join(project_dir, "data", "synthetic")
+        years = args.years or sorted(
+            config["train_year"] + config["validation_year"] + config["test_year"]
+        )
+        seed = config["random_seed"] if args.seed is None else args.seed
+        service_codes = synthetic.load_service_codes(
+            os.path.join(project_dir, "streamlit_app", "request_categories.json")
+        )
+
+        for i, year in enumerate(years):
+            out_path = os.path.join(out_dir, f"dc_311_{year}_data.{args.format}")
+            logger.info(f"Generating {args.n_rows} requests for {year}...")
+            synthetic.write_dataset(
+                out_path,
+                n_rows=args.n_rows,
+                year=year,
+                service_codes=service_codes,
+                seed=seed,
+                chunk_size=args.chunk_size,
+                n_jobs=args.n_jobs,
+                first_objectid=1 + i * args.n_rows,
+            )
+        logger.info(f"Synthetic data saved to {out_dir}")
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
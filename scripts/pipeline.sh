@@ -2,7 +2,6 @@
 
 set -e
 
-python3 -m scripts.extract_data
-python3 -m scripts.preprocess_data
-python3 -m scripts.create_features
-python3 -m scripts.run_training
+# Stages whose inputs have not changed since their last run are skipped, and
+# independent stages run at the same time. Pass -f to run every stage.
+python3 -m scripts.run_pipeline "$@"
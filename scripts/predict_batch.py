@@ -0,0 +1,85 @@
+"""
+Score a file of 311 requests with the saved feature pipelines and models
+"""
+
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from config.logging_config import setup_logging
+from dc311.modeling import fused, lookup
+from dc311.modeling import predict
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        required=True,
+        help="Path to CSV or Parquet file of requests, with `servicecode`, "
+        "`ward`, and `adddate` columns.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=True,
+        help="Path to CSV or Parquet file in which predictions are saved. The "
+        "format is set by the file extension.",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        default=100_000,
+        help="Number of rows read and scored at a time. Memory use grows with "
+        "the chunk size times the number of processes.",
+    )
+    parser.add_argument(
+        "-n",
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes. Each worker loads the models once.",
+    )
+    parser.add_argument(
+        "--id-column",
+        type=str,
+        default="objectid",
+        help="Column identifying each request, saved with the predictions.",
+    )
+    args = parser.parse_args()
+
+    try:
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        artifacts = {
+            name: os.path.join(project_dir, path)
+            for name, path in lookup.MODEL_ARTIFACTS.items()
+        }
+        logger.info(f"Scoring requests in {args.input}...")
+        predict.predict_file(
+            input_path=args.input,
+            output_path=args.output,
+            artifacts=artifacts,
+            chunk_size=args.chunk_size,
+            n_jobs=args.n_jobs,
+            id_column=args.id_column,
+            fused_path=os.path.join(project_dir, fused.FUSED_PREDICTOR_PATH),
+        )
+        logger.info(f"Predictions saved to {args.output}")
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
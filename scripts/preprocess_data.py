@@ -46,10 +46,10 @@ def main():
 
     try:
         logger.debug("Fetching name of directory with data to be preprocessed...")
+        project_dir = os.path.dirname(os.path.dirname(__file__))
         if args.directory:
             raw_file_dir = args.directory
         else:
-            project_dir = os.path.dirname(os.path.dirname(__file__))
             raw_file_dir = os.path.join(project_dir, "data", "raw")
         logger.debug(f"Data to preprocess is saved in directory: {raw_file_dir}")
 
@@ -0,0 +1,74 @@
+"""
+Replay mlflow runs logged offline into the mlflow tracking server
+"""
+
+import argparse
+import glob
+import logging
+import os
+import yaml
+
+from dotenv import load_dotenv
+import mlflow
+
+from config.logging_config import setup_logging
+from dc311.modeling import tracking
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        type=str,
+        required=False,
+        help="Paths of offline logs to replay. If not provided, every log in "
+        "`offline_dir` of the `tracking` section of the config file is replayed.",
+    )
+    parser.add_argument(
+        "-e",
+        "--experiment-name",
+        type=str,
+        required=False,
+        help="Name of experiment in which to create the runs. If not provided, "
+        "runs are created in the experiment in which they were logged.",
+    )
+    args = parser.parse_args()
+
+    try:
+        config_path = os.getenv("DC_311_CONFIG_PATH")
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+
+        if args.input:
+            log_paths = args.input
+        else:
+            offline_dir = config.get("tracking", {}).get(
+                "offline_dir", "data/mlflow_offline"
+            )
+            log_paths = sorted(glob.glob(os.path.join(offline_dir, "*.jsonl")))
+        logger.info(f"Offline logs to replay: {log_paths}")
+
+        mlflow.set_tracking_uri(config["tracking_uri"])
+        experiment_id = None
+        if args.experiment_name:
+            experiment_id = mlflow.set_experiment(args.experiment_name).experiment_id
+
+        for log_path in log_paths:
+            n_records = tracking.replay_offline_log(log_path, experiment_id)
+            # Renaming the log keeps it from being replayed twice
+            os.replace(log_path, f"{log_path}.replayed")
+            logger.info(f"Replayed {n_records} records from {log_path}")
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark each pipeline stage on synthetic data and compare to a baseline
+"""
+
+import argparse
+from datetime import datetime
+import logging
+import os
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+import yaml
+
+from config.logging_config import setup_logging
+from dc311 import benchmark
+from dc311.data import synthetic
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        nargs="+",
+        type=int,
+        help="Numbers of synthetic records to benchmark with. If not provided, "
+        "`sizes` of the `benchmark` section of the config file is used.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=False,
+        help="Path of the results file. If not provided, results are saved in "
+        "`output_dir` of the `benchmark` section of the config file.",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=str,
+        required=False,
+        help="Path of the baseline results. If not provided, `baseline_path` of "
+        "the `benchmark` section of the config file is used.",
+    )
+    parser.add_argument(
+        "-u",
+        "--update-baseline",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing to it",
+    )
+    args = parser.parse_args()
+
+    try:
+        config_path = os.getenv("DC_311_CONFIG_PATH")
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+        bench_config = config.get("benchmark", {})
+
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        service_codes = synthetic.load_service_codes(
+            os.path.join(project_dir, "streamlit_app", "request_categories.json")
+        )
+
+        settings = {
+            "sizes": args.sizes or bench_config.get("sizes", [10_000]),
+            "model_types": bench_config.get("model_types"),
+            "max_train_rows": bench_config.get("max_train_rows", 1_000_000),
+            "n_single_row_calls": bench_config.get("n_single_row_calls", 100),
+            "repeat": bench_config.get("repeat", 1),
+            "trace_memory": bench_config.get("trace_memory", True),
+            "feature_list": config["features"],
+            "target_threshold": config["target_threshold"],
+            "seed": config["random_seed"],
+            "n_generate_jobs": bench_config.get("n_generate_jobs", 1),
+        }
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = benchmark.run_benchmarks(
+                service_codes=service_codes, work_dir=work_dir, **settings
+            )
+
+        output_dir = os.path.join(
+            project_dir, bench_config.get("output_dir", "data/benchmarks")
+        )
+        output_path = args.output or os.path.join(
+            output_dir, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+        )
+        benchmark.save_results(results, output_path, settings)
+        logger.info(f"Results saved to {output_path}")
+
+        baseline_path = args.baseline or os.path.join(
+            project_dir,
+            bench_config.get("baseline_path", "data/benchmarks/baseline.json"),
+        )
+        if args.update_baseline:
+            benchmark.save_results(results, baseline_path, settings)
+            logger.info(f"Baseline saved to {baseline_path}")
+            return
+        if not os.path.exists(baseline_path):
+            logger.info(f"No baseline at {baseline_path}. Use -u to save one.")
+            return
+
+        comparisons = benchmark.compare_to_baseline(
+            results,
+            benchmark.load_results(baseline_path),
+            tolerance=bench_config.get("tolerance", 0.2),
+            min_seconds=bench_config.get("min_seconds", 0.01),
+        )
+        regressions = [c for c in comparisons if c["regression"]]
+        for c in comparisons:
+            flag = " REGRESSION" if c["regression"] else ""
+            logger.info(
+                f"{c['stage']} ({c['size']:,} records) {c['metric']}: "
+                f"{c['baseline']:.4g} -> {c['current']:.4g} ({c['ratio']:.2f}x)"
+                f"{flag}"
+            )
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+    if regressions:
+        logger.error(f"{len(regressions)} benchmark(s) regressed past the baseline")
+        sys.exit(1)
+    logger.info("No benchmark regressed past the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Run the pipeline, skipping stages whose inputs have not changed
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+import yaml
+
+from config.logging_config import setup_logging
+from dc311 import pipeline
+
+
+def main():
+    setup_logging("pipeline.log")
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Run every stage, even if its inputs have not changed",
+    )
+    parser.add_argument(
+        "-r",
+        "--rerun",
+        nargs="+",
+        help="Names of stages to run even if their inputs have not changed, "
+        "e.g. `extract_2024` to download the latest requests. Stages that depend "
+        "on them only run if their outputs changed.",
+    )
+    parser.add_argument(
+        "-j",
+        "--max-workers",
+        type=int,
+        help="Number of stages run at the same time. If not provided, "
+        "`max_workers` of the `pipeline` section of the config file is used.",
+    )
+    args = parser.parse_args()
+
+    try:
+        config_path = os.getenv("DC_311_CONFIG_PATH")
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+        pipeline_config = config.get("pipeline", {})
+
+        project_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+        runner = pipeline.PipelineRunner(
+            pipeline.get_default_stages(config),
+            config,
+            project_dir,
+            state_path=os.path.join(
+                project_dir,
+                pipeline_config.get("state_path", "data/pipeline/state.json"),
+            ),
+            log_dir=os.path.join(
+                project_dir, pipeline_config.get("log_dir", "logs/pipeline")
+            ),
+            max_workers=args.max_workers or pipeline_config.get("max_workers"),
+        )
+        start = time.perf_counter()
+        summary = runner.run(force=args.force, rerun=args.rerun)
+        summary_text = pipeline.format_summary(summary, time.perf_counter() - start)
+        logger.info(f"Pipeline summary:\n{summary_text}")
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+    if any(result["status"] in ("failed", "blocked") for result in summary):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,24 @@ Train, evaluate, and save model
 import argparse
 from datetime import datetime
 import joblib
-import json
 import logging
 import os
+import tempfile
 
 from dotenv import load_dotenv
 import mlflow
 import mlflow.sklearn
+import numpy as np
 import pandas as pd
 import optuna
 import yaml
 
 from config.logging_config import setup_logging
+import dc311.features.chunked as chunked
+import dc311.features.features as feat
+import dc311.features.target as targ
+from dc311 import instrumentation
+from dc311.modeling import out_of_core, parallel, release, tracking
 from dc311.modeling import train_model as train
 
 
@@ -52,12 +58,38 @@ def main():
         "sets. If not provided, then model is retrained with only the training "
         "and validation sets.",
     )
+    parser.add_argument(
+        "-m",
+        "--multi-target",
+        action="store_true",
+        help="Load the shared feature matrix and target table created by "
+        "`create_features --multi-target` and train on the target selected by "
+        "`task_type` and `target_threshold`.",
+    )
+    parser.add_argument(
+        "-a",
+        "--all-models",
+        action="store_true",
+        help="Train every model in `models` of the `release` section at the same "
+        "time, on the shared feature matrix and target table created by "
+        "`create_features --multi-target`, and save them all to `models/`.",
+    )
+    parser.add_argument(
+        "-o",
+        "--out-of-core",
+        action="store_true",
+        help="Train on the chunked features created by `create_features --chunked` "
+        "without loading them into memory. logistic and elasticnet models are "
+        "replaced by SGD models fit one chunk at a time, and xgboost models train "
+        "on external memory matrices.",
+    )
     args = parser.parse_args()
 
     try:
         config_path = os.getenv("DC_311_CONFIG_PATH")
         with open(config_path, "r") as file:
             config = yaml.safe_load(file)
+        instrumentation.configure(**config.get("instrumentation", {}))
 
         logger.debug("Fetching name of directory with processed data...")
         if args.input:
@@ -66,61 +98,238 @@ def main():
             project_dir = os.path.dirname(os.path.dirname(__file__))
             data_dir = os.path.join(project_dir, "data", "processed")
         logger.debug(f"Processed data is saved in directory: {data_dir}")
-        if config["task_type"] == "classification":
+        if args.multi_target or args.all_models:
+            feat_file_name = "processed_features.csv"
+            targ_file_name = "processed_targets.csv"
+            split_file_name = "dataset_splits.npy"
+        elif config["task_type"] == "classification":
             feat_file_name = "processed_features_clf.csv"
             targ_file_name = (
                 f"processed_target_clf_{str(config['target_threshold'])}.csv"
             )
-            index_file_name = "dataset_indices_clf.json"
+            split_file_name = "dataset_splits_clf.npy"
         elif config["task_type"] == "regression":
             feat_file_name = "processed_features_reg.csv"
             targ_file_name = "processed_target_reg.csv"
-            index_file_name = "dataset_indices_reg.json"
+            split_file_name = "dataset_splits_reg.npy"
 
-        logger.info("Loading features, targets, and data split indices...")
-        feature_df = pd.read_csv(
-            os.path.join(data_dir, feat_file_name), index_col="objectid"
-        )
+        if args.out_of_core:
+            if args.all_models:
+                raise ValueError("--all-models cannot be used with --out-of-core.")
+            chunk_dir = os.path.join(
+                data_dir, feat_file_name.replace(".csv", "_chunks")
+            )
+            logger.info(f"Opening chunked features in {chunk_dir}...")
+            store = chunked.ChunkedFeatureStore(chunk_dir)
+            target_column = "target"
+            if args.multi_target:
+                target_column = targ.get_target_column_name(
+                    config["task_type"], config["target_threshold"]
+                )
+            logger.info(
+                f"Training out of core on {store.n_rows} rows in {store.n_chunks} "
+                "chunks..."
+            )
+            optuna.logging.enable_propagation()
+            mlflow.set_tracking_uri(config["tracking_uri"])
+            mlflow.set_experiment(config["experiment_name"])
+            parent_run_name = f"parent_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            with mlflow.start_run(run_name=parent_run_name) as run:
+                instrumentation.log_pending_metrics()
+                mlflow.log_param("out_of_core", True)
+                # xgboost caches the pages of its external memory matrices here
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    with tracking.open_run_logger(
+                        config.get("tracking"), run.info.experiment_id
+                    ) as run_logger:
+                        best_params, best_value = out_of_core.run_search(
+                            store, target_column, config, cache_dir, run_logger
+                        )
+                    logger.info(f"Best params are: {best_params}")
+
+                    logger.info("Evaluating best model on test set...")
+                    best_model = out_of_core.fit_model(
+                        store, target_column, best_params, config, cache_dir
+                    )
+                    metric_dict = out_of_core.evaluate_chunks(
+                        best_model, store, target_column, ("test",), config["task_type"]
+                    )
+                    mlflow.log_params(best_params)
+                    mlflow.log_metric("best_val_score", best_value)
+                    mlflow.log_metrics({f"test_{k}": v for k, v in metric_dict.items()})
+                    metrics = ", ".join(f"{k}: {v:.4f}" for k, v in metric_dict.items())
+                    logger.info(f"Test metrics of best model: {metrics}")
+
+                    if args.retrain_with_test_set:
+                        logger.info(
+                            "Retraining model using training, validation, and test "
+                            "sets..."
+                        )
+                        splits = ("train", "validation", "test")
+                        best_model = out_of_core.fit_model(
+                            store,
+                            target_column,
+                            best_params,
+                            config,
+                            cache_dir,
+                            splits=splits,
+                        )
+                        metric_dict = out_of_core.evaluate_chunks(
+                            best_model,
+                            store,
+                            target_column,
+                            splits,
+                            config["task_type"],
+                        )
+                        mlflow.log_metrics(
+                            {f"train_{k}": v for k, v in metric_dict.items()}
+                        )
+                        metrics = ", ".join(
+                            f"{k}: {v:.4f}" for k, v in metric_dict.items()
+                        )
+                        logger.info(
+                            f"Training metrics of retrained best model: {metrics}"
+                        )
+                    # The logged model is the one that is saved
+                    mlflow.sklearn.log_model(best_model, "best_model")
+
+            if args.save_model:
+                logger.info("Saving model...")
+                project_dir = os.path.dirname(os.path.dirname(__file__))
+                model_name = release.get_model_name(
+                    config["task_type"], config["target_threshold"]
+                )
+                model_path = os.path.join(project_dir, "models", f"{model_name}.joblib")
+                joblib.dump(best_model, model_path)
+                logger.info(f"Model saved at: {model_path}")
+            return
+
+        logger.info("Loading features, targets, and data split codes...")
+        with instrumentation.track_stage("read_features") as stage:
+            feature_df = feat.load_features(
+                os.path.join(data_dir, feat_file_name),
+                config.get("feature_encoding", {}).get("mode", "onehot"),
+            )
+            stage.set_rows(rows_out=len(feature_df))
         target_df = pd.read_csv(
             os.path.join(data_dir, targ_file_name), index_col="objectid"
         )
-        with open(os.path.join(data_dir, index_file_name), "r") as f:
-            data_split_dict = json.load(f)
+        split_codes = np.load(os.path.join(data_dir, split_file_name))
+
+        if args.all_models:
+            project_dir = os.path.dirname(os.path.dirname(__file__))
+            with tempfile.TemporaryDirectory() as cache_dir:
+                results = release.train_release(
+                    feature_df=feature_df,
+                    target_df=target_df,
+                    split_codes=split_codes,
+                    config=config,
+                    project_dir=project_dir,
+                    cache_dir=cache_dir,
+                    retrain_with_test_set=args.retrain_with_test_set,
+                )
+            for result in results:
+                metrics = ", ".join(
+                    f"{key}: {value:.4f}" for key, value in result["metrics"].items()
+                )
+                logger.info(f"Test metrics of {result['name']}: {metrics}")
+            return
+
+        if args.multi_target:
+            target_column = targ.get_target_column_name(
+                config["task_type"], config["target_threshold"]
+            )
+            if target_column not in target_df.columns:
+                raise ValueError(
+                    f"{target_column} not found in {targ_file_name}. Add "
+                    f"{config['target_threshold']} to `target_thresholds` and "
+                    "re-create features."
+                )
+            logger.info(f"Selecting {target_column} from target table...")
+            target_df = target_df[[target_column]]
+            target_df.columns = ["target"]
+            has_target = target_df["target"].notna().to_numpy()
+            if not has_target.all():
+                feature_df = feature_df[has_target]
+                target_df = target_df[has_target]
+                split_codes = split_codes[has_target]
         logger.info("Data loaded.")
 
+        logger.info("Preparing training and validation matrices for trials...")
+        training_data = train.prepare_training_data(
+            feature_df=feature_df,
+            target_df=target_df,
+            split_codes=split_codes,
+            dtype=config.get("training_dtype", "float32"),
+            sparse=config.get("sparse_features", False),
+        )
+        logger.info("Training and validation matrices prepared.")
+
         logger.info("Starting trials...")
         optuna.logging.enable_propagation()
 
         mlflow.set_tracking_uri(config["tracking_uri"])
         mlflow.set_experiment(config["experiment_name"])
         parent_run_name = f"parent_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        objective_kwargs = {
+            "task_type": config["task_type"],
+            "model_type": config["model_type"],
+            "pca": config["pca"],
+            "ranges": config["ranges"],
+            "random_seed": config["random_seed"],
+            "early_stopping_rounds": config.get("early_stopping_rounds"),
+            "xgb_settings": config.get("xgboost"),
+        }
+        fidelity_config = config.get("fidelity") or {}
+        fidelity_fractions = None
+        if fidelity_config.get("enabled", False):
+            fidelity_fractions = fidelity_config["fractions"]
+            logger.info(f"Multi-fidelity search over fractions {fidelity_fractions}")
         with mlflow.start_run(run_name=parent_run_name) as run:
-            sampler = optuna.samplers.TPESampler(seed=config["random_seed"])
-            study = optuna.create_study(direction="minimize", sampler=sampler)
-            study.optimize(
-                lambda trial: train.objective(
-                    trial=trial,
-                    feature_df=feature_df,
-                    target_df=target_df,
-                    data_split_dict=data_split_dict,
-                    task_type=config["task_type"],
-                    model_type=config["model_type"],
-                    pca=config["pca"],
-                    ranges=config["ranges"],
-                    random_seed=config["random_seed"],
-                ),
-                n_trials=config["n_trials"],
-            )
+            # Stages measured before the run started, such as data loading
+            instrumentation.log_pending_metrics()
+            if fidelity_fractions:
+                mlflow.log_param("fidelity_fractions", fidelity_fractions)
+            # Trial runs are queued and written in batches unless tracking mode
+            # is sync. Leaving the block writes every queued record, even when
+            # the search fails
+            with tracking.open_run_logger(
+                config.get("tracking"), run.info.experiment_id
+            ) as run_logger:
+                search_mode = config.get("search_mode", "optuna")
+                if config.get("n_jobs", 1) > 1 and search_mode == "optuna":
+                    storage_path = os.path.join(
+                        config["optuna_storage_dir"], f"{parent_run_name}.log"
+                    )
+                    with tempfile.TemporaryDirectory() as cache_dir:
+                        study = parallel.optimize_in_parallel(
+                            data=training_data,
+                            study_name=parent_run_name,
+                            storage_path=storage_path,
+                            cache_dir=cache_dir,
+                            n_trials=config["n_trials"],
+                            n_jobs=config["n_jobs"],
+                            parent_run_id=run.info.run_id,
+                            objective_kwargs=objective_kwargs,
+                            pruner_config=config.get("pruner"),
+                            fidelity_fractions=fidelity_fractions,
+                            tracking_config=config.get("tracking"),
+                        )
+                    best_params = train.get_best_params(study.best_trial)
+                    best_value = study.best_trial.value
+                else:
+                    best_params, best_value = train.run_search(
+                        training_data, config, run_logger
+                    )
             logger.info("Trials complete!")
             logger.info("Getting best model...")
-            best_params = study.best_trial.params
             logger.info(f"Best params are: {best_params}")
 
             logger.info("Evaluating best model on test set...")
             X_train, y_train, X_test, y_test = train.split_data(
                 feature_df=feature_df,
                 target_df=target_df,
-                data_split_dict=data_split_dict,
+                split_codes=split_codes,
                 holdout_set_type="test",
             )
             best_model = train.train_model(
@@ -131,12 +340,13 @@ def main():
                 model_type=config["model_type"],
                 pca=config["pca"],
                 random_seed=config["random_seed"],
+                xgb_settings=config.get("xgboost"),
             )
 
             logger.info("Logging best model...")
             mlflow.sklearn.log_model(best_model, "best_model")
             mlflow.log_params(best_params)
-            mlflow.log_metric("best_val_brier_score", study.best_trial.value)
+            mlflow.log_metric("best_val_brier_score", best_value)
             metric_dict = train.evaluate_model(
                 best_model, X_test, y_test, config["task_type"]
             )
@@ -194,6 +404,7 @@ def main():
                     model_type=config["model_type"],
                     pca=config["pca"],
                     random_seed=config["random_seed"],
+                    xgb_settings=config.get("xgboost"),
                 )
                 metric_dict = train.evaluate_model(
                     best_model, X_test, y_test, config["task_type"]
@@ -247,15 +458,10 @@ def main():
             if args.save_model:
                 logger.info("Saving model...")
                 project_dir = os.path.dirname(os.path.dirname(__file__))
-                if config["task_type"] == "classification":
-                    model_name = (
-                        f"under_{str(config['target_threshold'])}_day_model.joblib"
-                    )
-                elif config["task_type"] == "regression":
-                    model_name = "num_days_model.joblib"
-                model_path = os.path.join(
-                    project_dir, "models", args.output, model_name
+                model_name = release.get_model_name(
+                    config["task_type"], config["target_threshold"]
                 )
+                model_path = os.path.join(project_dir, "models", f"{model_name}.joblib")
                 joblib.dump(best_model, model_path)
                 logger.info(f"Model saved at: {model_path}")
             else:
@@ -0,0 +1,76 @@
+"""
+Start the HTTP prediction service
+"""
+
+import argparse
+import logging
+import os
+import yaml
+
+from dotenv import load_dotenv
+
+from config.logging_config import setup_logging
+from dc311.modeling import fused, lookup
+from dc311.modeling.registry import get_registry
+from dc311.modeling.service import create_app
+
+
+def main():
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--host",
+        type=str,
+        required=False,
+        help="Host to bind. If not provided, `host` of the `service` section of "
+        "the config file is used.",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        required=False,
+        help="Port to bind. If not provided, `port` of the `service` section of "
+        "the config file is used.",
+    )
+    args = parser.parse_args()
+
+    try:
+        config_path = os.getenv("DC_311_CONFIG_PATH")
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+        service_config = config.get("service", {})
+
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        model_registry = get_registry(
+            {
+                name: os.path.join(project_dir, path)
+                for name, path in {
+                    **lookup.MODEL_ARTIFACTS,
+                    "fused_predictor": fused.FUSED_PREDICTOR_PATH,
+                }.items()
+            }
+        )
+        app = create_app(
+            model_registry,
+            max_batch_size=service_config.get("max_batch_size", 64),
+            max_wait_ms=service_config.get("max_wait_ms", 5),
+        )
+
+        host = args.host or service_config.get("host", "127.0.0.1")
+        port = args.port or service_config.get("port", 8311)
+        logger.info(f"Serving predictions on http://{host}:{port}")
+        # Each connection is handled in its own thread, and the threads share
+        # the app's micro-batcher
+        app.run(host=host, port=port, threaded=True)
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
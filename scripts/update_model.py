@@ -0,0 +1,229 @@
+"""
+Update saved models with the records added since they were last trained,
+instead of retraining them from scratch
+"""
+
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+import joblib
+import mlflow
+import mlflow.sklearn
+import pandas as pd
+import yaml
+
+from config.logging_config import setup_logging
+import dc311.features.target as targ
+from dc311 import instrumentation
+from dc311.modeling import lookup, release
+from dc311.modeling import train_model as train
+
+
+def main():
+    setup_logging("model_update.log")
+    logger = logging.getLogger(__name__)
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        required=False,
+        help="Path to preprocessed data file. If not provided, default path"
+        "is `data/interim/dc_311_preprocessed_data.csv`.",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        required=False,
+        help="Update on records added at or after this date, e.g. 2025-01-06. If "
+        "not provided, records added since the model's last update are used, or "
+        "records after the last year in `train_year`, `validation_year`, and "
+        "`test_year` for a model that was never updated.",
+    )
+    parser.add_argument(
+        "-a",
+        "--all-models",
+        action="store_true",
+        help="Update every model in `models` of the `release` section. If not "
+        "provided, the model selected by `task_type` and `target_threshold` is "
+        "updated.",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Check the updates on the holdout records without replacing any model",
+    )
+    args = parser.parse_args()
+
+    try:
+        config_path = os.getenv("DC_311_CONFIG_PATH")
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+        instrumentation.configure(**config.get("instrumentation", {}))
+        update_config = config.get("update", {})
+
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        data_path = args.input or os.path.join(
+            project_dir, "data", "interim", "dc_311_preprocessed_data.csv"
+        )
+        state_path = os.path.join(
+            project_dir, update_config.get("state_path", "data/updates/state.json")
+        )
+        state = {}
+        if os.path.exists(state_path):
+            with open(state_path, "r") as file:
+                state = json.load(file)
+
+        if args.all_models:
+            model_configs = release.get_model_configs(config)
+        else:
+            model_configs = {
+                release.get_model_name(
+                    config["task_type"], config["target_threshold"]
+                ): config
+            }
+
+        usecols = set(config["features"]) | {"objectid", "days_to_resolve"}
+        logger.info(f"Loading records from {data_path}...")
+        dc311_df = pd.read_csv(
+            data_path,
+            usecols=lambda col: col in usecols,
+            index_col="objectid",
+            parse_dates=["adddate"],
+        )
+        last_year = max(
+            config["train_year"] + config["validation_year"] + config["test_year"]
+        )
+
+        mlflow.set_tracking_uri(config["tracking_uri"])
+        mlflow.set_experiment(config["experiment_name"])
+        for name, model_config in model_configs.items():
+            task_type = model_config["task_type"]
+            since = args.since or state.get(name, {}).get("trained_until")
+            since = pd.Timestamp(since or f"{last_year + 1}-01-01")
+            new_df = dc311_df[dc311_df["adddate"] >= since]
+            target_df = targ.create_target_table(
+                new_df,
+                target_column="days_to_resolve",
+                clf_thresholds=[model_config["target_threshold"]],
+            )
+            y = target_df[
+                targ.get_target_column_name(task_type, model_config["target_threshold"])
+            ]
+            # Regression rows with a missing target cannot be used
+            has_target = y.notna().to_numpy()
+            new_df, y = new_df[has_target], y[has_target]
+            if len(new_df) < 2:
+                logger.info(f"No new records to update {name} with since {since}.")
+                continue
+
+            logger.info(f"Updating {name} with {len(new_df)} records since {since}...")
+            model_path = os.path.join(project_dir, "models", f"{name}.joblib")
+            pipe_name = "feature_pipe_clf"
+            if task_type == "regression":
+                pipe_name = "feature_pipe_reg"
+            feature_pipe = joblib.load(
+                os.path.join(project_dir, lookup.MODEL_ARTIFACTS[pipe_name])
+            )
+            model = joblib.load(model_path)
+
+            update_mask, holdout_mask = train.get_update_masks(
+                new_df["adddate"], update_config.get("holdout_fraction", 0.2)
+            )
+            if task_type == "classification" and y[holdout_mask].nunique() < 2:
+                logger.info(
+                    f"Holdout records of {name} have only one class. Not enough new "
+                    "records to check an update."
+                )
+                continue
+            if task_type == "classification" and y[update_mask].nunique() < 2:
+                logger.info(
+                    f"Update records of {name} have only one class. Not enough new "
+                    "records to update the model."
+                )
+                continue
+            X = feature_pipe.transform(new_df)
+            updated_model = train.update_model(
+                model,
+                X[update_mask],
+                y[update_mask],
+                task_type,
+                n_rounds=update_config.get("n_rounds", 50),
+                n_epochs=update_config.get("n_epochs", 1),
+                max_iter=update_config.get("max_iter", 5),
+                n_threads=(model_config.get("xgboost") or {}).get("nthread"),
+            )
+            accepted, metric_dict, updated_metric_dict = train.check_update(
+                model,
+                updated_model,
+                X[holdout_mask],
+                y[holdout_mask],
+                task_type,
+                tolerance=update_config.get("tolerance", 0.0),
+            )
+
+            run_name = f"update_run_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            with mlflow.start_run(run_name=run_name):
+                instrumentation.log_pending_metrics()
+                mlflow.log_params(
+                    {
+                        "model_name": name,
+                        "since": since.isoformat(),
+                        "n_update_rows": int(update_mask.sum()),
+                        "n_holdout_rows": int(holdout_mask.sum()),
+                    }
+                )
+                mlflow.log_metrics({f"holdout_{k}": v for k, v in metric_dict.items()})
+                mlflow.log_metrics(
+                    {f"updated_holdout_{k}": v for k, v in updated_metric_dict.items()}
+                )
+                mlflow.set_tag("accepted", accepted)
+                mlflow.sklearn.log_model(updated_model, "updated_model")
+
+            objective_metric = train.OBJECTIVE_METRICS[task_type]
+            logger.info(
+                f"Holdout {objective_metric} of {name}: "
+                f"{metric_dict[objective_metric]:.4f} before update, "
+                f"{updated_metric_dict[objective_metric]:.4f} after update."
+            )
+            if not accepted:
+                logger.warning(
+                    f"Update of {name} is worse on the holdout. Kept {name}."
+                )
+                continue
+            if args.dry_run:
+                logger.info(f"Update of {name} accepted, but not saved (dry run).")
+                continue
+
+            # Write the update next to the model, so that the replace is atomic
+            tmp_path = f"{model_path}.tmp"
+            joblib.dump(updated_model, tmp_path)
+            os.replace(tmp_path, model_path)
+            # The holdout records have not been trained on, so the next update
+            # starts with them
+            state[name] = {
+                "trained_until": new_df["adddate"][holdout_mask].min().isoformat(),
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            os.makedirs(os.path.dirname(state_path), exist_ok=True)
+            with open(state_path, "w") as file:
+                json.dump(state, file, indent=2)
+            logger.info(
+                f"Updated model saved at: {model_path}. Rebuild the fused predictor "
+                "and lookup table with `run_pipeline` to serve it."
+            )
+    except Exception as e:
+        logger.exception(f"There was an error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
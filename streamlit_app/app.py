@@ -7,18 +7,50 @@ import json
 import os.path as osp
 import sys
 
-import joblib
 import pandas as pd
 import streamlit as st
 
 
 sys.path.append(osp.dirname(osp.dirname(osp.abspath(__file__))))
 
-under_21_day_model = joblib.load("models/under_21_day_model.joblib")
-under_5_day_model = joblib.load("models/under_5_day_model.joblib")
-num_days_model = joblib.load("models/num_days_model.joblib")
-feature_pipe_clf = joblib.load("models/feature_pipeline_clf.joblib")
-feature_pipe_reg = joblib.load("models/feature_pipeline_reg.joblib")
+from dc311.modeling import fused, lookup  # noqa: E402
+from dc311.modeling.registry import get_registry  # noqa: E402
+
+# Artifacts are loaded on first use and kept across reruns of the script.
+# Retrained models and rebuilt lookup tables are picked up without restarting
+# the app.
+registry = get_registry(
+    {
+        **lookup.MODEL_ARTIFACTS,
+        "fused_predictor": fused.FUSED_PREDICTOR_PATH,
+        "lookup_table": lookup.LOOKUP_TABLE_PATH,
+    },
+    loaders={"lookup_table": lookup.LookupTable.load},
+)
+
+
+def predict(service_code: str, ward: int, submission_date: date) -> dict:
+    """
+    Serve predictions from the precomputed lookup table when it is up to date
+    with the models, and run the models otherwise.
+    """
+    if osp.exists(lookup.LOOKUP_TABLE_PATH):
+        table = registry.get("lookup_table")
+        if table.is_current(lookup.MODEL_ARTIFACTS):
+            prediction = table.lookup(service_code, ward, submission_date)
+            if prediction is not None:
+                return prediction
+
+    input_df = pd.DataFrame(
+        {"servicecode": [service_code], "ward": [ward], "adddate": [submission_date]}
+    )
+    input_df["adddate"] = pd.to_datetime(input_df["adddate"])
+    models = fused.select_models(
+        lookup.MODEL_ARTIFACTS, fused.FUSED_PREDICTOR_PATH, registry.get
+    )
+    outputs = lookup.predict_outputs(input_df, models)[0]
+    return dict(zip(lookup.LOOKUP_OUTPUTS, outputs.tolist()))
+
 
 with open("streamlit_app/request_categories.json") as f:
     REQUEST_TYPES = json.load(f)
@@ -56,33 +88,23 @@ if not submit:
 else:
     ward = int(ward_str.replace("Ward ", ""))
     service_code = REQUEST_TYPES["All Requests"][request_type]
-    input_df = pd.DataFrame(
-        {"servicecode": [service_code], "ward": [ward], "adddate": [submission_date]}
-    )
-    input_df["adddate"] = pd.to_datetime(input_df["adddate"])
-
-    processed_df_clf = feature_pipe_clf.transform(input_df)
-    processed_df_reg = feature_pipe_reg.transform(input_df)
-
-    # Predicted number of days to resolve request
-    pred_num_days = num_days_model.predict(processed_df_reg)[0]
-    pred_num_days = 0 if pred_num_days < 0 else pred_num_days
-
-    # Probability that request will take > 21 days to resolve
-    preds_21_day = under_21_day_model.predict_proba(processed_df_clf)[:, 1]
-
-    # Probability that request will take < 5 days to resolve
-    preds_5_day = under_5_day_model.predict_proba(processed_df_clf)[:, 0]
+    prediction = predict(service_code, ward, submission_date)
 
     st.markdown("### Your 311 Resolution Forecast")
     (col1,) = st.columns(1)
     col1.metric(
         label="Estimated resolution time:",
-        value=f"{pred_num_days:.0f} days",
+        value=f"{prediction['num_days']:.0f} days",
     )
     col1, col2 = st.columns(2)
-    col1.metric(label="Chance resolved in < 5 days:", value=f"{preds_5_day[0]:.0%}")
-    col2.metric(label="Chance resolved in > 21 days", value=f"{preds_21_day[0]:.0%}")
+    col1.metric(
+        label="Chance resolved in < 5 days:",
+        value=f"{prediction['prob_under_5_days']:.0%}",
+    )
+    col2.metric(
+        label="Chance resolved in > 21 days",
+        value=f"{prediction['prob_over_21_days']:.0%}",
+    )
     st.caption(
         "These estimates are based on historical resolution times for similar requests."
     )
@@ -0,0 +1,72 @@
+"""
+Test the synthetic data generator
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from dc311.data import preprocess as prep
+from dc311.data import synthetic
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+@pytest.fixture(scope="module")
+def service_codes():
+    return synthetic.load_service_codes(
+        os.path.join(PROJECT_DIR, "streamlit_app", "request_categories.json")
+    )
+
+
+def test_generate_records(service_codes):
+    profiles = synthetic.make_service_code_profiles(service_codes, seed=1)
+    records = synthetic.generate_records(5000, 2023, profiles, first_objectid=11)
+
+    assert list(records.columns) == synthetic.RAW_ATTRIBUTES
+    assert records["OBJECTID"].tolist() == list(range(11, 5011))
+    assert set(records["SERVICECODE"]) <= set(service_codes)
+    add_dates = pd.to_datetime(records["ADDDATE"], unit="ms")
+    assert (add_dates.dt.year == 2023).all()
+    assert records["RESOLUTIONDATE"].isna().any()
+    resolved = records["RESOLUTIONDATE"].notna()
+    assert (records["RESOLUTIONDATE"][resolved] >= records["ADDDATE"][resolved]).all()
+    assert set(records["WARD"].dropna().map(type)) == {int, str}
+
+    df = prep.process_ward_field(records.rename(columns={"WARD": "ward"}))
+    assert set(df["ward"]) <= set(range(9))
+
+
+def test_json_matches_api_format(service_codes, tmp_path):
+    json_path = str(tmp_path / "data.json")
+    csv_path = str(tmp_path / "data.csv")
+    synthetic.write_dataset(json_path, 250, 2022, service_codes, chunk_size=100)
+    synthetic.write_dataset(csv_path, 250, 2022, service_codes, chunk_size=100)
+
+    with open(json_path, "r") as file:
+        features = json.load(file)
+    assert len(features) == 250
+    assert set(features[0]) == {"attributes", "geometry"}
+    assert list(features[0]["attributes"]) == synthetic.RAW_ATTRIBUTES
+
+    # CSV files match the raw CSVs created from JSON downloads
+    converted_path = str(tmp_path / "converted.csv")
+    prep.transform_json_to_csv(json_path, converted_path)
+    with open(converted_path) as converted, open(csv_path) as generated:
+        assert converted.read() == generated.read()
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet"])
+def test_output_does_not_depend_on_n_jobs(service_codes, tmp_path, extension):
+    paths = [str(tmp_path / f"data_{n_jobs}.{extension}") for n_jobs in (1, 2)]
+    for n_jobs, path in zip((1, 2), paths):
+        synthetic.write_dataset(
+            path, 300, 2024, service_codes, seed=5, chunk_size=70, n_jobs=n_jobs
+        )
+
+    read = pd.read_csv if extension == "csv" else pd.read_parquet
+    serial, parallel = read(paths[0]), read(paths[1])
+    assert len(serial) == 300
+    pd.testing.assert_frame_equal(serial, parallel)
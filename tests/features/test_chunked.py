@@ -0,0 +1,99 @@
+"""
+Test dc311/features/chunked.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dc311.features.chunked as chunked
+
+
+@pytest.fixture
+def chunk_frames():
+    index = pd.Index(np.arange(10, 20), name="objectid")
+    feature_df = pd.DataFrame(
+        {"a": np.arange(10.0), "b": np.arange(10.0) * 2}, index=index
+    )
+    target_df = pd.DataFrame(
+        {
+            "target_reg": [1.0, np.nan, 3.0, 4.0, 5.0, np.nan, 7.0, 8.0, 9.0, 10.0],
+            "target_clf_5": [0, 1, 0, 0, 0, 1, 1, 1, 1, 1],
+        },
+        index=index,
+    )
+    split_codes = np.array([1, 1, 2, 3, 1, 2, 1, 3, 0, 1], dtype=np.uint8)
+    return feature_df, target_df, split_codes
+
+
+class IdentityPipeline:
+    def __init__(self):
+        self.n_calls = 0
+
+    def transform(self, df):
+        self.n_calls += 1
+        return df
+
+
+def test_write_and_read_chunks(chunk_frames, tmp_path):
+    feature_df, target_df, split_codes = chunk_frames
+    pipe = IdentityPipeline()
+    out_dir = str(tmp_path / "chunks")
+    chunked.write_feature_chunks(
+        pipe, feature_df, target_df, split_codes, out_dir, chunk_rows=4
+    )
+    assert pipe.n_calls == 3
+
+    store = chunked.ChunkedFeatureStore(out_dir)
+    assert store.n_rows == 10
+    assert store.n_chunks == 3
+    assert store.feature_names == ["a", "b"]
+    assert store.target_columns == ["target_reg", "target_clf_5"]
+
+    # Rows with a missing target are skipped
+    X, y = zip(*store.iter_chunks("target_reg", ["train"]))
+    np.testing.assert_array_equal(np.concatenate(X)[:, 0], [0.0, 4.0, 6.0, 9.0])
+    np.testing.assert_array_equal(np.concatenate(y), [1.0, 5.0, 7.0, 10.0])
+    assert store.count_rows("target_reg", ["train"]) == 4
+    assert store.count_rows("target_clf_5", ["train", "validation"]) == 7
+
+    with pytest.raises(ValueError):
+        store.load_chunk(0, "target_clf_21", ["train"])
+
+
+def test_shuffled_chunks_have_same_rows(chunk_frames, tmp_path):
+    feature_df, target_df, split_codes = chunk_frames
+    out_dir = str(tmp_path / "chunks")
+    chunked.write_feature_chunks(
+        IdentityPipeline(), feature_df, target_df, split_codes, out_dir, chunk_rows=3
+    )
+    store = chunked.ChunkedFeatureStore(out_dir)
+
+    rng = np.random.default_rng(0)
+    X, y = zip(*store.iter_chunks("target_clf_5", ["train", "test"], rng))
+    X = np.concatenate(X)
+    assert sorted(X[:, 0]) == [0.0, 1.0, 3.0, 4.0, 6.0, 7.0, 9.0]
+    # Targets stay aligned with their rows
+    expected = target_df["target_clf_5"].to_numpy()[X[:, 0].astype(int)]
+    np.testing.assert_array_equal(np.concatenate(y), expected)
+
+
+def test_rewrite_replaces_store(chunk_frames, tmp_path):
+    feature_df, target_df, split_codes = chunk_frames
+    out_dir = str(tmp_path / "chunks")
+    chunked.write_feature_chunks(
+        IdentityPipeline(), feature_df, target_df, split_codes, out_dir, chunk_rows=2
+    )
+    chunked.write_feature_chunks(
+        IdentityPipeline(),
+        feature_df.iloc[:4],
+        target_df.iloc[:4],
+        split_codes[:4],
+        out_dir,
+        chunk_rows=2,
+    )
+
+    store = chunked.ChunkedFeatureStore(out_dir)
+    assert store.n_rows == 4
+    assert len(list((tmp_path / "chunks").glob("*_features.npy"))) == 2
+    assert not (tmp_path / "chunks.tmp").exists()
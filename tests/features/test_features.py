@@ -3,8 +3,11 @@ Test dc311/features/features.py
 """
 
 import logging
+import os
 
+import numpy as np
 import pandas as pd
+import pytest
 
 import dc311.features.features as feat
 
@@ -62,6 +65,72 @@ def test_engineer_features(time_dataframe):
     assert feature_df.isin([0, 1]).all().all()
 
 
+def test_hashed_feature_pipeline(time_dataframe):
+    train_df = time_dataframe[["adddate"]].assign(
+        ward=[1, 2, 3], servicecode=["A", "B", "C"]
+    )
+    feature_pipe = feat.create_feature_engineering_pipeline(
+        ["adddate", "ward", "servicecode"],
+        encoding="hashed",
+        n_hash_features=64,
+        crosses=[["servicecode", "ward"]],
+    )
+    feature_df = feature_pipe.fit_transform(train_df)
+    assert feature_df.shape == (3, 64)
+    assert all(isinstance(dtype, pd.SparseDtype) for dtype in feature_df.dtypes)
+    # One token per engineered column (month, quarter, day, ward, servicecode)
+    # and one per cross
+    assert (feature_df.sparse.to_dense().sum(axis=1) == 6).all()
+
+    # Values that were not seen during training are hashed, not ignored
+    new_df = train_df.assign(ward=[1.0, 2.0, 9.0], servicecode=["A", "B", "Z"])
+    new_feature_df = feature_pipe.transform(new_df)
+    assert new_feature_df.shape == (3, 64)
+    assert (new_feature_df.sparse.to_dense().sum(axis=1) == 6).all()
+    # Whole number floats are hashed like the integers they equal
+    pd.testing.assert_frame_equal(new_feature_df.iloc[:2], feature_df.iloc[:2])
+    assert not np.array_equal(
+        new_feature_df.sparse.to_dense().iloc[2], feature_df.sparse.to_dense().iloc[2]
+    )
+
+
+@pytest.mark.parametrize("encoding", ["onehot", "hashed"])
+def test_save_and_load_features(time_dataframe, tmp_path, encoding):
+    df = time_dataframe[["adddate"]].assign(ward=[1, 2, 3])
+    df.index = pd.Index([11, 12, 13], name="objectid")
+    feature_pipe = feat.create_feature_engineering_pipeline(
+        ["adddate", "ward"], encoding=encoding, n_hash_features=16
+    )
+    feature_df = feature_pipe.fit_transform(df)
+
+    path = str(tmp_path / "processed_features.csv")
+    feat.save_features(feature_df, path, encoding)
+    paths = feat.get_feature_paths(path, encoding)
+    assert all(os.path.exists(p) for p in paths)
+    if encoding == "hashed":
+        # Hashed features are never written as dense CSV columns
+        assert not os.path.exists(path)
+        assert paths[0].endswith(".npz")
+
+    loaded_df = feat.load_features(path, encoding)
+    assert loaded_df.index.name == "objectid"
+    assert loaded_df.columns.tolist() == feature_df.columns.tolist()
+    np.testing.assert_array_equal(
+        loaded_df.to_numpy(dtype=float), feature_df.to_numpy(dtype=float)
+    )
+
+
+def test_hashed_encoding_errors(time_dataframe):
+    with pytest.raises(ValueError):
+        feat.engineer_features(encoding="ordinal")
+
+    feature_pipe = feat.create_feature_engineering_pipeline(
+        ["adddate"], encoding="hashed", crosses=[["adddate", "ward"]]
+    )
+    with pytest.raises(ValueError):
+        feature_pipe.fit_transform(time_dataframe)
+
+
 def test_select_features(time_dataframe):
     test_df = time_dataframe.drop(
         columns=["year", "month", "day", "hour", "minute", "second"]
@@ -74,21 +143,24 @@ def test_select_features(time_dataframe):
     assert list(feature_df.columns) == ["adddate"]
 
 
-def test_get_dataset_indices():
-    data = {"testcol": [1, 2, 3]}
-    train_df = pd.DataFrame(data)
-    train_df.index = [5, 6, 7]
-
-    val_df = pd.DataFrame(data)
-    val_df.index = [10, 11, 12]
+def test_get_dataset_masks(time_dataframe):
+    masks = feat.get_dataset_masks(
+        time_dataframe["adddate"],
+        train_years=[2021],
+        validation_years=[2022],
+        test_years=[2023, 2024],
+    )
+    assert masks["train"].tolist() == [True, False, False]
+    assert masks["validation"].tolist() == [False, True, False]
+    assert masks["test"].tolist() == [False, False, True]
 
-    test_df = pd.DataFrame(data)
-    test_df.index = [102, 101, 100]
 
-    test_dict = feat.get_dataset_indices(train_df, val_df, test_df)
-    check_dict = {
-        "train": [5, 6, 7],
-        "validation": [10, 11, 12],
-        "test": [102, 101, 100],
+def test_get_dataset_split_codes():
+    masks = {
+        "train": np.array([True, False, False, False]),
+        "validation": np.array([False, False, True, False]),
+        "test": np.array([False, True, False, False]),
     }
-    assert test_dict == check_dict
+    split_codes = feat.get_dataset_split_codes(masks)
+    assert split_codes.dtype == np.uint8
+    assert split_codes.tolist() == [1, 3, 2, 0]
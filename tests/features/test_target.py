@@ -34,3 +34,26 @@ def test_create_target_classification(test_dataframe):
     )
     expected = [0, 1, 1, 1, 0, 1, 1, 1]
     assert df["target"].to_list() == [float(i) for i in expected]
+
+
+def test_create_target_table(test_dataframe):
+    """Test create_target_table() with several thresholds"""
+    df = targ.create_target_table(
+        df=test_dataframe, target_column="days", clf_thresholds=[3, 7]
+    )
+    assert list(df.columns) == ["target_reg", "target_clf_3", "target_clf_7"]
+    assert df["target_reg"].dropna().to_list() == [2, 8, 3, 7]
+    assert df["target_clf_3"].to_list() == [0, 1, 1, 1, 0, 1, 1, 1]
+    assert df["target_clf_7"].to_list() == [0, 1, 1, 1, 0, 1, 0, 1]
+
+
+def test_create_target_table_dtypes_and_no_mutation(test_dataframe):
+    """Make sure create_target_table() uses compact dtypes and leaves df intact"""
+    original = test_dataframe.copy()
+    df = targ.create_target_table(
+        df=test_dataframe, target_column="days", clf_thresholds=[3]
+    )
+    assert df["target_reg"].dtype == "float32"
+    assert df["target_clf_3"].dtype == "uint8"
+    assert list(test_dataframe.columns) == ["col1", "days"]
+    pd.testing.assert_frame_equal(test_dataframe, original)
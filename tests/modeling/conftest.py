@@ -0,0 +1,17 @@
+"""
+Set up fixtures for testing
+"""
+
+import pytest
+
+import numpy as np
+import pandas as pd
+
+
+@pytest.fixture
+def split_dataframes():
+    index = pd.Index([11, 12, 13, 14, 15], name="objectid")
+    feature_df = pd.DataFrame({"feat": [0.0, 1.0, 2.0, 3.0, 4.0]}, index=index)
+    target_df = pd.DataFrame({"target": [0, 1, 0, 1, 1]}, index=index)
+    split_codes = np.array([1, 2, 1, 3, 2], dtype=np.uint8)
+    return feature_df, target_df, split_codes
@@ -0,0 +1,85 @@
+"""
+Test the fused multi-model predictor
+"""
+
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from dc311.modeling import fused, lookup
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    return {
+        name: os.path.join(PROJECT_DIR, path)
+        for name, path in lookup.MODEL_ARTIFACTS.items()
+    }
+
+
+@pytest.fixture(scope="module")
+def models(artifacts):
+    return {name: joblib.load(path) for name, path in artifacts.items()}
+
+
+@pytest.fixture(scope="module")
+def input_grid():
+    with open(os.path.join(PROJECT_DIR, "streamlit_app/request_categories.json")) as f:
+        service_codes = list(json.load(f)["All Requests"].values())
+    return lookup.build_input_grid(service_codes[:10])
+
+
+def test_find_projection():
+    base = pd.DataFrame({"a": [1, 0], "b": [0, 1], "c": [1, 1]})
+    np.testing.assert_array_equal(fused.find_projection(base, base[["c", "a"]]), [2, 0])
+    assert fused.find_projection(base, pd.DataFrame({"d": [1, 0]})) is None
+    assert fused.find_projection(base, pd.DataFrame({"a": [0, 1]})) is None
+
+
+def test_fused_predictor_matches_models(models, input_grid, artifacts):
+    fingerprints = {
+        name: lookup.get_file_fingerprint(path) for name, path in artifacts.items()
+    }
+    fused_predictor = fused.FusedPredictor.from_models(models, input_grid, fingerprints)
+    # The regression features are a column subset of the classification features
+    assert len(fused_predictor.feature_pipes) == 1
+    assert fused_predictor.is_current(artifacts)
+
+    np.testing.assert_array_equal(
+        lookup.predict_outputs(input_grid, {"fused_predictor": fused_predictor}),
+        lookup.predict_outputs(input_grid, models),
+    )
+
+
+def test_identical_pipelines_are_shared(models, input_grid):
+    models = {**models, "feature_pipe_reg": models["feature_pipe_clf"]}
+    fused_predictor = fused.FusedPredictor.from_models(models, input_grid)
+    assert len(fused_predictor.feature_pipes) == 1
+    assert all(columns is None for _, columns in fused_predictor.sources.values())
+
+
+def test_select_models(models, input_grid, artifacts, tmp_path):
+    fused_path = str(tmp_path / "fused_predictor.joblib")
+    loaded = {**models}
+
+    selected = fused.select_models(artifacts, fused_path, loaded.get)
+    assert set(selected) == set(lookup.MODEL_ARTIFACTS)
+
+    loaded["fused_predictor"] = fused.FusedPredictor.from_models(
+        models, input_grid, {name: "stale" for name in artifacts}
+    )
+    joblib.dump(loaded["fused_predictor"], fused_path)
+    selected = fused.select_models(artifacts, fused_path, loaded.get)
+    assert set(selected) == set(lookup.MODEL_ARTIFACTS)
+
+    loaded["fused_predictor"].fingerprints = {
+        name: lookup.get_file_fingerprint(path) for name, path in artifacts.items()
+    }
+    selected = fused.select_models(artifacts, fused_path, loaded.get)
+    assert list(selected) == ["fused_predictor"]
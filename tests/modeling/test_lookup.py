@@ -0,0 +1,106 @@
+"""
+Test the precomputed prediction lookup table
+"""
+
+from datetime import date
+import os
+
+import numpy as np
+import pytest
+
+from dc311.modeling import lookup
+
+
+class FeaturePipe:
+    def transform(self, df):
+        return df
+
+
+class Model:
+    """
+    Predicts values that identify each row's service code, ward, month, and
+    day of week.
+    """
+
+    def predict(self, df):
+        codes = df["servicecode"].map({"A": 1000, "B": 2000}).to_numpy()
+        wards = df["ward"].to_numpy() * 100
+        months = df["adddate"].dt.month.to_numpy()
+        days = df["adddate"].dt.dayofweek.to_numpy() / 10
+        return codes + wards + months + days
+
+    def predict_proba(self, df):
+        proba = df["ward"].to_numpy() / 10
+        return np.column_stack([1 - proba, proba])
+
+
+@pytest.fixture
+def models():
+    return {
+        "feature_pipe_clf": FeaturePipe(),
+        "feature_pipe_reg": FeaturePipe(),
+        "num_days_model": Model(),
+        "under_5_day_model": Model(),
+        "under_21_day_model": Model(),
+    }
+
+
+def test_get_reference_dates():
+    dates = lookup.get_reference_dates()
+    assert len(dates) == lookup.N_MONTHS * lookup.N_DAYS_OF_WEEK
+    assert [(d.month, d.weekday()) for d in dates[:8]] == [
+        (1, 0),
+        (1, 1),
+        (1, 2),
+        (1, 3),
+        (1, 4),
+        (1, 5),
+        (1, 6),
+        (2, 0),
+    ]
+
+
+def test_lookup_matches_models(models):
+    table = lookup.build_lookup_table(["B", "A", "B"], models)
+    assert table.table.shape == (2, 8, 12, 7, 3)
+    assert table.table.dtype == np.float32
+
+    # 2025-03-12 is a Wednesday
+    prediction = table.lookup("B", 3, date(2025, 3, 12))
+    assert prediction["num_days"] == pytest.approx(2000 + 300 + 3 + 0.2)
+    assert prediction["prob_under_5_days"] == pytest.approx(0.7)
+    assert prediction["prob_over_21_days"] == pytest.approx(0.3)
+    assert table.lookup("C", 3, date(2025, 3, 12)) is None
+
+
+def test_save_and_load(models, tmp_path):
+    artifact_path = str(tmp_path / "model.joblib")
+    with open(artifact_path, "wb") as file:
+        file.write(b"model")
+    fingerprints = {"model": lookup.get_file_fingerprint(artifact_path)}
+    table_path = str(tmp_path / "lookup.npy")
+    lookup.build_lookup_table(["A"], models, fingerprints).save(table_path)
+
+    table = lookup.LookupTable.load(table_path)
+    assert isinstance(table.table, np.memmap)
+    assert table.is_current({"model": artifact_path})
+
+    with open(artifact_path, "wb") as file:
+        file.write(b"retrained model")
+    assert not table.is_current({"model": artifact_path})
+
+
+def test_save_replaces_table_last(models, tmp_path, monkeypatch):
+    replaced = []
+    replace = os.replace
+
+    def record_replace(src, dst):
+        replaced.append(os.path.basename(dst))
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", record_replace)
+    table_path = str(tmp_path / "lookup.npy")
+    lookup.build_lookup_table(["A"], models).save(table_path)
+
+    assert replaced[-1] == "lookup.npy"
+    assert sorted(os.listdir(tmp_path)) == sorted(replaced)
@@ -0,0 +1,143 @@
+"""
+Test dc311/modeling/out_of_core.py
+"""
+
+import mlflow
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+import dc311.features.chunked as chunked
+from dc311.modeling import out_of_core
+from dc311.modeling import train_model as train
+
+
+@pytest.fixture
+def store(tmp_path):
+    # One-hot features, like those of the feature engineering pipeline
+    rng = np.random.default_rng(0)
+    n_rows, n_categories = 3000, 8
+    categories = rng.integers(0, n_categories, n_rows)
+    weights = np.linspace(-2, 2, n_categories)
+    feature_df = pd.DataFrame(
+        np.eye(n_categories)[categories],
+        columns=[f"category_{i}" for i in range(n_categories)],
+    )
+    probabilities = 1 / (1 + np.exp(-weights[categories]))
+    days = np.exp(weights[categories] + 1) + rng.exponential(1, n_rows)
+    days[::10] = np.nan
+    target_df = pd.DataFrame(
+        {
+            "target_reg": days,
+            "target_clf_5": (rng.random(n_rows) < probabilities).astype(np.uint8),
+        }
+    )
+    split_codes = np.tile(np.array([1, 1, 1, 2, 3], dtype=np.uint8), n_rows // 5)
+
+    writer = chunked.ChunkWriter(str(tmp_path / "chunks"))
+    for start in range(0, n_rows, 700):
+        stop = start + 700
+        writer.write(
+            feature_df.iloc[start:stop],
+            target_df.iloc[start:stop],
+            split_codes[start:stop],
+        )
+    writer.close()
+    return chunked.ChunkedFeatureStore(str(tmp_path / "chunks"))
+
+
+@pytest.fixture
+def config():
+    return {
+        "task_type": "classification",
+        "model_type": "logistic",
+        "pca": False,
+        "random_seed": 0,
+        "n_trials": 2,
+        "early_stopping_rounds": 5,
+        "ranges": {
+            "logreg_c": {"min": 1.0e-2, "max": 1.0e2},
+            "en_alpha": {"min": 0, "max": 0.1},
+            "en_l1_ratio": {"min": 0.9, "max": 1.0},
+            "xgb_max_depth": {"min": 2, "max": 3},
+            "xgb_n_estimators": {"min": 10, "max": 20},
+            "xgb_learning_rate": {"min": 0.1, "max": 0.3},
+        },
+        "xgboost": {"tree_method": "hist", "max_bin": 16},
+        "out_of_core": {"n_epochs": 3},
+    }
+
+
+@pytest.fixture
+def tracking_dir(tmp_path, monkeypatch):
+    # Trial runs are logged here instead of the repository's mlruns directory
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    mlflow.set_tracking_uri(str(tmp_path / "mlruns"))
+    yield tmp_path / "mlruns"
+    mlflow.set_tracking_uri(None)
+
+
+def test_sgd_matches_in_memory_model(store):
+    model = out_of_core.fit_sgd(
+        store, "target_clf_5", {"logreg_c": 1.0}, "classification", "logistic"
+    )
+    metrics = out_of_core.evaluate_chunks(
+        model, store, "target_clf_5", ["validation"], "classification"
+    )
+
+    X_train, y_train = map(
+        np.concatenate, zip(*store.iter_chunks("target_clf_5", ["train"]))
+    )
+    X_val, y_val = map(
+        np.concatenate, zip(*store.iter_chunks("target_clf_5", ["validation"]))
+    )
+    in_memory = LogisticRegression(C=1.0).fit(X_train, y_train)
+    expected = train.compute_metrics(
+        y_val, in_memory.predict_proba(X_val)[:, 1], "classification"
+    )
+    assert metrics["brier_score_loss"] == pytest.approx(
+        expected["brier_score_loss"], abs=0.01
+    )
+
+
+def test_run_search_and_fit_model(store, config, tracking_dir, tmp_path):
+    config.update(task_type="regression", model_type="elasticnet")
+    best_params, best_value = out_of_core.run_search(
+        store, "target_reg", config, str(tmp_path / "cache")
+    )
+    assert set(best_params) == {"en_alpha", "en_l1_ratio"}
+    assert tracking_dir.exists()
+
+    model = out_of_core.fit_model(
+        store, "target_reg", best_params, config, str(tmp_path / "cache")
+    )
+    metrics = out_of_core.evaluate_chunks(
+        model, store, "target_reg", ["test"], "regression"
+    )
+    assert metrics["r2_score"] > 0.5
+
+    config["pca"] = True
+    with pytest.raises(ValueError):
+        out_of_core.run_search(store, "target_reg", config, str(tmp_path / "cache"))
+
+
+def test_xgboost_external_memory(store, config, tracking_dir, tmp_path):
+    config["model_type"] = "xgboost"
+    dtrain, dtest = out_of_core.build_external_matrices(
+        store, "target_clf_5", str(tmp_path / "cache"), xgb_settings=config["xgboost"]
+    )
+    assert dtrain.num_row() == store.count_rows("target_clf_5", ["train"])
+    assert dtest.num_row() == store.count_rows("target_clf_5", ["validation"])
+
+    best_params, _ = out_of_core.run_search(
+        store, "target_clf_5", config, str(tmp_path / "cache")
+    )
+    model = out_of_core.fit_model(
+        store, "target_clf_5", best_params, config, str(tmp_path / "cache")
+    )
+    metrics = out_of_core.evaluate_chunks(
+        model, store, "target_clf_5", ["test"], "classification"
+    )
+    assert metrics["roc_auc_score"] > 0.7
+    assert model.predict_proba(np.eye(8)[:2]).shape == (2, 2)
@@ -0,0 +1,93 @@
+"""
+Test dc311/modeling/parallel.py
+"""
+
+import os
+
+import mlflow
+from mlflow.tracking import MlflowClient
+import numpy as np
+import optuna
+import pandas as pd
+import scipy.sparse as sp
+
+import dc311.modeling.parallel as parallel
+import dc311.modeling.train_model as train
+
+
+def test_save_and_load_training_data(split_dataframes, tmp_path):
+    feature_df, target_df, split_codes = split_dataframes
+    data = train.prepare_training_data(feature_df, target_df, split_codes)
+    parallel.save_training_data(data, str(tmp_path))
+
+    loaded = parallel.load_training_data(str(tmp_path))
+    assert isinstance(loaded.X_train, np.memmap)
+    assert not loaded.X_train.flags["WRITEABLE"]
+    np.testing.assert_array_equal(loaded.X_train, data.X_train)
+    np.testing.assert_array_equal(loaded.y_test, data.y_test)
+    assert loaded.feature_names == ["feat"]
+
+
+def test_save_and_load_sparse_training_data(split_dataframes, tmp_path):
+    feature_df, target_df, split_codes = split_dataframes
+    data = train.prepare_training_data(feature_df, target_df, split_codes, sparse=True)
+    parallel.save_training_data(data, str(tmp_path))
+
+    loaded = parallel.load_training_data(str(tmp_path))
+    assert sp.issparse(loaded.X_test)
+    np.testing.assert_array_equal(loaded.X_test.toarray(), data.X_test.toarray())
+
+
+def test_limit_thread_env():
+    previous = os.environ.get("OMP_NUM_THREADS")
+    with parallel.limit_thread_env(3):
+        assert os.environ["OMP_NUM_THREADS"] == "3"
+    assert os.environ.get("OMP_NUM_THREADS") == previous
+
+
+def test_optimize_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    tracking_uri = str(tmp_path / "mlruns")
+    rng = np.random.default_rng(0)
+    feature_df = pd.DataFrame({"feat": rng.normal(size=60)})
+    target_df = pd.DataFrame({"target": (feature_df["feat"] > 0).astype(int)})
+    split_codes = np.tile(np.array([1, 1, 2], dtype=np.uint8), 20)
+    data = train.prepare_training_data(feature_df, target_df, split_codes)
+
+    client = MlflowClient(tracking_uri=tracking_uri)
+    experiment_id = client.create_experiment("parallel")
+    parent_run = client.create_run(experiment_id)
+    mlflow.set_tracking_uri(tracking_uri)
+    try:
+        study = parallel.optimize_in_parallel(
+            data=data,
+            study_name="parallel",
+            storage_path=str(tmp_path / "study.log"),
+            cache_dir=str(tmp_path / "cache"),
+            n_trials=5,
+            n_jobs=2,
+            parent_run_id=parent_run.info.run_id,
+            objective_kwargs={
+                "task_type": "classification",
+                "model_type": "logistic",
+                "ranges": {"logreg_c": {"min": 0.1, "max": 10}},
+            },
+            n_threads=1,
+        )
+    finally:
+        mlflow.set_tracking_uri(None)
+
+    # Both workers added their trials to the one study in the journal file
+    stored_study = optuna.load_study(
+        study_name="parallel",
+        storage=parallel.create_journal_storage(str(tmp_path / "study.log")),
+    )
+    assert len(study.trials) == len(stored_study.trials) == 5
+    assert all(trial.state.is_finished() for trial in stored_study.trials)
+    child_runs = client.search_runs(
+        [experiment_id], filter_string="tags.mlflow.runName LIKE 'child_run_%'"
+    )
+    assert len(child_runs) == 5
+    assert {run.data.tags["mlflow.parentRunId"] for run in child_runs} == {
+        parent_run.info.run_id
+    }
@@ -0,0 +1,62 @@
+"""
+Test batch scoring of request files
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from dc311.modeling import lookup
+from dc311.modeling import predict
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+ARTIFACTS = {
+    name: os.path.join(PROJECT_DIR, path)
+    for name, path in lookup.MODEL_ARTIFACTS.items()
+}
+
+
+@pytest.fixture
+def request_csv(tmp_path):
+    path = str(tmp_path / "requests.csv")
+    pd.DataFrame(
+        {
+            "objectid": range(100, 110),
+            "servicecode": ["S0000", "S0311"] * 5,
+            "ward": [1, 2, 3, 4, 5, 6, 7, 8, 1, 2],
+            "adddate": pd.date_range("2024-01-01", periods=10, freq="37D"),
+            "details": ["unused"] * 10,
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_iter_chunks(request_csv):
+    chunks = list(predict.iter_chunks(request_csv, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert list(chunks[0].columns) == predict.INPUT_COLUMNS
+    assert chunks[1].index[0] == 104
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_predict_file(request_csv, tmp_path, n_jobs):
+    output_path = str(tmp_path / "predictions.parquet")
+    stats = predict.predict_file(
+        request_csv, output_path, ARTIFACTS, chunk_size=3, n_jobs=n_jobs
+    )
+    assert stats["n_rows"] == 10
+
+    predictions = pd.read_parquet(output_path)
+    assert list(predictions.index) == list(range(100, 110))
+    expected = predict.score_chunk(
+        next(predict.iter_chunks(request_csv, chunk_size=10)),
+        predict.load_models(ARTIFACTS),
+    )
+    pd.testing.assert_frame_equal(predictions, expected)
+
+
+def test_get_file_format():
+    assert predict.get_file_format("requests.CSV") == "csv"
+    with pytest.raises(ValueError):
+        predict.get_file_format("requests.json")
@@ -0,0 +1,57 @@
+"""
+Test lazy loading and reloading of model artifacts
+"""
+
+import os
+
+import joblib
+import pytest
+
+from dc311.modeling import registry as reg
+
+
+@pytest.fixture
+def artifact_path(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    joblib.dump({"version": 1}, path)
+    return path
+
+
+def test_get_loads_lazily_and_memoizes(artifact_path):
+    model_registry = reg.ModelRegistry({"model": artifact_path})
+    assert model_registry.load_times() == {}
+
+    model = model_registry.get("model")
+    assert model == {"version": 1}
+    assert model_registry.get("model") is model
+    assert list(model_registry.load_times()) == ["model"]
+    with pytest.raises(ValueError):
+        model_registry.get("bad input")
+
+
+def test_get_reloads_changed_artifact(artifact_path):
+    model_registry = reg.ModelRegistry(
+        {"model": artifact_path}, check_interval=0, background=False
+    )
+    assert model_registry.get("model") == {"version": 1}
+
+    joblib.dump({"version": 2, "padding": "x" * 100}, artifact_path)
+    assert model_registry.get("model")["version"] == 2
+
+
+def test_failed_reload_keeps_previous_artifact(artifact_path):
+    model_registry = reg.ModelRegistry(
+        {"model": artifact_path}, check_interval=0, background=False
+    )
+    model = model_registry.get("model")
+
+    with open(artifact_path, "wb") as file:
+        file.write(b"partially written")
+    os.utime(artifact_path, ns=(0, 0))
+    assert model_registry.get("model") is model
+
+
+def test_get_registry_is_shared(artifact_path):
+    assert reg.get_registry({"model": artifact_path}) is reg.get_registry(
+        {"model": artifact_path}
+    )
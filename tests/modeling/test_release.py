@@ -0,0 +1,135 @@
+"""
+Test dc311/modeling/release.py
+"""
+
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from dc311.modeling import release
+
+
+@pytest.fixture
+def release_data():
+    rng = np.random.default_rng(0)
+    n_rows = 150
+    index = pd.Index(np.arange(n_rows), name="objectid")
+    feature_df = pd.DataFrame(
+        rng.normal(size=(n_rows, 3)), columns=["a", "b", "c"], index=index
+    )
+    days = rng.exponential(6, n_rows)
+    days[::10] = np.nan
+    target_df = pd.DataFrame(
+        {
+            "target_reg": days.astype(np.float32),
+            "target_clf_5": ((days > 5) | np.isnan(days)).astype(np.uint8),
+        },
+        index=index,
+    )
+    split_codes = np.tile(np.array([1, 1, 1, 2, 3], dtype=np.uint8), n_rows // 5)
+    return feature_df, target_df, split_codes
+
+
+@pytest.fixture
+def release_config(tmp_path):
+    return {
+        "tracking_uri": str(tmp_path / "mlruns"),
+        "experiment_name": "release",
+        "n_trials": 2,
+        "pca": False,
+        "random_seed": 0,
+        "ranges": {
+            "logreg_c": {"min": 1.0e-3, "max": 1.0e3},
+            "en_alpha": {"min": 0, "max": 0.5},
+            "en_l1_ratio": {"min": 0.9, "max": 1.0},
+        },
+        "release": {
+            "n_jobs": 2,
+            "models": [
+                {
+                    "task_type": "classification",
+                    "target_threshold": 5,
+                    "model_type": "logistic",
+                },
+                {"task_type": "regression", "model_type": "elasticnet"},
+            ],
+        },
+    }
+
+
+def test_get_model_configs(release_config):
+    model_configs = release.get_model_configs(release_config)
+    assert list(model_configs) == ["under_5_day_model", "num_days_model"]
+    assert model_configs["num_days_model"]["model_type"] == "elasticnet"
+    assert model_configs["num_days_model"]["n_trials"] == 2
+
+    release_config["release"]["models"].append({"task_type": "regression"})
+    with pytest.raises(ValueError):
+        release.get_model_configs(release_config)
+
+
+def test_allocate_threads():
+    assert release.allocate_threads(3, 8) == [3, 3, 2]
+    assert release.allocate_threads(3, 2) == [1, 1, 1]
+
+
+def test_save_model_data_shares_feature_matrices(
+    release_data, release_config, tmp_path
+):
+    feature_df, target_df, split_codes = release_data
+    release_config["release"]["models"].append(
+        {"task_type": "classification", "target_threshold": 21}
+    )
+    target_df["target_clf_21"] = (target_df["target_reg"] > 21).astype(np.uint8)
+    model_configs = release.get_model_configs(release_config)
+
+    data_dirs = release._save_model_data(
+        feature_df, target_df, split_codes, model_configs, str(tmp_path)
+    )
+    rows_dirs = {name: dirs["test"][0] for name, dirs in data_dirs.items()}
+    assert rows_dirs["under_5_day_model"] == rows_dirs["under_21_day_model"]
+    assert rows_dirs["num_days_model"] != rows_dirs["under_5_day_model"]
+
+    reg_data = release._load_model_data(*data_dirs["num_days_model"]["validation"])
+    has_target = target_df["target_reg"].notna().to_numpy()
+    assert len(reg_data.X_train) == len(reg_data.y_train)
+    assert len(reg_data.X_train) == ((split_codes == 1) & has_target).sum()
+    assert not np.isnan(reg_data.y_train).any()
+
+
+def test_train_release(release_data, release_config, tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    feature_df, target_df, split_codes = release_data
+    project_dir = tmp_path / "project"
+    (project_dir / "models").mkdir(parents=True)
+    joblib.dump("shared pipeline", project_dir / release.SHARED_FEATURE_PIPELINE_PATH)
+
+    results = release.train_release(
+        feature_df,
+        target_df,
+        split_codes,
+        release_config,
+        str(project_dir),
+        str(tmp_path / "cache"),
+    )
+
+    assert [result["name"] for result in results] == [
+        "under_5_day_model",
+        "num_days_model",
+    ]
+    assert "roc_auc_score" in results[0]["metrics"]
+    assert sorted(os.listdir(project_dir / "models")) == [
+        "feature_pipeline.joblib",
+        "feature_pipeline_clf.joblib",
+        "feature_pipeline_reg.joblib",
+        "num_days_model.joblib",
+        "under_5_day_model.joblib",
+    ]
+    model = joblib.load(project_dir / "models" / "num_days_model.joblib")
+    assert model.predict(feature_df.iloc[:5]).shape == (5,)
+    assert joblib.load(project_dir / "models" / "feature_pipeline_reg.joblib") == (
+        "shared pipeline"
+    )
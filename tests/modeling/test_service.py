@@ -0,0 +1,80 @@
+"""
+Test the prediction service and its micro-batcher
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dc311.modeling import lookup
+from dc311.modeling.registry import ModelRegistry
+from dc311.modeling.service import MicroBatcher, create_app
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_micro_batcher_splits_batches():
+    batch_sizes = []
+
+    def predict_fn(df):
+        batch_sizes.append(len(df))
+        return df[["x"]].to_numpy() * 2
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=50)
+    with ThreadPoolExecutor(16) as executor:
+        futures = list(
+            executor.map(
+                lambda x: batcher.submit(pd.DataFrame({"x": [x, x + 100]})),
+                range(16),
+            )
+        )
+        results = [future.result(timeout=5) for future in futures]
+    batcher.close()
+
+    for x, result in enumerate(results):
+        np.testing.assert_array_equal(result, [[2 * x], [2 * x + 200]])
+    assert sum(batch_sizes) == 32
+    assert len(batch_sizes) < 16
+    assert max(batch_sizes) <= 8
+
+
+def test_micro_batcher_propagates_errors():
+    def predict_fn(df):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(predict_fn, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        batcher.submit(pd.DataFrame({"x": [1]})).result(timeout=5)
+    batcher.close()
+
+
+@pytest.fixture
+def client():
+    model_registry = ModelRegistry(
+        {
+            name: os.path.join(PROJECT_DIR, path)
+            for name, path in lookup.MODEL_ARTIFACTS.items()
+        }
+    )
+    app = create_app(model_registry, max_wait_ms=1)
+    yield app.test_client()
+    app.batcher.close()
+
+
+def test_predict_endpoints(client):
+    record = {"servicecode": "S0311", "ward": 3, "adddate": "2024-05-01"}
+    prediction = client.post("/predict", json=record).get_json()
+    assert set(prediction) == set(lookup.LOOKUP_OUTPUTS)
+
+    response = client.post("/predict_batch", json={"requests": [record, record]})
+    predictions = response.get_json()["predictions"]
+    assert predictions == [prediction, prediction]
+
+
+def test_predict_invalid_request(client):
+    response = client.post("/predict", json={"servicecode": "S0311"})
+    assert response.status_code == 400
+    assert "missing fields" in response.get_json()["error"]
@@ -0,0 +1,80 @@
+"""
+Test batched mlflow logging
+"""
+
+import json
+
+import pytest
+
+from mlflow.tracking import MlflowClient
+
+from dc311.modeling import tracking
+
+
+@pytest.fixture
+def mlflow_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    client = MlflowClient(tracking_uri=str(tmp_path / "mlruns"))
+    experiment_id = client.create_experiment("test")
+    return client, experiment_id
+
+
+def log_trial(run_logger, parent_run_id=None):
+    with run_logger.start_run("trial", parent_run_id) as run:
+        run.log_params({"logreg_c": 0.5})
+        run.log_metrics({"brier_score_loss": 0.2}, step=1)
+        run.set_tag("pruned", False)
+
+
+def test_batched_run_logger(mlflow_client):
+    client, experiment_id = mlflow_client
+    parent_run_id = client.create_run(experiment_id).info.run_id
+    with tracking.BatchedRunLogger(experiment_id, client=client) as run_logger:
+        log_trial(run_logger, parent_run_id)
+
+    (child,) = client.search_runs(
+        [experiment_id], f"tags.mlflow.parentRunId = '{parent_run_id}'"
+    )
+    assert child.info.status == "FINISHED"
+    assert child.info.run_name == "trial"
+    assert child.data.params == {"logreg_c": "0.5"}
+    assert child.data.metrics == {"brier_score_loss": 0.2}
+    assert child.data.tags["pruned"] == "False"
+
+
+def test_failed_run_is_flushed(mlflow_client):
+    client, experiment_id = mlflow_client
+    with pytest.raises(RuntimeError):
+        with tracking.BatchedRunLogger(experiment_id, client=client) as run_logger:
+            with run_logger.start_run("trial") as run:
+                run.log_metric("score", 1.0)
+                raise RuntimeError("trial failed")
+
+    (run,) = client.search_runs([experiment_id])
+    assert run.info.status == "FAILED"
+    assert run.data.metrics == {"score": 1.0}
+
+
+def test_offline_log_and_replay(mlflow_client, tmp_path):
+    client, experiment_id = mlflow_client
+    log_path = str(tmp_path / "offline" / "runs.jsonl")
+    with tracking.BatchedRunLogger("0", offline_path=log_path) as run_logger:
+        log_trial(run_logger)
+        run_logger.flush()
+        with open(log_path, "r") as file:
+            ops = [json.loads(line)["op"] for line in file]
+        assert ops == ["create_run", "params", "metrics", "tags", "end_run"]
+
+    n_records = tracking.replay_offline_log(log_path, experiment_id, client=client)
+    assert n_records == 5
+    (run,) = client.search_runs([experiment_id])
+    assert run.info.status == "FINISHED"
+    assert run.data.params == {"logreg_c": "0.5"}
+
+
+def test_open_run_logger():
+    with tracking.open_run_logger(None, "0") as run_logger:
+        assert run_logger is None
+    with pytest.raises(ValueError):
+        with tracking.open_run_logger({"mode": "bad input"}, "0"):
+            pass
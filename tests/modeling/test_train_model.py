@@ -0,0 +1,227 @@
+"""
+Test dc311/modeling/train_model.py
+"""
+
+import pickle
+
+import pytest
+
+import numpy as np
+import optuna
+import pandas as pd
+import scipy.sparse as sp
+
+import dc311.modeling.train_model as train
+
+
+def test_split_data_validation(split_dataframes):
+    feature_df, target_df, split_codes = split_dataframes
+    X_train, y_train, X_test, y_test = train.split_data(
+        feature_df, target_df, split_codes
+    )
+    assert X_train.index.to_list() == [11, 13]
+    assert y_train.to_list() == [0, 0]
+    assert X_test.index.to_list() == [12, 15]
+    assert y_test.to_list() == [1, 1]
+
+
+def test_split_data_test(split_dataframes):
+    feature_df, target_df, split_codes = split_dataframes
+    X_train, y_train, X_test, y_test = train.split_data(
+        feature_df, target_df, split_codes, holdout_set_type="test"
+    )
+    assert X_train.index.to_list() == [11, 12, 13, 15]
+    assert X_test.index.to_list() == [14]
+    assert y_test.to_list() == [1]
+
+
+def test_split_data_length_mismatch(split_dataframes):
+    """Make sure split_data() raises ValueError when split codes are misaligned"""
+    feature_df, target_df, split_codes = split_dataframes
+    with pytest.raises(ValueError):
+        train.split_data(feature_df, target_df, split_codes[:-1])
+
+
+def test_prepare_training_data(split_dataframes):
+    feature_df, target_df, split_codes = split_dataframes
+    data = train.prepare_training_data(feature_df, target_df, split_codes)
+    assert data.X_train.dtype == np.float32
+    assert data.X_train.flags["C_CONTIGUOUS"]
+    assert not data.X_train.flags["WRITEABLE"]
+    assert data.X_train.ravel().tolist() == [0.0, 2.0]
+    assert data.y_test.tolist() == [1, 1]
+    assert data.feature_names == ["feat"]
+
+
+def test_prepare_training_data_sparse(split_dataframes):
+    feature_df, target_df, split_codes = split_dataframes
+    data = train.prepare_training_data(
+        feature_df, target_df, split_codes, dtype="float64", sparse=True
+    )
+    assert sp.isspmatrix_csr(data.X_test)
+    assert data.X_test.toarray().ravel().tolist() == [1.0, 4.0]
+
+    # Sparse columns, as loaded for hashed features, give the same matrices
+    sparse_data = train.prepare_training_data(
+        feature_df.astype(pd.SparseDtype("float64", 0.0)),
+        target_df,
+        split_codes,
+        dtype="float64",
+        sparse=True,
+    )
+    assert sp.isspmatrix_csr(sparse_data.X_test)
+    assert (sparse_data.X_train != data.X_train).nnz == 0
+
+
+def test_create_pruner():
+    assert isinstance(train.create_pruner(None), optuna.pruners.NopPruner)
+    pruner = train.create_pruner({"type": "median", "n_startup_trials": 2})
+    assert isinstance(pruner, optuna.pruners.MedianPruner)
+    pruner = train.create_pruner({"type": "hyperband", "min_resource": 1})
+    assert isinstance(pruner, optuna.pruners.HyperbandPruner)
+    with pytest.raises(ValueError):
+        train.create_pruner({"type": "bad input"})
+
+
+def test_get_stratified_order():
+    y = np.array([0] * 80 + [1] * 20)
+    order = train.get_stratified_order(y, "classification", random_seed=0)
+    assert sorted(order) == list(range(100))
+    # Every prefix keeps the 20% positive rate
+    for n_rows in (10, 30, 50):
+        assert abs(y[order[:n_rows]].mean() - 0.2) <= 1 / n_rows
+
+
+def test_build_fidelity_levels(split_dataframes):
+    feature_df, target_df, split_codes = split_dataframes
+    data = train.prepare_training_data(feature_df, target_df, split_codes)
+    levels = train.build_fidelity_levels(data, [0.5, 1.0], "classification")
+    assert [level.fraction for level in levels] == [0.5, 1.0]
+    assert levels[0].data.X_train.shape == (1, 1)
+    assert levels[1].data is data
+    np.testing.assert_array_equal(levels[0].data.X_test, data.X_test)
+    assert levels[0].xgb_matrices is None
+    with pytest.raises(ValueError):
+        train.build_fidelity_levels(data, [1.0, 0.5], "classification")
+
+
+def test_get_best_params():
+    params = {"xgb_max_depth": 2, "xgb_n_estimators": 100}
+    trial = optuna.trial.create_trial(
+        params=params,
+        distributions={
+            "xgb_max_depth": optuna.distributions.IntDistribution(2, 6),
+            "xgb_n_estimators": optuna.distributions.IntDistribution(10, 200),
+        },
+        value=0.1,
+        user_attrs={"xgb_best_iteration": 41},
+    )
+    # The refit boosts as many rounds as the trial's best iteration kept
+    assert train.get_best_params(trial) == {"xgb_max_depth": 2, "xgb_n_estimators": 42}
+
+    trial = optuna.trial.create_trial(
+        params={"logreg_c": 1.0},
+        distributions={"logreg_c": optuna.distributions.FloatDistribution(0.1, 10)},
+        value=0.1,
+    )
+    assert train.get_best_params(trial) == {"logreg_c": 1.0}
+
+
+def test_get_regularization_path():
+    ranges = {
+        "logreg_c": {"min": 1.0e-2, "max": 1.0e2},
+        "en_alpha": {"min": 0, "max": 0.5},
+        "en_l1_ratio": {"min": 0.9, "max": 1.0},
+    }
+    logistic_path = train.get_regularization_path("logistic", ranges, n_points=5)
+    c_values = [params["logreg_c"] for params in logistic_path]
+    assert c_values == pytest.approx([1.0e-2, 1.0e-1, 1.0, 1.0e1, 1.0e2])
+
+    en_path = train.get_regularization_path(
+        "elasticnet", ranges, n_points=4, n_l1_ratios=2
+    )
+    assert len(en_path) == 8
+    alphas = [params["en_alpha"] for params in en_path[:4]]
+    assert alphas == sorted(alphas, reverse=True)
+    assert alphas[-1] > 0
+    assert {params["en_l1_ratio"] for params in en_path} == {0.9, 1.0}
+
+
+def test_path_search_rejects_pca(split_dataframes):
+    data = train.prepare_training_data(*split_dataframes)
+    config = {
+        "search_mode": "path",
+        "pca": True,
+        "task_type": "classification",
+        "model_type": "logistic",
+        "ranges": {"logreg_c": {"min": 0.1, "max": 10}},
+        "random_seed": 0,
+    }
+    with pytest.raises(ValueError):
+        train.run_search(data, config)
+
+
+def test_train_xgb_booster_reuses_matrices(split_dataframes):
+    feature_df, target_df, split_codes = split_dataframes
+    data = train.prepare_training_data(feature_df, target_df, split_codes)
+    dtrain, dtest = train.build_xgb_matrices(data, {"tree_method": "hist"})
+    params = {"xgb_max_depth": 2, "xgb_learning_rate": 0.1, "xgb_n_estimators": 3}
+    for _ in range(2):
+        booster = train.train_xgb_booster(dtrain, dtest, params, "regression")
+        assert booster.num_boosted_rounds() == 3
+        assert booster.predict(dtest).shape == (2,)
+
+
+def test_compute_metrics():
+    metric_dict = train.compute_metrics(
+        np.array([0, 1, 1]), np.array([0.0, 1.0, 1.0]), "classification"
+    )
+    assert metric_dict["brier_score_loss"] == 0
+    assert metric_dict["roc_auc_score"] == 1
+    with pytest.raises(ValueError):
+        train.compute_metrics(np.array([0]), np.array([0]), "bad input")
+
+
+def test_get_update_masks():
+    adddate = pd.Series(pd.to_datetime(["2025-01-05", "2025-01-01", "2025-01-03"]))
+    update_mask, holdout_mask = train.get_update_masks(adddate, 0.3)
+    assert update_mask.tolist() == [False, True, True]
+    assert holdout_mask.tolist() == [True, False, False]
+
+    with pytest.raises(ValueError):
+        train.get_update_masks(adddate, 1.0)
+
+
+@pytest.mark.parametrize(
+    "task_type,model_type,params",
+    [
+        (
+            "classification",
+            "xgboost",
+            {"xgb_max_depth": 2, "xgb_learning_rate": 0.1, "xgb_n_estimators": 3},
+        ),
+        ("classification", "logistic", {"logreg_c": 1.0}),
+        ("regression", "elasticnet", {"en_alpha": 0.01, "en_l1_ratio": 0.9}),
+    ],
+)
+def test_update_model(task_type, model_type, params):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = X[:, 0] > 0 if task_type == "classification" else X[:, 0] * 2
+    model = train.train_model(
+        X[:100], y[:100], params, task_type, model_type=model_type
+    )
+    before = pickle.dumps(model)
+
+    updated_model = train.update_model(model, X[100:], y[100:], task_type, n_rounds=5)
+    # The saved model is not modified
+    assert pickle.dumps(model) == before
+    if model_type == "xgboost":
+        n_rounds = updated_model.steps[-1][1].get_booster().num_boosted_rounds()
+        assert n_rounds == params["xgb_n_estimators"] + 5
+
+    accepted, metric_dict, updated_metric_dict = train.check_update(
+        model, updated_model, X[150:], y[150:], task_type, tolerance=1.0
+    )
+    assert accepted
+    assert set(metric_dict) == set(updated_metric_dict)
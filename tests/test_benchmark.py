@@ -0,0 +1,61 @@
+"""
+Test the pipeline stage benchmarks
+"""
+
+import pytest
+
+from dc311 import benchmark
+
+
+def test_measure_reports_peak_memory():
+    seconds, peak_memory_mb, output = benchmark.measure(
+        lambda: bytearray(8 * 2**20), repeat=2
+    )
+    assert seconds > 0
+    assert peak_memory_mb == pytest.approx(8, rel=0.1)
+    assert len(output) == 8 * 2**20
+
+
+def test_run_benchmarks(tmp_path):
+    results = benchmark.run_benchmarks(
+        sizes=[300],
+        service_codes={
+            code: {"description": code, "category": "Other"}
+            for code in ["S0311", "S0206", "SWEEPING"]
+        },
+        work_dir=str(tmp_path),
+        model_types=["logistic", "elasticnet"],
+        n_single_row_calls=3,
+        trace_memory=False,
+    )
+    assert [r["stage"] for r in results] == [
+        "transform_json_to_csv",
+        "read_csv",
+        "preprocess",
+        "feature_pipeline_fit",
+        "feature_pipeline_transform",
+        "create_target",
+        "train_logistic",
+        "train_elasticnet",
+        "inference_single_row",
+        "inference_batch",
+    ]
+    assert all(r["seconds"] > 0 and r["peak_memory_mb"] is None for r in results)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_compare_to_baseline():
+    baseline = [
+        {"stage": "fit", "size": 10, "seconds": 1.0, "peak_memory_mb": 100.0},
+        {"stage": "noisy", "size": 10, "seconds": 0.001, "peak_memory_mb": None},
+    ]
+    results = [
+        {"stage": "fit", "size": 10, "seconds": 1.5, "peak_memory_mb": 110.0},
+        {"stage": "noisy", "size": 10, "seconds": 0.005, "peak_memory_mb": None},
+        {"stage": "fit", "size": 20, "seconds": 3.0, "peak_memory_mb": 200.0},
+    ]
+    comparisons = benchmark.compare_to_baseline(results, baseline, tolerance=0.2)
+    assert [(c["metric"], c["regression"]) for c in comparisons] == [
+        ("seconds", True),
+        ("peak_memory_mb", False),
+    ]
@@ -0,0 +1,85 @@
+"""
+Test the pipeline stage instrumentation
+"""
+
+import logging
+import os
+
+import mlflow
+import numpy as np
+import pandas as pd
+import pytest
+
+from dc311 import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    saved = dict(instrumentation.SETTINGS)
+    yield instrumentation.SETTINGS
+    instrumentation.SETTINGS.update(saved)
+    instrumentation._pending_metrics.clear()
+
+
+def test_instrument_counts_rows(caplog):
+    @instrumentation.instrument()
+    def drop_odd_rows(df):
+        return df.iloc[::2]
+
+    with caplog.at_level(logging.INFO, logger="dc311.instrumentation"):
+        output = drop_odd_rows(pd.DataFrame({"x": range(10)}))
+    assert len(output) == 5
+
+    record = caplog.records[-1]
+    assert record.stage == "drop_odd_rows"
+    assert record.stage_metrics["rows_in"] == 10
+    assert record.stage_metrics["rows_out"] == 5
+    assert record.stage_metrics["wall_seconds"] >= 0
+    assert record.stage_metrics["rows_per_sec"] > 0
+    assert "stage=drop_odd_rows" in record.getMessage()
+
+
+def test_track_stage_records_rows_and_memory(caplog, settings):
+    settings["trace_memory"] = True
+    with caplog.at_level(logging.INFO, logger="dc311.instrumentation"):
+        with instrumentation.track_stage("outer"):
+            with instrumentation.track_stage("inner"):
+                instrumentation.record_rows(rows_out=3)
+                array = np.ones(2**20)
+            del array
+
+    inner, outer = [record.stage_metrics for record in caplog.records[-2:]]
+    assert inner["rows_out"] == 3
+    assert inner["peak_traced_mb"] == pytest.approx(8, rel=0.1)
+    # The inner stage's peak counts toward the outer stage's peak
+    assert outer["peak_traced_mb"] >= inner["peak_traced_mb"]
+
+
+def test_disabled(caplog, settings):
+    settings["enabled"] = False
+
+    @instrumentation.instrument()
+    def add_one(x):
+        instrumentation.record_rows(rows_out=1)
+        return x + 1
+
+    with caplog.at_level(logging.INFO, logger="dc311.instrumentation"):
+        assert add_one(1) == 2
+    assert not caplog.records
+
+
+def test_metrics_logged_to_mlflow(tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    mlflow.set_tracking_uri(str(tmp_path / "mlruns"))
+    with instrumentation.track_stage("before_run", rows_in=4):
+        pass
+
+    with mlflow.start_run() as run:
+        assert instrumentation.log_pending_metrics() == 1
+        with instrumentation.track_stage("in_run", rows_in=4):
+            pass
+
+    metrics = mlflow.get_run(run.info.run_id).data.metrics
+    assert metrics["stage/before_run/rows_in"] == 4
+    assert "stage/in_run/wall_seconds" in metrics
+    assert os.path.exists(tmp_path / "mlruns")
@@ -0,0 +1,76 @@
+"""
+Test logging configuration
+"""
+
+import json
+import logging
+import logging.handlers
+
+import pytest
+
+from config.logging_config import setup_logging, stop_logging
+
+
+@pytest.fixture(autouse=True)
+def restore_logging():
+    yield
+    setup_logging(log_file="pytest.log")
+
+
+def test_queued_json_lines(tmp_path):
+    log_path = tmp_path / "test.log"
+    setup_logging(log_file=str(log_path), queued=True, log_format="json")
+    assert isinstance(logging.getLogger().handlers[0], logging.handlers.QueueHandler)
+
+    logger = logging.getLogger("test_logging_config")
+    logger.info("first")
+    logger.info(
+        "stage=fit", extra={"stage": "fit", "stage_metrics": {"wall_seconds": 1.5}}
+    )
+    stop_logging()
+
+    lines = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [line["message"] for line in lines] == ["first", "stage=fit"]
+    assert lines[0]["level"] == "INFO"
+    assert lines[0]["logger"] == "test_logging_config"
+    assert "stage" not in lines[0]
+    assert lines[1]["stage_metrics"] == {"wall_seconds": 1.5}
+
+
+def test_default_does_not_rotate(tmp_path):
+    setup_logging(log_file=str(tmp_path / "test.log"), queued=False)
+    file_handlers = [
+        handler
+        for handler in logging.getLogger().handlers
+        if isinstance(handler, logging.FileHandler)
+    ]
+    assert len(file_handlers) == 1
+    assert type(file_handlers[0]) is logging.FileHandler
+
+
+def test_size_rotation(tmp_path):
+    log_path = tmp_path / "test.log"
+    setup_logging(
+        log_file=str(log_path),
+        queued=False,
+        rotation="size",
+        max_bytes=500,
+        backup_count=2,
+    )
+    logger = logging.getLogger("test_logging_config")
+    for i in range(100):
+        logger.info(f"message {i}")
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "test.log",
+        "test.log.1",
+        "test.log.2",
+    ]
+    assert log_path.stat().st_size <= 500
+    assert "message 99" in log_path.read_text()
+
+
+@pytest.mark.parametrize("settings", [{"rotation": "weekly"}, {"log_format": "yaml"}])
+def test_invalid_settings(tmp_path, settings):
+    with pytest.raises(ValueError):
+        setup_logging(log_file=str(tmp_path / "test.log"), **settings)
@@ -0,0 +1,196 @@
+"""
+Test pipeline runner
+"""
+
+import sys
+
+import pytest
+
+from dc311 import pipeline
+from dc311.modeling import lookup
+
+
+def write_stage(name, inputs, outputs, code=""):
+    """Stage that writes the concatenated inputs, plus `code`, to each output"""
+    script = (
+        f"text = ''.join(open(p).read() for p in {inputs!r})\n"
+        f"{code}\n"
+        f"for p in {outputs!r}:\n"
+        "    open(p, 'w').write(text)\n"
+    )
+    return pipeline.PipelineStage(
+        name, [sys.executable, "-c", script], inputs=inputs, outputs=outputs
+    )
+
+
+def make_runner(tmp_path, stages, **kwargs):
+    return pipeline.PipelineRunner(
+        stages,
+        config={},
+        project_dir=str(tmp_path),
+        state_path=str(tmp_path / "state" / "state.json"),
+        log_dir=str(tmp_path / "logs"),
+        **kwargs,
+    )
+
+
+def get_statuses(summary):
+    return {result["stage"]: result["status"] for result in summary}
+
+
+def test_get_dependencies():
+    stages = [
+        pipeline.PipelineStage("c", [], inputs=["b.txt"], outputs=["c.txt"]),
+        pipeline.PipelineStage("a", [], inputs=["src.txt"], outputs=["a.txt"]),
+        pipeline.PipelineStage("b", [], inputs=["a.txt", "src.txt"], outputs=["b.txt"]),
+    ]
+    assert pipeline.get_dependencies(stages) == {"a": [], "b": ["a"], "c": ["b"]}
+
+    with pytest.raises(ValueError):
+        pipeline.get_dependencies(
+            stages + [pipeline.PipelineStage("d", [], outputs=["a.txt"])]
+        )
+    with pytest.raises(ValueError):
+        pipeline.get_dependencies(
+            [
+                pipeline.PipelineStage("a", [], inputs=["b.txt"], outputs=["a.txt"]),
+                pipeline.PipelineStage("b", [], inputs=["a.txt"], outputs=["b.txt"]),
+            ]
+        )
+
+
+def test_default_stages():
+    config = {
+        "dc_311_data_api_endpoints": {2023: "url_2023", 2024: "url_2024"},
+        "task_type": "classification",
+        "target_threshold": 4,
+        "release": {
+            "models": [
+                {"task_type": "classification", "target_threshold": 5},
+                {"task_type": "classification", "target_threshold": 21},
+                {"task_type": "regression"},
+            ]
+        },
+    }
+    stages = pipeline.get_default_stages(config)
+    dependencies = pipeline.get_dependencies(stages)
+
+    assert dependencies["preprocess"] == ["extract_2023", "extract_2024"]
+    assert dependencies["features_clf"] == ["preprocess"]
+    assert dependencies["train_under_5_day_model"] == ["features_clf"]
+    assert dependencies["train_num_days_model"] == ["features_reg"]
+    assert "train_under_4_day_model" not in dependencies
+    assert dependencies["build_lookup_table"] == [
+        "features_clf",
+        "features_reg",
+        "train_num_days_model",
+        "train_under_21_day_model",
+        "train_under_5_day_model",
+    ]
+
+    # Every served model is written by a stage
+    outputs = {path for stage in stages for path in stage.outputs}
+    assert set(lookup.MODEL_ARTIFACTS.values()) <= outputs
+
+
+def test_run_skips_unchanged_stages(tmp_path):
+    (tmp_path / "src.txt").write_text("a")
+    stages = [
+        write_stage("upper", ["src.txt"], ["upper.txt"], "text = text.upper()"),
+        write_stage("copy", ["upper.txt"], ["copy.txt"]),
+        write_stage("other", ["src.txt"], ["other.txt"]),
+    ]
+
+    summary = make_runner(tmp_path, stages).run()
+    assert get_statuses(summary) == {"upper": "ran", "copy": "ran", "other": "ran"}
+    assert (tmp_path / "copy.txt").read_text() == "A"
+
+    summary = make_runner(tmp_path, stages).run()
+    assert set(get_statuses(summary).values()) == {"skipped"}
+
+    # `upper` writes the same output, so `copy` does not need to run
+    (tmp_path / "src.txt").write_text("A")
+    summary = make_runner(tmp_path, stages).run()
+    assert get_statuses(summary) == {
+        "upper": "ran",
+        "copy": "skipped",
+        "other": "ran",
+    }
+
+    (tmp_path / "copy.txt").write_text("edited")
+    summary = make_runner(tmp_path, stages).run(rerun=["other"])
+    assert get_statuses(summary) == {
+        "upper": "skipped",
+        "copy": "ran",
+        "other": "ran",
+    }
+    assert (tmp_path / "copy.txt").read_text() == "A"
+
+
+def test_run_blocks_stages_after_failure(tmp_path):
+    (tmp_path / "src.txt").write_text("a")
+    stages = [
+        write_stage("fail", ["src.txt"], ["fail.txt"], "raise SystemExit(1)"),
+        write_stage("after_fail", ["fail.txt"], ["after_fail.txt"]),
+        write_stage("other", ["src.txt"], ["other.txt"]),
+    ]
+
+    summary = make_runner(tmp_path, stages).run()
+    assert get_statuses(summary) == {
+        "fail": "failed",
+        "after_fail": "blocked",
+        "other": "ran",
+    }
+    assert (tmp_path / "logs" / "fail.log").exists()
+    assert "blocked" in pipeline.format_summary(summary, 1.0)
+
+
+def test_run_independent_stages_concurrently(tmp_path):
+    (tmp_path / "src.txt").write_text("a")
+    # Each stage waits for the other to start, so they only finish if they
+    # run at the same time
+    wait_for = (
+        "import os, time\n"
+        "open('{0}.started', 'w').close()\n"
+        "deadline = time.time() + 30\n"
+        "while not os.path.exists('{1}.started') and time.time() < deadline:\n"
+        "    time.sleep(0.01)\n"
+        "assert os.path.exists('{1}.started')"
+    )
+    stages = [
+        write_stage(
+            "left", ["src.txt"], ["left.txt"], wait_for.format("left", "right")
+        ),
+        write_stage(
+            "right", ["src.txt"], ["right.txt"], wait_for.format("right", "left")
+        ),
+    ]
+
+    summary = make_runner(tmp_path, stages, max_workers=2).run()
+    assert set(get_statuses(summary).values()) == {"ran"}
+
+
+def test_stage_config_overrides(tmp_path):
+    stage = pipeline.PipelineStage(
+        "config",
+        [
+            sys.executable,
+            "-c",
+            "import os, yaml\n"
+            "config = yaml.safe_load(open(os.environ['DC_311_CONFIG_PATH']))\n"
+            "open('task_type.txt', 'w').write(config['task_type'])",
+        ],
+        outputs=["task_type.txt"],
+        config_keys=["task_type"],
+        config_overrides={"task_type": "regression"},
+    )
+    runner = pipeline.PipelineRunner(
+        [stage],
+        config={"task_type": "classification"},
+        project_dir=str(tmp_path),
+        state_path=str(tmp_path / "state.json"),
+        log_dir=str(tmp_path / "logs"),
+    )
+
+    assert get_statuses(runner.run()) == {"config": "ran"}
+    assert (tmp_path / "task_type.txt").read_text() == "regression"